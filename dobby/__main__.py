@@ -7,11 +7,17 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+import asyncio
+import json
 import logging
 from argparse import ArgumentParser, Namespace
+from datetime import datetime, timedelta
 
-from . import __version__, Dobby
-from .errors import DobbyError
+from . import __version__, Config, Dobby
+from .control import get_socket_path, send_command
+from .errors import ControlError, DobbyError
+from .models.state import StateStore
+from .plan import DEFAULT_DURATION, Plan, load_planned_tasks
 
 log = logging.getLogger(__package__)
 
@@ -26,15 +32,69 @@ def run(args: Namespace):
             text += ": " + e.hint
         log.exception(text)
     else:
-        dobby.run()
+        if args.use_async:
+            # run_async replaces the configured executor with an AsyncExecutor
+            asyncio.run(dobby.run_async())
+        else:
+            dobby.run()
 
 
 def test(args: Namespace):
     log.info(f"Dobby v{__version__} TEST")
-    dobby = Dobby.load(args.config_file)
+    dobby = Dobby.load(args.config_file, read_only_state=True)
     dobby.test()
 
 
+def check(args: Namespace):
+    dobby = Dobby.load(args.config_file, read_only_state=True)
+    for task in dobby.tasks:
+        for job in task.jobs:
+            try:
+                job.run_checks(force=True)
+            except DobbyError as e:
+                print(f"{job.jobid}: {e}")
+                continue
+            for name, value in job.diagnostics.items():
+                print(f"{job.jobid} {name}: {value}")
+
+
+def ctl(args: Namespace):
+    socket_path = args.socket
+    if socket_path is None:
+        socket_path = get_socket_path(Config.load(args.config_file))
+        if socket_path is None:
+            log.error("The control socket is disabled in the config")
+            return
+
+    command_args = [args.taskid] if getattr(args, "taskid", None) else []
+    try:
+        result = send_command(socket_path, args.command, *command_args)
+    except ControlError as e:
+        log.error(str(e))
+        sys.exit(1)
+
+    if isinstance(result, str):
+        print(result)
+    else:
+        print(json.dumps(result, indent=2))
+
+
+def plan(args: Namespace):
+    config = Config.load(args.config_file)
+    start = args.start or datetime.now()
+    try:
+        tasks = load_planned_tasks(config, StateStore.load(config, read_only=True))
+        result = Plan(tasks, start, start + timedelta(days=args.days), args.default_duration)
+    except (DobbyError, ImportError) as e:
+        log.error(str(e))
+        sys.exit(1)
+
+    print(result.format_report(args.top))
+    if args.csv:
+        with args.csv.open("w") as f:
+            result.write_csv(f)
+
+
 def main(*args):
     args = args or None
 
@@ -43,12 +103,42 @@ def main(*args):
 
     run_parser = subparsers.add_parser("run")
     run_parser.add_argument("config_file", type=Path)
+    run_parser.add_argument("--async", dest="use_async", action="store_true",
+                            help="run the tasks on an asyncio event loop")
     run_parser.set_defaults(func=run)
 
     run_parser = subparsers.add_parser("test")
     run_parser.add_argument("config_file", type=Path)
     run_parser.set_defaults(func=test)
 
+    check_parser = subparsers.add_parser("check", help="run the checks of the slaves, like explaining Mongo conditions "
+                                                       "(this executes the full queries)")
+    check_parser.add_argument("config_file", type=Path)
+    check_parser.set_defaults(func=check)
+
+    plan_parser = subparsers.add_parser("plan", help="simulate the schedule without running anything")
+    plan_parser.add_argument("config_file", type=Path)
+    plan_parser.add_argument("--days", type=float, default=30, help="length of the simulated period (default: 30)")
+    plan_parser.add_argument("--start", type=datetime.fromisoformat, help="start of the simulation (default: now)")
+    plan_parser.add_argument("--default-duration", type=float, default=DEFAULT_DURATION,
+                             help=f"seconds a task is assumed to take if it never ran (default: {DEFAULT_DURATION})")
+    plan_parser.add_argument("--top", type=int, default=10, help="amount of entries to show in the lists (default: 10)")
+    plan_parser.add_argument("--csv", type=Path, help="write the amount of running tasks of every minute to this file")
+    plan_parser.set_defaults(func=plan)
+
+    ctl_parser = subparsers.add_parser("ctl", help="control a running Dobby")
+    ctl_parser.add_argument("config_file", type=Path)
+    ctl_parser.add_argument("--socket", type=Path, help="path of the control socket, defaults to the one in the config")
+    ctl_commands = ctl_parser.add_subparsers(title="control commands", dest="command")
+    ctl_commands.required = True
+    trigger_parser = ctl_commands.add_parser("trigger", help="run a task right now")
+    trigger_parser.add_argument("taskid")
+    ctl_commands.add_parser("pause", help="stop running scheduled tasks")
+    ctl_commands.add_parser("resume", help="continue running scheduled tasks")
+    ctl_commands.add_parser("queue", help="show what's scheduled")
+    ctl_commands.add_parser("reload", help="reload the config file")
+    ctl_parser.set_defaults(func=ctl)
+
     args = parser.parse_args(args)
     args.func(args)
 
@@ -1,10 +1,11 @@
 import abc
 import os
+import threading
 from ast import literal_eval
 from collections import UserDict, UserList
 from contextlib import suppress
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Optional
 
 import yaml
 
@@ -85,6 +86,17 @@ class DictContainer(_Container, UserDict):
         return normal
 
 
+def to_normal(value: Any) -> Any:
+    """Convert *value* to its Python equivalent if it's a `Container`.
+
+    Environment pointers aren't resolved, which makes the result suitable to
+    compare two versions of a config.
+    """
+    if isinstance(value, _Container):
+        return value.to_normal()
+    return value
+
+
 def getitem(env: "Environment", value: Any) -> Any:
     """Wrap value in `Container` or resolve it if it points to an environment variable.
 
@@ -182,17 +194,21 @@ class Config(UserDict):
             configuration
         tasks: `DictContainer` of parsed task configurations
             from the config file
+        path: `pathlib.Path` of the config file if it was loaded from one
     """
     env: Environment
     ext: ListContainer
     notifications: DictContainer
     tasks: DictContainer
+    path: Optional[Path]
 
-    def __init__(self, env: Environment, ext: ListContainer, notifications: DictContainer, tasks: DictContainer, data: DictContainer):
+    def __init__(self, env: Environment, ext: ListContainer, notifications: DictContainer, tasks: DictContainer, data: DictContainer,
+                 path: Path = None):
         self.env = env
         self.ext = ext
         self.notifications = notifications
         self.tasks = tasks
+        self.path = path
         super().__init__(data)
 
     @classmethod
@@ -207,7 +223,7 @@ class Config(UserDict):
         Returns:
             `Config` based on *fp*
         """
-        config = yaml.load(fp.read_text())
+        config = yaml.safe_load(fp.read_text())
         env = Environment(config.pop("env", None))
 
         _ext = config.pop("ext", None)
@@ -219,4 +235,50 @@ class Config(UserDict):
         tasks = DictContainer(env, config.pop("tasks", None))
         data = DictContainer(env, config)
 
-        return cls(env, ext, notifications, tasks, data)
+        return cls(env, ext, notifications, tasks, data, path=fp)
+
+
+class ConfigWatcher:
+    """Polls the modification time of a config file in a background thread.
+
+    Attributes:
+        path: `pathlib.Path` of the config file
+        interval: Seconds between two checks
+        callback: Called without arguments when the file changed
+    """
+
+    path: Path
+    interval: float
+    callback: Callable[[], Any]
+
+    def __init__(self, path: Path, interval: float, callback: Callable[[], Any]):
+        self.path = path
+        self.interval = interval
+        self.callback = callback
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __repr__(self) -> str:
+        return f"<ConfigWatcher {self.path}>"
+
+    def get_mtime(self) -> Optional[float]:
+        try:
+            return self.path.stat().st_mtime
+        except OSError:
+            return None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="dobby-config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        mtime = self.get_mtime()
+        while not self._stop.wait(self.interval):
+            current = self.get_mtime()
+            if current is not None and current != mtime:
+                mtime = current
+                self.callback()
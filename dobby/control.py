@@ -0,0 +1,233 @@
+"""Local control channel of a running Dobby.
+
+Dobby listens on a Unix socket for newline separated JSON commands
+like ``{"command": "trigger", "args": ["backup"]}`` and answers each one
+with ``{"ok": true, "result": ...}`` or ``{"ok": false, "error": "..."}``.
+The ``dobby ctl`` command is the client for this socket.
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, TYPE_CHECKING
+
+from .errors import ControlError, SetupError
+
+if TYPE_CHECKING:
+    from .config import Config
+    from .dobby import Dobby
+
+log = logging.getLogger(__name__)
+
+COMMAND_MAP: Dict[str, Callable] = {}
+
+
+def command(name: str):
+    """Register a function as a control command.
+
+    The function is called with the `Dobby` instance followed by the
+    arguments of the command and must return something JSON serialisable.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        COMMAND_MAP[name] = func
+        return func
+
+    return decorator
+
+
+@command("trigger")
+def trigger(dobby: "Dobby", taskid: str) -> str:
+    """Run a task right now."""
+    dobby.trigger(taskid)
+    return f"triggered {taskid}"
+
+
+@command("pause")
+def pause(dobby: "Dobby") -> str:
+    """Stop running scheduled tasks until resumed."""
+    dobby.pause()
+    return "paused"
+
+
+@command("resume")
+def resume(dobby: "Dobby") -> str:
+    """Continue running scheduled tasks."""
+    dobby.resume()
+    return "resumed"
+
+
+@command("reload")
+def reload(dobby: "Dobby") -> str:
+    """Reload the config file."""
+    dobby.request_reload()
+    return "reloading"
+
+
+@command("queue")
+def queue(dobby: "Dobby") -> dict:
+    """List everything that's scheduled."""
+    return dict(paused=dobby.paused,
+                queue=[dict(time=time.isoformat(), item=repr(item)) for time, item in dobby.scheduler.queue])
+
+
+def get_socket_path(config: "Config") -> Optional[Path]:
+    """Location of the control socket according to the ``control`` config key.
+
+    Returns:
+        `None` if the control socket is disabled. By default the socket is
+        created next to the config file.
+    """
+    path = config.get("control", True)
+    if path is False:
+        return None
+    if path is True or path is None:
+        if config.path:
+            return config.path.with_name(config.path.stem + ".sock")
+        return Path("dobby.sock")
+    return Path(path)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: "_ControlSocketServer"
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.control.handle(line)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class _ControlSocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    control: "ControlServer"
+
+
+class ControlServer:
+    """Serves the control commands for `Dobby` on a Unix socket.
+
+    The server runs on its own daemon threads. Commands only change the
+    state of `Dobby` in a thread-safe way and wake it up so they take
+    effect immediately.
+
+    Attributes:
+        dobby: `Dobby` instance to control
+        path: Location of the Unix socket
+    """
+
+    dobby: "Dobby"
+    path: Path
+
+    def __init__(self, dobby: "Dobby", path: Path):
+        self.dobby = dobby
+        self.path = Path(path)
+        self._server = None
+        self._thread = None
+
+    def __repr__(self) -> str:
+        return f"<ControlServer {self.path}>"
+
+    def handle(self, line: bytes) -> dict:
+        """Run the command encoded in *line* and return the response."""
+        try:
+            request = json.loads(line)
+            name = request["command"]
+            args = request.get("args", [])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return dict(ok=False, error="invalid request")
+
+        func = COMMAND_MAP.get(name)
+        if not func:
+            return dict(ok=False, error=f"unknown command \"{name}\", use one of: {', '.join(COMMAND_MAP)}")
+
+        try:
+            result = func(self.dobby, *args)
+        except TypeError as e:
+            return dict(ok=False, error=f"invalid arguments for {name}: {e}")
+        except (KeyError, ValueError) as e:
+            return dict(ok=False, error=str(e.args[0]) if e.args else repr(e))
+        except Exception as e:
+            log.exception(f"control command {name} failed")
+            return dict(ok=False, error=repr(e))
+
+        log.info(f"control command {name} {' '.join(map(str, args))}".strip())
+        return dict(ok=True, result=result)
+
+    def start(self):
+        """Bind the socket and start serving in the background.
+
+        A stale socket left behind by a previous Dobby is removed.
+
+        Raises:
+            `SetupError` if another Dobby is already listening on the socket
+        """
+        if not hasattr(socket, "AF_UNIX"):
+            log.warning("control socket isn't supported on this platform")
+            return
+
+        if self.path.exists():
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                try:
+                    sock.connect(str(self.path))
+                except OSError:
+                    self.path.unlink()
+                else:
+                    raise SetupError(f"Another Dobby is already listening on {self.path}",
+                                     hint="Set \"control\" to a different path or disable it with \"control: false\"")
+
+        # the socket is created with the umask, only the user running Dobby may control it.
+        # Changing the mode after binding would leave it open to everyone for a moment.
+        umask = os.umask(0o177)
+        try:
+            self._server = _ControlSocketServer(str(self.path), _RequestHandler)
+        finally:
+            os.umask(umask)
+        self._server.control = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="dobby-control", daemon=True)
+        self._thread.start()
+        log.debug(f"control socket listening on {self.path}")
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+def send_command(path: Path, name: str, *args: str, timeout: float = 10) -> Any:
+    """Send a command to the Dobby listening on *path*.
+
+    Returns:
+        The result of the command
+
+    Raises:
+        `ControlError` if Dobby can't be reached or the command failed
+    """
+    request = json.dumps(dict(command=name, args=list(args))).encode() + b"\n"
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(path))
+            sock.sendall(request)
+            with sock.makefile("rb") as f:
+                line = f.readline()
+    except OSError as e:
+        raise ControlError(f"Couldn't reach Dobby on {path} ({e})", hint="Make sure Dobby is running with the same config file")
+
+    if not line:
+        raise ControlError(f"Dobby closed the connection on {path} without answering")
+
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise ControlError(f"Command {name} failed: {response.get('error')}")
+    return response.get("result")
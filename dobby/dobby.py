@@ -1,19 +1,35 @@
+import asyncio
 import logging
-import time
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from multiprocessing.managers import SyncManager
 from operator import attrgetter
 from pathlib import Path
-from typing import Dict, List, Union, overload
+from typing import Dict, List, Optional, Union, overload
 
 from . import __version__, slaves
-from .config import Config
-from .models import Context, GroupMixin, Task
+from .config import Config, ConfigWatcher, to_normal
+from .control import ControlServer, get_socket_path
+from .errors import DobbyError
+from .models import Context, Executor, GroupMixin, Scheduler, Task
+from .models.executor import AsyncExecutor
 from .models.notifications import Notification, NotificationManager
-from .utils import human_timedelta, setup_sentry
+from .models.state import StateStore
+from .models.task import TaskTrigger
+from .utils import human_timedelta, parse_duration, setup_sentry
 
 setup_sentry()
 log = logging.getLogger(__name__)
 
+DEFAULT_RELOAD_INTERVAL = 5
+
+
+def get_globals(config: Config) -> dict:
+    """Snapshot of the top-level config keys which apply to all tasks."""
+    return {key: to_normal(value) for key, value in config.items()}
+
 
 class Dobby(GroupMixin):
     """
@@ -22,29 +38,55 @@ class Dobby(GroupMixin):
         config: `Config` for this instance
         notification_manager: `NotificationManager` used to send `Notification`s
         tasks: List of `Task` which the instance is running
+        scheduler: `Scheduler` holding the `Tasks <Task>` ordered by their next execution
+        executor: `Executor` running the due `Tasks <Task>`
+        state: `StateStore` remembering the schedule and the last runs across restarts
+        paused: Whether running scheduled tasks is paused. Triggered tasks still run.
+        process_pool: `concurrent.futures.ProcessPoolExecutor` for jobs with
+            ``isolation: process``. Created on first use.
+        process_manager: `multiprocessing.managers.SyncManager` providing the
+            cancellation events shared with the worker processes. Created on first use.
         ctx: `Context` which will be passed to the `Task`
     """
 
     config: Config
     notification_manager: NotificationManager
     tasks: List[Task]
+    scheduler: Scheduler
+    executor: Executor
+    state: StateStore
+    paused: bool
     ctx: Context
 
-    def __init__(self, config: Config, tasks: List[Task] = None):
+    def __init__(self, config: Config, tasks: List[Task] = None, read_only_state: bool = False):
         super().__init__()
 
         self.config = config
         self.notification_manager = NotificationManager.load(config.notifications)
         self.tasks = tasks or []
+        self.scheduler = Scheduler()
+        self.executor = Executor.load(config)
+        self.state = StateStore.load(config, read_only=read_only_state)
+        self.paused = False
+        self._control = None
+        self._watcher = None
+        self._reload_requested = False
+        self._stopping = False
+        self._process_pool = None
+        self._process_manager = None
+        self._wakeup = threading.Event()
+        self._loop = None
+        self._async_wakeup = None
         self.ctx = Context(self)
         slaves.setup(self)
 
     @classmethod
-    def load(cls, fp: Path) -> "Dobby":
+    def load(cls, fp: Path, read_only_state: bool = False) -> "Dobby":
         """Loads `Dobby` configuration from a :py:class:`pathlib.Path`.
 
         Args:
             fp: `pathlib.Path` to load config from
+            read_only_state: Don't create or change the stored state, e.g. for test runs
 
         Returns:
             A fully configured `Dobby` instance
@@ -55,7 +97,7 @@ class Dobby(GroupMixin):
         log.debug("loading config")
         config = Config.load(fp)
 
-        inst = cls(config)
+        inst = cls(config, read_only_state=read_only_state)
 
         log.debug("loading extensions")
         for ext in config.ext:
@@ -72,6 +114,40 @@ class Dobby(GroupMixin):
 
         return inst
 
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            max_processes: Optional[int] = self.config.get("max_processes")
+            self._process_pool = ProcessPoolExecutor(int(max_processes) if max_processes else None)
+        return self._process_pool
+
+    @property
+    def process_manager(self) -> SyncManager:
+        if self._process_manager is None:
+            self._process_manager = SyncManager()
+            self._process_manager.start()
+        return self._process_manager
+
+    def shutdown(self):
+        """Stop the `Executor` and the process pool without waiting for running tasks.
+
+        Pending changes of the `StateStore` are written.
+        """
+        if self._control is not None:
+            self._control.stop()
+            self._control = None
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+        self.executor.shutdown(wait=False)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
+        if self._process_manager is not None:
+            self._process_manager.shutdown()
+            self._process_manager = None
+        self.state.flush()
+
     @overload
     def send_notification(self, notification: Notification):
         """Passes a `Notification` to the `NotificationManager`.
@@ -103,30 +179,264 @@ class Dobby(GroupMixin):
             notification = Notification(notification, *embeds, **kwargs)
         return self.notification_manager.send(notification)
 
-    def wait_for_next(self):
-        """Blocks until the next task is due."""
+    def schedule(self, item):
+        """Add *item* to the `Scheduler` and wake up Dobby if it's sleeping.
+
+        Args:
+            item: `Task` or another entry for the `Scheduler` like a `JobRetry`
+        """
+        self.scheduler.push(item)
+        self.wake_up()
+
+    def save_schedule(self, task: Task):
+        """Remember the next execution of *task* in the `StateStore`."""
+        self.state.update(task.taskid, calendar=task.schedule, next_execution=task.next_execution)
+
+    def get_task(self, taskid: str) -> Task:
+        """Find a `Task` by its id.
+
+        Raises:
+            `KeyError` if there's no such task
+        """
+        for task in self.tasks:
+            if task.taskid == taskid:
+                return task
+        raise KeyError(f"unknown task \"{taskid}\"")
+
+    def trigger(self, taskid: str):
+        """Run a task as soon as possible without changing its schedule. Safe to call from any thread."""
+        self.schedule(TaskTrigger(self.get_task(taskid)))
+
+    def pause(self):
+        """Stop running scheduled tasks and retries until `resume` is called."""
+        self.paused = True
+        log.info("paused")
+        self.wake_up()
+
+    def resume(self):
+        """Continue running scheduled tasks. Executions missed in the meantime go through the misfire policy."""
+        self.paused = False
+        log.info("resumed")
+        self.wake_up()
+
+    def request_reload(self):
+        """Ask Dobby to `reload` the config as soon as it's awake. Safe to call from any thread and signal handlers."""
+        self._reload_requested = True
+        self.wake_up()
+
+    def check_reload(self):
+        """Run `reload` if it was requested."""
+        if self._reload_requested:
+            self._reload_requested = False
+            self.reload()
+
+    def reload(self) -> bool:
+        """Load the config file again and apply the changes to the running tasks.
+
+        The new task configs are compared to the ones the running tasks were built
+        from. Unchanged tasks are kept as they are, changed tasks are rebuilt while
+        taking over the jobs whose config didn't change (and with them their prepared
+        arguments like database connections). Jobs which aren't used anymore are
+        closed, those of a running task (or one waiting for a retry) once it's done.
+        A task keeps its schedule unless its ``run`` or ``spread`` changed. If the
+        env or the top-level config changed, all tasks are rebuilt, in the former
+        case including their jobs. New extensions are loaded but extensions can't
+        be unloaded.
+
+        If the new config is invalid it's ignored and Dobby keeps running with the
+        previous one.
+
+        Returns:
+            Whether the new config was applied
+        """
+        if not self.config.path:
+            log.warning("can't reload a config which wasn't loaded from a file")
+            return False
+
+        log.info(f"reloading config from {self.config.path}")
+        old_config = self.config
+        old_tasks = {task.taskid: task for task in self.tasks}
+        tasks = []
+        try:
+            config = Config.load(self.config.path)
+            same_env = to_normal(config.env) == to_normal(old_config.env)
+            same_globals = same_env and get_globals(config) == get_globals(old_config)
+
+            self.config = config
+            for ext in config.ext:
+                if ext not in old_config.ext:
+                    self.load_ext(ext)
+
+            for taskid, task_config in config.tasks.items():
+                if not task_config.get("enabled", True):
+                    log.debug(f"Task {taskid} disabled!")
+                    continue
+                previous = old_tasks.get(taskid) if same_env else None
+                if previous and same_globals and previous.config == to_normal(task_config):
+                    tasks.append(previous)
+                else:
+                    tasks.append(Task.load(self, taskid, task_config, previous=previous))
+        except Exception as e:
+            self.config = old_config
+            old_jobs = [job for task in old_tasks.values() for job in task.jobs]
+            for task in tasks:
+                if old_tasks.get(task.taskid) is not task:
+                    task.close(keep=old_jobs)
+            for task in old_tasks.values():
+                for job in task.jobs:
+                    job.task = task
+            hint = f" ({e.hint})" if isinstance(e, DobbyError) and e.hint else ""
+            log.exception(f"Couldn't reload the config, keeping the previous one{hint}")
+            return False
+
+        if to_normal(config.notifications) != to_normal(old_config.notifications):
+            self.notification_manager = NotificationManager.load(config.notifications)
+
+        now = datetime.now()
+        kept = {task.taskid for task in tasks if old_tasks.get(task.taskid) is task}
+        replaced = [task for task in old_tasks.values() if task.taskid not in kept]
+        for task in replaced:
+            if task in self.scheduler:
+                self.scheduler.remove(task)
+
+        for task in tasks:
+            if task.taskid in kept:
+                continue
+            previous = old_tasks.get(task.taskid)
+            if previous and previous.next_execution and previous.schedule == task.schedule:
+                task.next_execution = previous.next_execution
+            else:
+                self.plan_task(task, now)
+            self.scheduler.push(task)
+            self.save_schedule(task)
+
+        tasks.sort(key=attrgetter("priority"), reverse=True)
+        self.tasks = tasks
+        # running tasks (including pending retries) close their jobs once they're done
+        new_jobs = [job for task in tasks for job in task.jobs]
+        for task in replaced:
+            task.close(keep=new_jobs)
+        self.state.flush()
+        self.wake_up()
+
+        added = len(set(task.taskid for task in tasks) - set(old_tasks))
+        removed = len(set(old_tasks) - set(task.taskid for task in tasks))
+        log.info(f"config reloaded: {added} task(s) added, {len(tasks) - added - len(kept)} changed, {removed} removed")
+        return True
+
+    def watch_config(self):
+        """Reload the config on SIGHUP and, unless ``reload: false``, when the file changes.
+
+        Must be called from the main thread to install the signal handler.
+        """
+        if hasattr(signal, "SIGHUP") and threading.current_thread() is threading.main_thread():
+            if self._loop is not None:
+                self._loop.add_signal_handler(signal.SIGHUP, self.request_reload)
+            else:
+                signal.signal(signal.SIGHUP, lambda signum, frame: self.request_reload())
+
+        interval = self.config.get("reload", True)
+        if interval is False or not self.config.path:
+            return
+        try:
+            interval = DEFAULT_RELOAD_INTERVAL if interval is True or interval is None else parse_duration(interval)
+        except ValueError as e:
+            log.warning(f"invalid reload interval, not watching the config file ({e})")
+            return
+
+        self._watcher = ConfigWatcher(self.config.path, interval, self.request_reload)
+        self._watcher.start()
+
+    def start_control(self):
+        """Start listening for ``dobby ctl`` commands unless the control socket is disabled."""
+        path = get_socket_path(self.config)
+        if path is not None:
+            self._control = ControlServer(self, path)
+            self._control.start()
+
+    def stop(self):
+        """Make `run` return once it wakes up, running tasks aren't waited for. Safe to call from any thread."""
+        self._stopping = True
+        self.wake_up()
+
+    def wake_up(self):
+        """Interrupt the sleep so Dobby checks the `Scheduler` again. Safe to call from any thread."""
+        self._wakeup.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._async_wakeup.set)
+
+    def get_sleep_time(self) -> Optional[float]:
+        """Calculate the amount of seconds until the next task is due.
+
+        Returns:
+            Seconds to sleep. Never negative.
+            `None` if there's nothing scheduled.
+        """
         now = datetime.now()
-        next_time = min(task.next_execution for task in self.tasks)
+        if self.paused:
+            log.info("paused, sleeping until woken up")
+            return None
+
+        next_time = self.scheduler.next_time
+        if next_time is None:
+            log.info("nothing scheduled, sleeping until woken up")
+            return None
+
         sleep_time = (next_time - now).total_seconds()
         if sleep_time >= 0:
             log.info(f"sleeping for {human_timedelta(sleep_time)}")
-            time.sleep(sleep_time)
+            return sleep_time
         else:
             log.warning(f"{human_timedelta(-sleep_time)} behind schedule!")
+            return 0
 
-    def execute_due_tasks(self):
-        """Executes all tasks that should be run *right now*"""
-        for task in self.tasks:
-            task.execute_if_due(datetime.now(), self.ctx.copy())
+    def wait_for_next(self):
+        """Blocks until the next task is due or `wake_up` is called."""
+        self._wakeup.clear()
+        sleep_time = self.get_sleep_time()
+        if sleep_time != 0:
+            self._wakeup.wait(sleep_time)
 
-    def run(self):
-        """Starts Dobby.
+    async def wait_for_next_async(self):
+        """Like `wait_for_next` but without blocking the event loop."""
+        self._async_wakeup.clear()
+        sleep_time = self.get_sleep_time()
+        if sleep_time != 0:
+            try:
+                await asyncio.wait_for(self._async_wakeup.wait(), sleep_time)
+            except asyncio.TimeoutError:
+                pass
 
-        Obviously this function is blocking.
-        Dobby will execute due tasks and then go back to sleep.
+    def execute_due_tasks(self):
+        """Executes all tasks that should be run *right now*
+
+        Only the due `Tasks <Task>` are taken from the `Scheduler` and passed
+        to the `Executor`. They're pushed back into the queue once their next
+        execution is planned according to their misfire policy. Other entries
+        (like a `JobRetry`) are executed once.
+        The new schedule is written to the `StateStore` before the tasks run.
+        While `paused` only a `TaskTrigger` is executed.
         """
-        log.info("start")
+        now = datetime.now()
+        due_items = []
+        for item in self.scheduler.pop_due(now):
+            if self.paused and not isinstance(item, TaskTrigger):
+                self.scheduler.push(item)
+                continue
+            if isinstance(item, Task):
+                due = item.plan_due(now)
+                self.scheduler.push(item)
+                self.save_schedule(item)
+                if not due:
+                    continue
+            due_items.append(item)
 
+        self.state.flush()
+        for item in due_items:
+            self.executor.submit(item, self.ctx.copy())
+
+    def announce_start(self):
+        """Send the notification that Dobby is starting."""
         self.send_notification(dict(
             title="Dobby is starting",
             fields=[dict(title="Tasks",
@@ -136,18 +446,110 @@ class Dobby(GroupMixin):
             footer=f"Dobby v{__version__}"
         ))
 
+    def plan_task(self, task: Task, now: datetime):
+        """Plan the execution of a new task, preferring the one stored in the `StateStore`."""
+        state = self.state.get(task.taskid)
+        if state and state.next_execution and state.calendar == task.schedule:
+            task.next_execution = state.next_execution
+            log.debug(f"{task} resuming with the execution planned for {task.next_execution}")
+        else:
+            task.plan_next_execution(now)
+
+    def plan_tasks(self) -> bool:
+        """Plan the first execution of all tasks and add them to the `Scheduler`.
+
+        Tasks continue with the execution stored in the `StateStore` unless their
+        schedule changed since. An execution that was missed while Dobby wasn't
+        running is handled by the misfire policy of the task.
+
+        Returns:
+            Whether there's anything to run
+        """
         now = datetime.now()
         for task in self.tasks:
-            task.plan_next_execution(now)
+            self.plan_task(task, now)
+            self.scheduler.push(task)
+            self.save_schedule(task)
+        self.state.flush()
 
-        while True:
-            self.wait_for_next()
-            self.execute_due_tasks()
-            log.debug("loop finished")
+        if not self.scheduler:
+            log.warning("no tasks to run")
+            return False
+        return True
+
+    def run(self):
+        """Starts Dobby.
+
+        Obviously this function is blocking.
+        Dobby will execute due tasks and then go back to sleep.
+        When using the `AsyncExecutor` this starts an event loop and
+        runs `run_async` on it.
+        """
+        if isinstance(self.executor, AsyncExecutor):
+            asyncio.run(self.run_async())
+            return
+
+        log.info("start")
+        self.announce_start()
+        self.plan_tasks()
+
+        try:
+            # even without tasks Dobby keeps running so a reload can add some
+            self.start_control()
+            self.watch_config()
+            while not self._stopping:
+                self.wait_for_next()
+                if self._stopping:
+                    break
+                self.check_reload()
+                self.execute_due_tasks()
+                log.debug("loop finished")
+        finally:
+            self.shutdown()
+
+    async def run_async(self):
+        """Starts Dobby on the running event loop.
+
+        Tasks are run by an `AsyncExecutor`, the loop is never blocked
+        while waiting for the next task.
+        """
+        if not isinstance(self.executor, AsyncExecutor):
+            self.executor.shutdown(wait=False)
+            self.executor = AsyncExecutor.from_config(self.config)
+
+        log.info("start (async)")
+        loop = asyncio.get_event_loop()
+        self._async_wakeup = asyncio.Event()
+        self._loop = loop
+        self.executor.start(loop)
+        await loop.run_in_executor(None, self.announce_start)
+        self.plan_tasks()
+
+        try:
+            self.start_control()
+            self.watch_config()
+            while not self._stopping:
+                await self.wait_for_next_async()
+                if self._stopping:
+                    break
+                self.check_reload()
+                self.execute_due_tasks()
+                log.debug("loop finished")
+        finally:
+            self._loop = None
+            self.shutdown()
 
     def test(self):
-        """Runs all jobs in all tasks immediately and then exit."""
+        """Runs all jobs in all tasks immediately and then exit.
+
+        Failed jobs are retried according to their retry policy before exiting.
+        """
         log.info("executing all tasks!")
         for task in self.tasks:
             task.execute(self.ctx.copy())
+
+        while self.scheduler:
+            self.wait_for_next()
+            for retry in self.scheduler.pop_due(datetime.now()):
+                retry.execute(self.ctx.copy())
         log.info("done")
@@ -120,3 +120,33 @@ class ConversionError(SetupError):
         if self.value:
             lines.append(f"Provided value: {self.value}")
         return "\n".join(lines)
+
+
+JobCancelledError = type("JobCancelledError", (DobbyError,), {})
+
+JobCancelledError.__doc__ = """
+Raised by slaves which notice that their `Context` was cancelled. Long-running slaves should
+call `Context.raise_if_cancelled` between units of work.
+"""
+
+
+class JobTimeoutError(JobCancelledError):
+    """Set as the exception of a `Context` when the job didn't finish in time.
+
+    Attributes:
+        timeout: Amount of seconds the job was allowed to run
+    """
+
+    timeout: Optional[float]
+
+    def __init__(self, msg: str, **kwargs):
+        self.timeout = kwargs.pop("timeout", None)
+        super().__init__(msg, **kwargs)
+
+
+ControlError = type("ControlError", (DobbyError,), {})
+
+ControlError.__doc__ = """
+Raised by ``dobby ctl`` when Dobby can't be reached through its control socket
+or rejects a command.
+"""
@@ -1,12 +1,15 @@
 from .calendar import Calendar
 from .context import Context
 from .converter import Converter, converter
+from .executor import Executor
 from .group import Group, GroupMixin
 from .job import Job
 from .notifications import Carrier, Notification, NotificationManager
 from .report import Report
+from .scheduler import Scheduler
 from .slave import Slave, slave
+from .state import StateStore
 from .task import Task
 
-__all__ = ["Calendar", "Context", "Converter", "converter", "Group", "GroupMixin", "Job", "Carrier", "Notification", "NotificationManager", "Report",
-           "Slave", "slave", "Task"]
+__all__ = ["Calendar", "Context", "Converter", "converter", "Executor", "Group", "GroupMixin", "Job", "Carrier", "Notification", "NotificationManager", "Report",
+           "Scheduler", "Slave", "slave", "StateStore", "Task"]
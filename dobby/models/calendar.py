@@ -1,9 +1,19 @@
 import re
-from datetime import datetime, timedelta
+from bisect import bisect_left
+from calendar import monthrange
+from datetime import MAXYEAR, MINYEAR, date, datetime, time, timedelta
 from enum import Enum
-from typing import Optional, Pattern, Union
+from typing import Optional, Pattern, Sequence, TYPE_CHECKING, Tuple, Union
 
-__all__ = ["EVERY", "Calendar", "Interval"]
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if TYPE_CHECKING:
+    import numpy
+
+__all__ = ["EVERY", "Calendar", "Interval", "events_between"]
 
 _DEFAULT = object()
 RE_PARSER: Pattern = re.compile(r"^(@?\d+|\*)([a-zA-Z])$")
@@ -62,40 +72,412 @@ def find_preset(key: str) -> Optional[dict]:
     return next((value for keys, value in PRESETS if key in keys), None)
 
 
-def set_datetime_prop(dt: datetime, month_anchor: bool, **changes) -> datetime:
-    day = changes.pop("day", None)
-    if day is not None:
-        if month_anchor:
-            changes["day"] = day + 1
+RE_CRON_FIELD: Pattern = re.compile(r"^[\w*/,\-]+$")
+
+CRON_MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+MONTH_NAMES = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+WEEKDAY_NAMES = ("sun", "mon", "tue", "wed", "thu", "fri", "sat")
+
+MAX_YEAR_SEARCH = 400
+"""Amount of (allowed) years to search for an event. The Gregorian calendar repeats every 400 years."""
+
+
+def is_cron(rep: str) -> bool:
+    """Check whether *rep* looks like a cron expression rather than a Calendar instruction."""
+    rep = rep.strip("[] ")
+    if rep.lower() in CRON_MACROS:
+        return True
+    parts = rep.split()
+    return len(parts) == 5 and all(RE_CRON_FIELD.match(part) for part in parts) and not all(RE_PARSER.match(part) for part in parts)
+
+
+def parse_cron_field(field: str, low: int, high: int, names: Tuple[str, ...] = ()) -> Tuple[int, ...]:
+    """Parse a single field of a cron expression.
+
+    Supports ``*``, single values, ranges (``1-5``), steps (``*/5``, ``10-40/10``, ``5/15``),
+    lists of the above (``1,15``) and the names in *names* which start at *low*.
+
+    Returns:
+        Sorted tuple of the allowed values
+
+    Raises:
+        `ValueError` if the field is invalid or out of range
+    """
+
+    def parse_value(value: str) -> int:
+        value = value.lower()
+        if value in names:
+            return names.index(value) + low
+        if not value.isdigit():
+            raise ValueError(f"invalid value \"{value}\" in cron field \"{field}\"")
+        number = int(value)
+        if not low <= number <= high:
+            raise ValueError(f"{number} is out of range ({low}-{high}) in cron field \"{field}\"")
+        return number
+
+    allowed = set()
+    for part in field.split(","):
+        rng, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if step < 1:
+            raise ValueError(f"invalid step in cron field \"{field}\"")
+
+        if rng == "*":
+            first, last = low, high
+        elif "-" in rng:
+            first, last = map(parse_value, rng.split("-", 1))
+            if first > last:
+                raise ValueError(f"invalid range \"{rng}\" in cron field \"{field}\"")
+        else:
+            first = parse_value(rng)
+            last = high if "/" in part else first
+
+        allowed.update(range(first, last + 1, step))
+
+    return tuple(sorted(allowed))
+
+
+def get_allowed(value: Union[EVERY, int], low: int, high: int, name: str) -> Tuple[int, ...]:
+    """Expand the value of a `Calendar` field to the sorted tuple of values it matches.
+
+    Raises:
+        `ValueError` if the value can never match
+    """
+    if isinstance(value, EVERY):
+        if value.interval < 1:
+            raise ValueError(f"the interval of {name} must be at least 1, not {value.interval}")
+        return tuple(v for v in range(low, high + 1) if v % value.interval == 0)
+    if isinstance(value, Interval):
+        raise ValueError(f"{value} isn't supported for {name}")
+    if not isinstance(value, int) or not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}, not {value!r}")
+    return value,
+
+
+def next_in_product(allowed: Sequence[Tuple[int, ...]], current: Sequence[int]) -> Optional[Tuple[int, ...]]:
+    """Find the smallest combination of allowed values which is greater than or equal to *current*.
+
+    Args:
+        allowed: Sorted tuples of allowed values for each position, most significant first
+        current: Current value of each position
+
+    Returns:
+        The combination or `None` if *current* is past the last one
+    """
+    if not allowed:
+        return ()
+    head, rest = allowed[0], allowed[1:]
+    i = bisect_left(head, current[0])
+    if i < len(head) and head[i] == current[0]:
+        tail = next_in_product(rest, current[1:])
+        if tail is not None:
+            return (head[i],) + tail
+        i += 1
+    if i < len(head):
+        return (head[i],) + tuple(values[0] for values in rest)
+    return None
+
+
+def iso_week_start(year: int, week: int) -> date:
+    """Monday of the given ISO week."""
+    jan_4 = date(year, 1, 4)
+    return jan_4 - timedelta(days=jan_4.weekday()) + timedelta(weeks=week - 1)
+
+
+def iso_weeks_in_year(year: int) -> int:
+    return date(year, 12, 28).isocalendar()[1]
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("Expanding calendars in bulk requires numpy, install it with \"pip install numpy\"")
+
+
+def to_datetime64(dt: datetime) -> "numpy.datetime64":
+    return np.datetime64(dt.replace(microsecond=0), "s")
+
+
+class YearMatcher:
+    """Matches years which are a multiple of *step* or exactly *value*."""
+
+    def __init__(self, step: int = 1, value: int = None):
+        self.step = step
+        self.value = value
+
+    def matches(self, years: "numpy.ndarray") -> "numpy.ndarray":
+        if self.value is not None:
+            return years == self.value
+        return years % self.step == 0
+
+    def next(self, year: int) -> Optional[int]:
+        """First allowed year which is not before *year*."""
+        if self.value is not None:
+            return self.value if year <= self.value else None
+        return -(-year // self.step) * self.step
+
+    @property
+    def search_span(self) -> int:
+        return MAX_YEAR_SEARCH * self.step
+
+
+class CompiledCalendar:
+    """Fast lookup structure for the events of a `Calendar`.
+
+    Every field is expanded to a sorted tuple of the values it allows so
+    `next_event` can jump straight to the next matching value using binary
+    search instead of trying one candidate after the other. The days
+    allowed in a month only depend on its length and its first weekday,
+    so they're computed once for each of those (at most 28) combinations.
+
+    In month mode the date is made of year, month and day of the month, in
+    week mode of the ISO year, ISO week and weekday.
+
+    Attributes:
+        month_anchor: Whether the date is in month mode
+        years: `YearMatcher` for the (ISO) year
+        months: Allowed months (0 - 11), month mode only
+        weeks: Allowed ISO weeks (1 - 53), week mode only
+        days: Allowed days of the month (0 - 30) in month mode or weekdays (0 - 6) in week mode
+        weekdays: Weekdays (0 - 6) which are allowed in addition to (*days_or*) or together with
+            the *days* in month mode. `None` if the weekday doesn't matter.
+        days_or: Whether a day matching either *days* or *weekdays* is allowed (cron semantics)
+        times: Allowed hours, minutes and seconds
+    """
+
+    month_anchor: bool
+    years: YearMatcher
+    months: Tuple[int, ...]
+    weeks: Tuple[int, ...]
+    days: Tuple[int, ...]
+    weekdays: Optional[Tuple[int, ...]]
+    days_or: bool
+    times: Tuple[Tuple[int, ...], Tuple[int, ...], Tuple[int, ...]]
+
+    def __init__(self, month_anchor: bool, years: YearMatcher, days: Tuple[int, ...], times: Tuple[Tuple[int, ...], ...],
+                 months: Tuple[int, ...] = (), weeks: Tuple[int, ...] = (), weekdays: Tuple[int, ...] = None, days_or: bool = False):
+        self.month_anchor = month_anchor
+        self.years = years
+        self.months = months
+        self.weeks = weeks
+        self.days = days
+        self.weekdays = weekdays
+        self.days_or = days_or
+        self.times = times
+        self._month_days = {}
+
+        if not (days and all(times) and (months if month_anchor else weeks)):
+            raise ValueError("calendar doesn't allow any value for one of its fields")
+        if self.next_date(date(MINYEAR, 1, 4)) is None:
+            raise ValueError("calendar doesn't match any date")
+
+    @classmethod
+    def from_calendar(cls, calendar: "Calendar") -> "CompiledCalendar":
+        """Compile the fields of a `Calendar`.
+
+        Raises:
+            `ValueError` if a field can never match
+        """
+        if isinstance(calendar.year, EVERY):
+            years = YearMatcher(step=calendar.year.interval)
+        elif isinstance(calendar.year, int) and 1 <= calendar.year <= 9999:
+            years = YearMatcher(value=calendar.year)
         else:
-            diff = day - dt.weekday()
-            dt = dt + timedelta(days=diff)
+            raise ValueError(f"year must be between 1 and 9999, not {calendar.year!r}")
+
+        times = (get_allowed(calendar.hour, 0, 23, "hour"),
+                 get_allowed(calendar.minute, 0, 59, "minute"),
+                 get_allowed(calendar.second, 0, 59, "second"))
+
+        if calendar.month_anchor:
+            return cls(True, years, get_allowed(calendar.day, 0, 30, "day"), times,
+                       months=get_allowed(calendar.month, 0, 11, "month"))
 
-    month = changes.pop("month", None)
-    if month is not None:
-        changes["month"] = month + 1
+        return cls(False, years, get_allowed(calendar.day, 0, 6, "day"), times,
+                   weeks=get_allowed(calendar.week, 1, 53, "week"))
 
-    week = changes.pop("week", None)
-    if week is not None:
-        diff = week - get_datetime_prop(dt, month_anchor, "week")
-        dt = dt + timedelta(weeks=diff)
+    @classmethod
+    def from_cron(cls, expression: str) -> "CompiledCalendar":
+        """Compile a cron expression (minute, hour, day of month, month, day of week).
+
+        Like in cron a day matches if either the day of the month or the weekday
+        matches when both of them are restricted.
+
+        Raises:
+            `ValueError` if the expression is invalid
+        """
+        expression = CRON_MACROS.get(expression.lower(), expression)
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"a cron expression needs 5 fields, not {len(parts)}")
+        minute, hour, dom, month, dow = parts
+
+        minutes = parse_cron_field(minute, 0, 59)
+        hours = parse_cron_field(hour, 0, 23)
+        days = tuple(day - 1 for day in parse_cron_field(dom, 1, 31))
+        months = tuple(m - 1 for m in parse_cron_field(month, 1, 12, MONTH_NAMES))
+        # cron counts the weekdays from sunday (0 or 7), python from monday
+        weekdays = tuple(sorted({(day - 1) % 7 for day in parse_cron_field(dow, 0, 7, WEEKDAY_NAMES)}))
+
+        dom_any, dow_any = dom.startswith("*"), dow.startswith("*")
+        return cls(True, YearMatcher(), days, (hours, minutes, (0,)), months=months,
+                   weekdays=None if dow_any else weekdays, days_or=not (dom_any or dow_any))
+
+    def get_month_days(self, year: int, month: int) -> Tuple[int, ...]:
+        """Allowed days (0-based) of the given month."""
+        length = monthrange(year, month + 1)[1]
+        first_weekday = date(year, month + 1, 1).weekday()
+        key = (length, first_weekday)
+        days = self._month_days.get(key)
+        if days is None:
+            by_day = {day for day in self.days if day < length}
+            if self.weekdays is not None:
+                by_weekday = {day for day in range(length) if (first_weekday + day) % 7 in self.weekdays}
+                by_day = by_day | by_weekday if self.days_or else by_day & by_weekday
+            days = self._month_days[key] = tuple(sorted(by_day))
+        return days
+
+    def next_date_by_month(self, start: date) -> Optional[date]:
+        year, month, day = start.year, start.month - 1, start.day - 1
+        limit = (self.years.next(year) or year) + self.years.search_span
+        while year <= min(limit, MAXYEAR):
+            allowed_year = self.years.next(year)
+            if allowed_year is None:
+                return None
+            if allowed_year != year:
+                year, month, day = allowed_year, 0, 0
+                continue
 
-    return dt.replace(**changes)
+            i = bisect_left(self.months, month)
+            if i == len(self.months):
+                year, month, day = year + 1, 0, 0
+                continue
+            if self.months[i] != month:
+                month, day = self.months[i], 0
+
+            days = self.get_month_days(year, month)
+            j = bisect_left(days, day)
+            if j == len(days):
+                month, day = month + 1, 0
+                if month == 12:
+                    year, month = year + 1, 0
+                continue
 
+            return date(year, month + 1, days[j] + 1)
+        return None
+
+    def next_date_by_week(self, start: date) -> Optional[date]:
+        year, week, day = start.isocalendar()
+        day -= 1
+        limit = (self.years.next(year) or year) + self.years.search_span
+        while year <= min(limit, MAXYEAR - 1):
+            allowed_year = self.years.next(year)
+            if allowed_year is None:
+                return None
+            if allowed_year != year:
+                year, week, day = allowed_year, 1, 0
+                continue
 
-def get_datetime_prop(dt: datetime, month_anchor: bool, prop: str) -> int:
-    if prop == "week":
-        return dt.day // 7 + 1 if month_anchor else dt.isocalendar()[1]
-    elif prop == "day":
-        return dt.day - 1 if month_anchor else dt.weekday()
-    elif prop == "month":
-        return dt.month - 1
+            found = next_in_product((self.weeks, self.days), (week, day))
+            if found is None or found[0] > iso_weeks_in_year(year):
+                year, week, day = year + 1, 1, 0
+                continue
 
-    return getattr(dt, prop)
+            week, day = found
+            return iso_week_start(year, week) + timedelta(days=day)
+        return None
+
+    def next_date(self, start: date) -> Optional[date]:
+        """First allowed date which is not before *start*."""
+        if self.month_anchor:
+            return self.next_date_by_month(start)
+        return self.next_date_by_week(start)
+
+    def get_date_mask(self, days: "numpy.ndarray") -> "numpy.ndarray":
+        """Vectorised check which of the *days* (``datetime64[D]``) are allowed."""
+        weekdays = (days.astype("int64") + 3) % 7  # 1970-01-01 was a thursday
+        if self.month_anchor:
+            months = days.astype("datetime64[M]")
+            mask = self.years.matches(months.astype("datetime64[Y]").astype("int64") + 1970)
+            mask &= np.isin(months.astype("int64") % 12, self.months)
+            by_day = np.isin((days - months).astype("int64"), self.days)
+            if self.weekdays is not None:
+                by_weekday = np.isin(weekdays, self.weekdays)
+                by_day = by_day | by_weekday if self.days_or else by_day & by_weekday
+            return mask & by_day
+
+        # the ISO year and week are those of the thursday of the same week
+        thursdays = days + (3 - weekdays).astype("timedelta64[D]")
+        iso_years = thursdays.astype("datetime64[Y]")
+        iso_weeks = (thursdays - iso_years.astype("datetime64[D]")).astype("int64") // 7 + 1
+        mask = self.years.matches(iso_years.astype("int64") + 1970)
+        return mask & np.isin(iso_weeks, self.weeks) & np.isin(weekdays, self.days)
+
+    def get_time_offsets(self) -> "numpy.ndarray":
+        """Sorted seconds since midnight of all allowed times of a day."""
+        hours, minutes, seconds = (np.array(values, dtype="int64") for values in self.times)
+        offsets = hours[:, None, None] * 3600 + minutes[None, :, None] * 60 + seconds[None, None, :]
+        return offsets.ravel()
+
+    def events_between(self, start: datetime, end: datetime) -> "numpy.ndarray":
+        """All matching instants after *start* up to and including *end*.
+
+        Returns:
+            Sorted ``datetime64[s]`` array
+        """
+        require_numpy()
+        first, last = to_datetime64(start), to_datetime64(end)
+        if last <= first:
+            return np.array([], dtype="datetime64[s]")
+
+        days = np.arange(first.astype("datetime64[D]"), last.astype("datetime64[D]") + 1)
+        days = days[self.get_date_mask(days)]
+        offsets = self.get_time_offsets().astype("timedelta64[s]")
+
+        events = (days.astype("datetime64[s]")[:, None] + offsets[None, :]).ravel()
+        lo, hi = np.searchsorted(events, [first, last], side="right")
+        return events[lo:hi]
+
+    def next_event(self, current: datetime) -> Optional[datetime]:
+        """First matching instant after *current* or `None` if there is none."""
+        start = current.replace(microsecond=0) + timedelta(seconds=1)
+        day, time_of_day = start.date(), (start.hour, start.minute, start.second)
+
+        while True:
+            next_day = self.next_date(day)
+            if next_day is None:
+                return None
+            if next_day != day:
+                time_of_day = (0, 0, 0)
+
+            found = next_in_product(self.times, time_of_day)
+            if found is not None:
+                return datetime.combine(next_day, time(*found))
+
+            day, time_of_day = next_day + timedelta(days=1), (0, 0, 0)
 
 
 class Calendar:
+    """Decides when a `Task` runs.
+
+    The fields are compiled into a `CompiledCalendar` when the Calendar
+    is created so `next_event` doesn't have to try every candidate.
+
+    Attributes:
+        cron: The cron expression if the Calendar was built from one. The
+            other fields are `None` in that case.
+    """
+
     month_anchor: bool
+    cron: Optional[str]
     year: IntervalValue
     month: Optional[IntervalValue]
     week: Optional[IntervalValue]
@@ -104,7 +486,19 @@ class Calendar:
     minute: IntervalValue
     second: IntervalValue
 
-    def __init__(self, **kwargs):
+    def __init__(self, cron: str = None, **kwargs):
+        """
+        Raises:
+            `ValueError` if a field or the cron expression can never match
+        """
+        self.cron = cron
+        if cron is not None:
+            for interval in INTERVALS:
+                setattr(self, interval, None)
+            self.month_anchor = True
+            self._compiled = CompiledCalendar.from_cron(cron)
+            return
+
         _found_value = False
         _found_start = False
 
@@ -137,8 +531,12 @@ class Calendar:
             setattr(self, interval, value)
 
         self.month_anchor = self.month is not None
+        self._compiled = CompiledCalendar.from_calendar(self)
 
     def __repr__(self) -> str:
+        if self.cron is not None:
+            return f"[{self.cron}]"
+
         int_details = []
         for interval in INTERVALS:
             val = getattr(self, interval)
@@ -158,7 +556,15 @@ class Calendar:
 
     @classmethod
     def from_config(cls, config: Union[str, dict]) -> "Calendar":
+        """Build a Calendar from a preset, an instruction or a cron expression.
+
+        Raises:
+            `ValueError` if the config describes a Calendar which never matches
+        """
         if isinstance(config, str):
+            if is_cron(config):
+                return cls(cron=config.strip("[] "))
+
             preset = find_preset(config.lower().replace(" ", "_"))
 
             if not preset:
@@ -195,23 +601,53 @@ class Calendar:
 
         return data
 
-    def next_event(self, current: datetime) -> datetime:
-        next_time = current.replace(microsecond=0)
-
-        for interval in reversed(INTERVALS):
-            value = getattr(self, interval)
-            if isinstance(value, EVERY):
-                current_value = get_datetime_prop(next_time, self.month_anchor, interval)
-                last_value = value.interval * (current_value // value.interval)
-                try:
-                    next_time = set_datetime_prop(next_time, self.month_anchor, **{interval: last_value + value.interval})
-                except ValueError:
-                    next_time = set_datetime_prop(next_time, self.month_anchor, **{interval: value.interval})
-                else:
-                    break
-            elif value is not None:
-                next_time = set_datetime_prop(next_time, self.month_anchor, **{interval: value})
-                if next_time > current:
-                    break
+    def events_between(self, start: datetime, end: datetime) -> "numpy.ndarray":
+        """Calculate all events after *start* up to and including *end* at once.
+
+        This is much faster than calling `next_event` in a loop, but the whole
+        result is kept in memory (8 bytes per event).
+
+        Returns:
+            Sorted ``numpy.datetime64`` array with a resolution of seconds
 
+        Raises:
+            `ImportError` if numpy isn't installed
+        """
+        return self._compiled.events_between(start, end)
+
+    def next_event(self, current: datetime) -> datetime:
+        """Calculate the first event after *current*.
+
+        Raises:
+            `ValueError` if there's no event after *current*
+        """
+        next_time = self._compiled.next_event(current)
+        if next_time is None:
+            raise ValueError(f"{self} has no event after {current}")
         return next_time
+
+
+def events_between(calendars: Sequence[Calendar], start: datetime, end: datetime) -> Tuple["numpy.ndarray", "numpy.ndarray"]:
+    """Merge the events of several calendars after *start* up to and including *end*.
+
+    Args:
+        calendars: Calendars to expand, e.g. those of all tasks
+        start: Exclusive start of the range
+        end: Inclusive end of the range
+
+    Returns:
+        A tuple of the sorted ``datetime64[s]`` events and the index of the calendar
+        each event belongs to. Events at the same time are ordered by index.
+
+    Raises:
+        `ImportError` if numpy isn't installed
+    """
+    require_numpy()
+    if not calendars:
+        return np.array([], dtype="datetime64[s]"), np.array([], dtype="int64")
+
+    events = [calendar.events_between(start, end) for calendar in calendars]
+    indices = np.repeat(np.arange(len(events), dtype="int64"), [len(e) for e in events])
+    events = np.concatenate(events)
+    order = np.argsort(events, kind="stable")
+    return events[order], indices[order]
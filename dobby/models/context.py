@@ -1,8 +1,14 @@
 import copy
-from typing import Any, Optional, TYPE_CHECKING
+import threading
+import time
+from multiprocessing.managers import BaseProxy
+from typing import Any, List, Optional, TYPE_CHECKING
+
+from ..errors import JobCancelledError
 
 if TYPE_CHECKING:
     from .job import Job
+    from .retry import Attempt
     from .slave import Slave
     from .task import Task
     from ..dobby import Dobby
@@ -18,6 +24,9 @@ class Context:
     kwargs: dict
     result: Any
     exception: Optional[Exception]
+    deadline: Optional[float]
+    cancel_event: threading.Event
+    attempts: List["Attempt"]
 
     def __init__(self, dobby: "Dobby", **kwargs):
         self.dobby = dobby
@@ -29,6 +38,9 @@ class Context:
         self.kwargs = kwargs.pop("kwargs", None)
         self.result = kwargs.pop("result", None)
         self.exception = kwargs.pop("exception", None)
+        self.deadline = kwargs.pop("deadline", None)
+        self.cancel_event = kwargs.pop("cancel_event", None) or threading.Event()
+        self.attempts = kwargs.pop("attempts", None) or []
 
     def __str__(self) -> str:
         return "Context matters!"
@@ -36,6 +48,29 @@ class Context:
     def copy(self) -> "Context":
         return copy.copy(self)
 
+    @property
+    def cancelled(self) -> bool:
+        """Whether the job running with this `Context` should stop."""
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        """Signal the slave that it should stop as soon as possible."""
+        self.cancel_event.set()
+
+    def raise_if_cancelled(self):
+        """Raise a `JobCancelledError` if the `Context` was cancelled.
+
+        Long-running slaves should call this between units of work.
+        """
+        if self.cancelled:
+            raise JobCancelledError(f"{self.job or self.task} was cancelled")
+
+    def time_left(self) -> Optional[float]:
+        """Seconds until the deadline of the `Context` or `None` if there is none."""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
     def prettify(self) -> str:
         lines = []
         for key, value in vars(self).items():
@@ -44,3 +79,67 @@ class Context:
             lines.append(f"{key}: {value}")
 
         return "\n".join(lines)
+
+
+class ProcessContext:
+    """A picklable, slimmed-down `Context`.
+
+    Slaves running in a worker process receive this instead of a `Context`
+    because most of the objects referenced by the `Context` (like `Dobby`
+    itself) can't be sent to another process.
+
+    Attributes:
+        taskid: Id of the `Task` the job belongs to
+        jobid: Id of the `Job` that is running
+        slave: Qualified name of the `Slave`
+        input_args: Arguments as they were passed in the config file
+        kwargs: Converted arguments passed to the slave
+        deadline: `time.monotonic` value by which the job has to be done
+        cancel_event: Event shared with the `Context`, set when the job is cancelled
+    """
+    taskid: Optional[str]
+    jobid: Optional[str]
+    slave: Optional[str]
+    input_args: dict
+    kwargs: dict
+    deadline: Optional[float]
+    cancel_event: Any
+
+    def __init__(self, **kwargs):
+        self.taskid = kwargs.pop("taskid", None)
+        self.jobid = kwargs.pop("jobid", None)
+        self.slave = kwargs.pop("slave", None)
+        self.input_args = kwargs.pop("input_args", None)
+        self.kwargs = kwargs.pop("kwargs", None)
+        self.deadline = kwargs.pop("deadline", None)
+        self.cancel_event = kwargs.pop("cancel_event", None)
+
+    def __repr__(self) -> str:
+        return f"<ProcessContext {self.jobid}>"
+
+    def time_left(self) -> Optional[float]:
+        """Seconds until the deadline or `None` if there is none."""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the job should stop, see `Context.cancelled`."""
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def raise_if_cancelled(self):
+        """Raise a `JobCancelledError` if the job was cancelled."""
+        if self.cancelled:
+            raise JobCancelledError(f"{self.jobid} was cancelled")
+
+    @classmethod
+    def from_context(cls, ctx: Context) -> "ProcessContext":
+        return cls(taskid=ctx.task.taskid if ctx.task else None,
+                   jobid=ctx.job.jobid if ctx.job else None,
+                   slave=ctx.slave.qualified_name if ctx.slave else None,
+                   input_args=ctx.input_args,
+                   kwargs=ctx.kwargs,
+                   deadline=ctx.deadline,
+                   # only events of a multiprocessing manager can be shared with the worker
+                   cancel_event=ctx.cancel_event if isinstance(ctx.cancel_event, BaseProxy) else None)
@@ -2,7 +2,7 @@ import abc
 import importlib
 import inspect
 import logging
-from typing import Any, Callable, Mapping, Type, Union
+from typing import Any, Callable, Dict, Mapping, Type, Union
 
 from ..errors import ConversionError
 
@@ -30,6 +30,13 @@ class Converter(abc.ABC):
     def convert(self, arg: Any, **kwargs) -> Any:
         pass
 
+    def release(self, value: Any):
+        """Free the resources held by a *value* this converter returned.
+
+        Called when the `Job` using the value is closed. Does nothing by default.
+        """
+        pass
+
 
 class FuncConverter(Converter):
     def __init__(self, func: Callable, **kwargs):
@@ -73,50 +80,122 @@ def converter(*targets: Any, **kwargs):
                 raise KeyError(f"There's already a converter for {target}")
             CONVERTER_MAP[target] = _converter
 
+        PIPELINES.invalidate()
         return _converter
 
     return decorator
 
 
+Pipeline = Callable[..., Any]
+
+
+class PipelineCache:
+    """Compiled conversion pipelines by their target.
+
+    The cache is cleared whenever a new converter is registered because the
+    registration can change how a target is converted.
+
+    Attributes:
+        generation: Incremented every time the cache is cleared so that pipelines
+            held elsewhere (like by `Slave`) can tell that they're outdated.
+    """
+    generation: int
+
+    def __init__(self):
+        self.generation = 0
+        self._pipelines: Dict[Any, Pipeline] = {}
+
+    def get(self, target: Any) -> Pipeline:
+        try:
+            return self._pipelines[target]
+        except KeyError:
+            pipeline = self._pipelines[target] = compile_pipeline(target)
+            return pipeline
+        except TypeError:
+            # unhashable annotation
+            return compile_pipeline(target)
+
+    def invalidate(self):
+        self._pipelines.clear()
+        self.generation += 1
+
+
+PIPELINES = PipelineCache()
+
+
+def _compile_union(target: Any) -> Pipeline:
+    types = getattr(target, "__args__")
+    instance_types = tuple(_type for _type in types if inspect.isclass(_type))
+    branches = [(_type, PIPELINES.get(_type)) for _type in types]
+
+    def convert_union(arg, **kwargs):
+        if isinstance(arg, instance_types):
+            return arg
+
+        last_exc = None
+        for _type, pipeline in branches:
+            try:
+                return pipeline(arg, **kwargs)
+            except Exception as e:
+                last_exc = e
+                log.debug(f"Couldn't coerce {arg!r} to {_type}")
+        raise ConversionError(f"Couldn't convert {arg!r} to any of {target}", value=arg, converter=target) from last_exc
+
+    return convert_union
+
+
+def compile_pipeline(target: Any) -> Pipeline:
+    """Resolve the converter for *target* once.
+
+    The expensive part of converting a value is figuring out *how* to
+    convert it. The returned callable does only the conversion.
+
+    Returns:
+        Callable which takes the value to convert (and the keyword arguments
+        for the converter) and returns the converted value
+    """
+    if getattr(target, "__origin__", None) is Union:
+        return _compile_union(target)
+
+    _converter = CONVERTER_MAP.get(target, target)
+
+    if inspect.isclass(_converter) and issubclass(_converter, Converter):
+        func = _converter().convert
+    elif inspect.isclass(_converter) and hasattr(_converter, "convert") and inspect.ismethod(_converter.convert):
+        func = _converter.convert
+    elif isinstance(_converter, Converter):
+        func = _converter.convert
+    else:
+        def func(arg, **kwargs):
+            return _converter(arg)
+
+    def convert_value(arg, **kwargs):
+        try:
+            return func(arg, **kwargs)
+        except ConversionError:
+            raise
+        except Exception as e:
+            raise ConversionError(f"Couldn't convert {arg!r} using {_converter}", value=arg, converter=_converter,
+                                  hint="Make sure that you're passing a valid value for the parameter \"{self.key}\"") from e
+
+    return convert_value
+
+
+def release(_converter, value):
+    """Let the converter for the type hint *_converter* free the resources of *value*."""
+    if getattr(_converter, "__origin__", None) is Union:
+        for _type in getattr(_converter, "__args__"):
+            release(_type, value)
+        return
+
+    _converter = CONVERTER_MAP.get(_converter, _converter)
+    if isinstance(_converter, Converter):
+        _converter.release(value)
+
+
 def convert(_converter, arg, **kwargs):
-    origin = getattr(_converter, "__origin__", False)
-    if origin:
-        if origin is Union:
-            types = getattr(_converter, "__args__")
-            if isinstance(arg, types):
-                return arg
-            else:
-                for _type in types:
-                    last_exc = None
-                    try:
-                        return convert(_type, arg, **kwargs)
-                    except ConversionError:
-                        raise
-                    except Exception as e:
-                        e.__cause__ = last_exc
-                        last_exc = e
-                        log.debug(f"Couldn't coerce {arg!r} to {_type}")
-                    raise ConversionError(f"Couldn't convert {arg!r} to any of {_converter}", value=arg, converter=_converter) from last_exc
-
-    if _converter in CONVERTER_MAP:
-        _converter = CONVERTER_MAP[_converter]
-
-    try:
-        if inspect.isclass(_converter):
-            if issubclass(_converter, Converter):
-                inst = _converter()
-                return inst.convert(arg, **kwargs)
-            elif hasattr(_converter, "convert") and inspect.ismethod(_converter.convert):
-                return _converter.convert(arg, **kwargs)
-        elif isinstance(_converter, Converter):
-            return _converter.convert(arg, **kwargs)
-
-        return _converter(arg)
-    except ConversionError:
-        raise
-    except Exception as e:
-        raise ConversionError(f"Couldn't convert {arg!r} using {_converter}", value=arg, converter=_converter,
-                              hint="Make sure that you're passing a valid value for the parameter \"{self.key}\"") from e
+    """Convert *arg* for the type hint *_converter* using the registered converters."""
+    return PIPELINES.get(_converter)(arg, **kwargs)
 
 
 importlib.import_module("._builtin_converters", __package__)
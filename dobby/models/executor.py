@@ -0,0 +1,276 @@
+import abc
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Set, TYPE_CHECKING, Tuple, Type
+
+from .context import Context
+from ..errors import SetupError
+
+if TYPE_CHECKING:
+    from .task import Task
+
+log = logging.getLogger(__name__)
+
+EXECUTOR_MAP = {}
+
+
+def register_executor(name: str):
+    """Register an `Executor` class under the given name.
+
+    Args:
+        name: Value of the ``executor`` key in the config file
+    """
+
+    def decorator(cls: Type["Executor"]) -> Type["Executor"]:
+        EXECUTOR_MAP[name] = cls
+        return cls
+
+    return decorator
+
+
+def get_max_workers(config) -> Optional[int]:
+    """Read the ``max_workers`` key from the config.
+
+    Raises:
+        `SetupError` if the value isn't a positive number
+    """
+    max_workers = config.get("max_workers")
+    if max_workers is not None:
+        try:
+            max_workers = int(max_workers)
+        except (TypeError, ValueError):
+            raise SetupError(f"max_workers must be a number, not {max_workers!r}")
+        if max_workers < 1:
+            raise SetupError(f"max_workers must be at least 1, not {max_workers}")
+
+    return max_workers
+
+
+def get_task(item) -> "Task":
+    """The `Task` behind an entry of the `Scheduler`, e.g. the task of a `TaskTrigger`."""
+    return getattr(item, "task", item)
+
+
+def runs_all(task: "Task") -> bool:
+    """Whether *task* wants every execution to run even if the previous one is still running."""
+    return getattr(task, "misfire_policy", None) == "run_all"
+
+
+class Executor(abc.ABC):
+    """Runs due `Tasks <Task>` for `Dobby`."""
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__}>"
+
+    @classmethod
+    def load(cls, config) -> "Executor":
+        """Build the `Executor` based on the ``executor`` and ``max_workers`` config keys.
+
+        Args:
+            config: `Config` to read the settings from
+
+        Returns:
+            `Executor` instance. Defaults to `SyncExecutor`.
+
+        Raises:
+            `SetupError` if the executor doesn't exist
+        """
+        name = config.get("executor", "sync")
+        executor_cls = EXECUTOR_MAP.get(str(name).lower())
+        if not executor_cls:
+            raise SetupError(f"Unknown executor \"{name}\"",
+                             hint=f"Use one of the following executors: {', '.join(EXECUTOR_MAP)}")
+
+        return executor_cls.from_config(config)
+
+    @classmethod
+    def from_config(cls, config) -> "Executor":
+        return cls()
+
+    @abc.abstractmethod
+    def submit(self, task: "Task", ctx: Context):
+        """Run *task* now or as soon as possible.
+
+        Args:
+            task: `Task` to execute
+            ctx: `Context` to pass to the `Task`
+        """
+        pass
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting new `Tasks <Task>`.
+
+        Args:
+            wait: Whether to block until all running `Tasks <Task>` are done
+        """
+        pass
+
+
+@register_executor("sync")
+class SyncExecutor(Executor):
+    """Runs the `Tasks <Task>` one after another on the calling thread."""
+
+    def submit(self, task: "Task", ctx: Context):
+        task.execute(ctx)
+
+
+@register_executor("threads")
+class ThreadExecutor(Executor):
+    """Runs the `Tasks <Task>` in a bounded pool of worker threads.
+
+    When all workers are busy the `Tasks <Task>` are queued and dispatched
+    by their priority (highest first). A `Task` is never run concurrently
+    with itself, if it's due again while it's still running or waiting for
+    a worker the execution is skipped. Only `Tasks <Task>` with the misfire
+    policy ``run_all`` are queued to run again once they're done.
+
+    Attributes:
+        max_workers: Maximum amount of `Tasks <Task>` running at the same time
+        pending: Heap of ``(-priority, count, item, ctx)`` waiting for a worker
+        running: Set of the `Tasks <Task>` that are currently running
+    """
+
+    max_workers: int
+    pending: List[Tuple[int, int, "Task", Context]]
+    running: Set["Task"]
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.pending = []
+        self.running = set()
+
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="dobby-task")
+        self._lock = threading.RLock()
+        self._idle = threading.Condition(self._lock)
+        self._counter = itertools.count()
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {len(self.running)}/{self.max_workers} running>"
+
+    @classmethod
+    def from_config(cls, config) -> "ThreadExecutor":
+        return cls(get_max_workers(config))
+
+    def is_busy(self, task: "Task") -> bool:
+        """Check whether *task* is running or waiting for a worker."""
+        with self._lock:
+            return task in self.running or any(get_task(entry[2]) is task for entry in self.pending)
+
+    def submit(self, task: "Task", ctx: Context):
+        item, task = task, get_task(task)
+        with self._lock:
+            if self.is_busy(task) and not runs_all(task):
+                log.warning(f"{task} is still running, skipping this execution")
+                return
+
+            heapq.heappush(self.pending, (-item.priority, next(self._counter), item, ctx))
+            self._dispatch()
+
+    def _dispatch(self):
+        with self._lock:
+            deferred = []
+            while self.pending and len(self.running) < self.max_workers:
+                entry = heapq.heappop(self.pending)
+                _, _, item, ctx = entry
+                task = get_task(item)
+                if task in self.running:
+                    deferred.append(entry)
+                    continue
+
+                self.running.add(task)
+                future = self._pool.submit(item.execute, ctx)
+                future.add_done_callback(partial(self._on_done, task))
+
+            for entry in deferred:
+                heapq.heappush(self.pending, entry)
+
+    def _on_done(self, task: "Task", future: Future):
+        exc: Optional[BaseException] = future.exception()
+        if exc:
+            log.error(f"{task} failed", exc_info=exc)
+
+        with self._lock:
+            self.running.discard(task)
+            self._dispatch()
+            self._idle.notify_all()
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if wait:
+                self._idle.wait_for(lambda: not (self.pending or self.running))
+            else:
+                self.pending.clear()
+        self._pool.shutdown(wait=wait)
+
+
+@register_executor("async")
+class AsyncExecutor(Executor):
+    """Runs the `Tasks <Task>` on the running `asyncio` event loop.
+
+    Every due `Task` becomes an `asyncio.Task`. Coroutine slaves are awaited
+    directly and regular slaves are offloaded to the default executor of the
+    loop, so many I/O bound jobs can overlap on a single thread.
+    Like the `ThreadExecutor` a `Task` is never run concurrently with itself.
+
+    Attributes:
+        max_workers: Size of the thread pool used for regular slaves. `None` keeps
+            the default of `asyncio`.
+        running: Maps the currently running `Tasks <Task>` to their `asyncio.Task`
+    """
+
+    max_workers: Optional[int]
+    running: Dict["Task", asyncio.Future]
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers
+        self.running = {}
+
+    @classmethod
+    def from_config(cls, config) -> "AsyncExecutor":
+        return cls(get_max_workers(config))
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Prepare the event loop the `Tasks <Task>` will be running on."""
+        if self.max_workers:
+            loop.set_default_executor(ThreadPoolExecutor(self.max_workers, thread_name_prefix="dobby-slave"))
+
+    def submit(self, task: "Task", ctx: Context):
+        item, task = task, get_task(task)
+        previous = self.running.get(task)
+        if previous and not runs_all(task):
+            log.warning(f"{task} is still running, skipping this execution")
+            return
+
+        future = asyncio.ensure_future(self._execute(item, ctx, previous))
+        self.running[task] = future
+        future.add_done_callback(partial(self._on_done, task))
+
+    @staticmethod
+    async def _execute(item, ctx: Context, previous: Optional[asyncio.Future]):
+        if previous:
+            await asyncio.wait([previous])
+        await item.execute_async(ctx)
+
+    def _on_done(self, task: "Task", future: asyncio.Future):
+        if self.running.get(task) is future:
+            del self.running[task]
+        if future.cancelled():
+            return
+
+        exc = future.exception()
+        if exc:
+            log.error(f"{task} failed", exc_info=exc)
+
+    def shutdown(self, wait: bool = True):
+        """Cancel all running `Tasks <Task>`.
+
+        *wait* is ignored because blocking would also block the event loop.
+        """
+        for future in self.running.values():
+            future.cancel()
@@ -1,8 +1,14 @@
+import asyncio
 import logging
-from typing import TYPE_CHECKING
+import threading
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
 
 from .context import Context
-from .slave import Slave
+from .retry import RetryPolicy
+from .slave import ISOLATION_MODES, Slave
+from ..config import to_normal
+from ..errors import JobTimeoutError, SetupError
+from ..utils import human_timedelta, parse_duration
 
 if TYPE_CHECKING:
     from .task import Task
@@ -15,16 +21,32 @@ class Job:
     jobname: str
     slave: Slave
     priority: int
+    isolation: Optional[str]
+    needs: List[str]
+    timeout: Optional[float]
+    retry: Optional[RetryPolicy]
+    config: Optional[dict]
     raw_kwargs: dict
     kwargs: dict
+    diagnostics: Dict[str, Any]
 
-    def __init__(self, task: "Task", jobname: str, slave: Slave, priority: int = 0, **kwargs):
+    def __init__(self, task: "Task", jobname: str, slave: Slave, priority: int = 0, isolation: str = None, needs: List[str] = None,
+                 timeout: float = None, retry: RetryPolicy = None, **kwargs):
         self.task = task
         self.jobname = jobname
         self.slave = slave
         self.priority = priority
+        self.needs = list(needs or [])
+        self.timeout = timeout
+        self.retry = retry
+        self.isolation = isolation or slave.isolation
+        if self.isolation not in ISOLATION_MODES:
+            raise SetupError(f"{self} uses unknown isolation \"{self.isolation}\"",
+                             hint="Leave it empty or use \"process\" to run the job in a worker process")
         self.raw_kwargs = kwargs
         self.kwargs = {}
+        self.diagnostics = {}
+        self.config = None
 
         self.prepare()
 
@@ -33,10 +55,22 @@ class Job:
 
     @classmethod
     def load(cls, task: "Task", jobname: str, config) -> "Job":
+        snapshot = to_normal(config)
         slave_id = config.pop("slave")
         slave = task.dobby.get_slave(slave_id)
         priority = config.pop("priority", 0)
-        return cls(task, jobname, slave, priority, **config)
+        isolation = config.pop("isolation", None)
+        needs = config.pop("needs", None)
+        if isinstance(needs, str):
+            needs = [needs]
+        try:
+            timeout = parse_duration(config.pop("timeout", None))
+        except ValueError as e:
+            raise SetupError(f"Job {task.taskid}-{jobname} has an invalid timeout", hint=str(e))
+        retry = RetryPolicy.load(config.pop("retry", None))
+        inst = cls(task, jobname, slave, priority, isolation, needs, timeout, retry, **config)
+        inst.config = snapshot
+        return inst
 
     @property
     def jobid(self) -> str:
@@ -45,9 +79,112 @@ class Job:
     def prepare(self):
         log.debug(f"{self} preparing")
         self.kwargs = self.slave.transform_arguments(self.raw_kwargs)
+        self.run_checks()
 
-    def run(self, ctx: Context):
+    def run_checks(self, force: bool = False):
+        """Run the checks of the slave.
+
+        Args:
+            force: Run the checks which only run on request as well
+
+        Raises:
+            `SetupError` if a check refuses the job
+        """
+        for check in self.slave.checks:
+            check(self, force)
+
+    def close(self):
+        """Release the prepared arguments, for instance shared database connections.
+
+        The job can't run anymore afterwards.
+        """
+        kwargs, self.kwargs = self.kwargs, {}
+        if kwargs:
+            log.debug(f"{self} closing")
+            self.slave.release_arguments(kwargs)
+
+    def prepare_context(self, ctx: Context):
         ctx.job = self
         ctx.input_args = self.raw_kwargs
         ctx.kwargs = self.kwargs
-        self.slave.invoke(ctx)
+        if self.isolation == "process":
+            # the worker process has to see the cancellation as well
+            ctx.cancel_event = self.task.dobby.process_manager.Event()
+        else:
+            ctx.cancel_event = threading.Event()
+
+    def get_timeout(self, ctx: Context) -> Optional[float]:
+        """Seconds the job may run for based on its own timeout and the deadline of the `Context`."""
+        timeouts = [timeout for timeout in (self.timeout, ctx.time_left()) if timeout is not None]
+        return min(timeouts) if timeouts else None
+
+    def time_out(self, ctx: Context, timeout: float):
+        """Cancel the `Context` and mark the job as timed out."""
+        duration = human_timedelta(timeout) if timeout >= 1 else f"{max(timeout, 0):.1f} second(s)"
+        log.warning(f"{self} timed out after {duration}")
+        ctx.cancel()
+        ctx.exception = JobTimeoutError(f"{self} didn't finish within {duration}", timeout=timeout)
+
+    def invoke(self, ctx: Context):
+        if self.isolation == "process":
+            self.slave.invoke_process(ctx, self.task.dobby.process_pool)
+        else:
+            self.slave.invoke(ctx)
+
+    def _invoke_in_thread(self, ctx: Context):
+        try:
+            self.invoke(ctx)
+        except Exception as e:
+            ctx.exception = e
+
+    async def invoke_async(self, ctx: Context):
+        if self.isolation == "process":
+            await self.slave.invoke_process_async(ctx, self.task.dobby.process_pool)
+        else:
+            await self.slave.invoke_async(ctx)
+
+    def run(self, ctx: Context):
+        """Run the slave with *ctx*.
+
+        If the job has a timeout the slave runs on a separate thread. When it
+        doesn't finish in time the `Context` is cancelled and its exception set
+        to a `JobTimeoutError`. The slave itself keeps running until it notices
+        the cancellation.
+        """
+        self.prepare_context(ctx)
+        timeout = self.get_timeout(ctx)
+        if timeout is None:
+            self.invoke(ctx)
+            return
+        elif timeout <= 0:
+            self.time_out(ctx, timeout)
+            return
+
+        job_ctx = ctx.copy()
+        thread = threading.Thread(target=self._invoke_in_thread, args=(job_ctx,), name=f"dobby-{self.jobid}", daemon=True)
+        thread.start()
+        thread.join(timeout)
+
+        if thread.is_alive():
+            self.time_out(ctx, timeout)
+        else:
+            vars(ctx).update(vars(job_ctx))
+
+    async def run_async(self, ctx: Context):
+        """Like `run` but on the event loop. Coroutine slaves are cancelled on timeout."""
+        self.prepare_context(ctx)
+        timeout = self.get_timeout(ctx)
+        if timeout is None:
+            await self.invoke_async(ctx)
+            return
+        elif timeout <= 0:
+            self.time_out(ctx, timeout)
+            return
+
+        job_ctx = ctx.copy()
+        try:
+            await asyncio.wait_for(self.invoke_async(job_ctx), timeout)
+        except asyncio.TimeoutError:
+            self.time_out(ctx, timeout)
+        else:
+            vars(ctx).update(vars(job_ctx))
@@ -0,0 +1,229 @@
+import logging
+import random
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Set, TYPE_CHECKING
+
+from .context import Context
+from ..errors import SetupError
+from ..utils import human_timedelta, parse_duration
+
+if TYPE_CHECKING:
+    from .job import Job
+    from .task import Task
+
+log = logging.getLogger(__name__)
+
+
+class Attempt(NamedTuple):
+    """Record of a single run of a `Job`.
+
+    These are stored in ``ctx.attempts`` so reports can show how often a job had to be retried.
+    """
+    number: int
+    started: datetime
+    duration: float
+    exception: Optional[Exception]
+
+
+class RetryPolicy:
+    """Decides whether and when a failed `Job` is run again.
+
+    The delay before the n-th retry is ``backoff * 2 ** (n - 1)`` seconds,
+    capped at *max_delay*. *jitter* randomly varies the delay by up to the
+    given fraction so jobs that failed together don't retry together.
+
+    Attributes:
+        attempts: Maximum amount of runs including the first one
+        backoff: Delay before the first retry in seconds
+        max_delay: Upper limit for the delay in seconds
+        jitter: Fraction of the delay which is randomised (0 - 1)
+    """
+
+    attempts: int
+    backoff: float
+    max_delay: Optional[float]
+    jitter: float
+
+    def __init__(self, attempts: int = 3, backoff: float = 30, max_delay: float = None, jitter: float = 0):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def __repr__(self) -> str:
+        return f"<RetryPolicy {self.attempts} attempts>"
+
+    @classmethod
+    def load(cls, config) -> Optional["RetryPolicy"]:
+        """Build a `RetryPolicy` from the ``retry`` key of a job.
+
+        The config may be a number (the amount of attempts), `True` to
+        use the defaults or a dict with the keys ``attempts``, ``backoff``,
+        ``max_delay`` and ``jitter``.
+
+        Raises:
+            `SetupError` if the config is invalid
+        """
+        if config is None or config is False:
+            return None
+        if config is True:
+            return cls()
+
+        try:
+            if isinstance(config, (int, str)):
+                return cls(int(config))
+
+            if not isinstance(config, dict):
+                raise ValueError(f"expected a number or an object, not {config!r}")
+
+            config = dict(config)
+            attempts = int(config.pop("attempts", 3))
+            backoff = parse_duration(config.pop("backoff", 30))
+            max_delay = parse_duration(config.pop("max_delay", None))
+            jitter = float(config.pop("jitter", 0))
+        except ValueError as e:
+            raise SetupError(f"Invalid retry configuration {config!r}", hint=str(e))
+
+        if config:
+            raise SetupError(f"Unknown retry keys: {', '.join(config)}",
+                             hint="Use attempts, backoff, max_delay and jitter to configure retries")
+        if not 0 <= jitter <= 1:
+            raise SetupError(f"Retry jitter must be between 0 and 1, not {jitter}")
+
+        return cls(attempts, backoff, max_delay, jitter)
+
+    def should_retry(self, attempt: int) -> bool:
+        """Whether another run is allowed after *attempt* runs."""
+        return attempt < self.attempts
+
+    def get_delay(self, attempt: int) -> float:
+        """Seconds to wait before retrying after *attempt* runs."""
+        delay = self.backoff * 2 ** (attempt - 1)
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        if self.max_delay is not None:
+            delay = min(delay, self.max_delay)
+        return max(delay, 0)
+
+
+class TaskRun:
+    """A single execution of a `Task` which may be spread over several retries.
+
+    The report of the `Task` is only sent once all retries are done.
+
+    Attributes:
+        task: `Task` that is running
+        ctx: `Context` of the `Task`
+        results: Maps the name of the jobs to their latest `Context`
+        pending: Names of the jobs waiting for a retry
+    """
+
+    task: "Task"
+    ctx: Context
+    results: Dict[str, Context]
+    pending: Set[str]
+
+    def __init__(self, task: "Task", ctx: Context, results: Dict[str, Context]):
+        self.task = task
+        self.ctx = ctx
+        self.results = results
+        self.pending = set()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"<TaskRun {self.task.taskid} {len(self.pending)} pending>"
+
+    def get_retry_delay(self, job: "Job") -> Optional[float]:
+        """Seconds until *job* should be retried or `None` if it shouldn't."""
+        job_ctx = self.results[job.jobname]
+        if not (job_ctx.exception and job.retry):
+            return None
+        if not job.retry.should_retry(len(job_ctx.attempts)):
+            log.warning(f"{job} failed after {len(job_ctx.attempts)} attempt(s)")
+            return None
+        return job.retry.get_delay(len(job_ctx.attempts))
+
+    def schedule_retries(self, jobs: List["Job"]) -> List["Job"]:
+        """Schedule a retry for all failed *jobs* with a `RetryPolicy`.
+
+        Returns:
+            The jobs that are going to be retried
+        """
+        delays = [(job, self.get_retry_delay(job)) for job in jobs]
+        delays = [(job, delay) for job, delay in delays if delay is not None]
+
+        with self._lock:
+            self.pending.update(job.jobname for job, _ in delays)
+
+        for job, delay in delays:
+            log.info(f"{job} failed ({self.results[job.jobname].exception!r}), retrying in {human_timedelta(delay)}")
+            retry = JobRetry(self, job, datetime.now() + timedelta(seconds=delay))
+            self.task.dobby.schedule(retry)
+
+        return [job for job, _ in delays]
+
+    def job_done(self, job: "Job") -> bool:
+        """Mark the retries of *job* as done.
+
+        Returns:
+            Whether this was the last pending job, i.e. the report is due
+        """
+        with self._lock:
+            self.pending.discard(job.jobname)
+            return not self.pending
+
+
+class JobRetry:
+    """Entry in the `Scheduler` which runs a failed `Job` again.
+
+    Attributes:
+        run: `TaskRun` the job belongs to
+        job: `Job` to retry
+        next_execution: When to retry the job
+        priority: Priority of the `Task`
+    """
+
+    run: TaskRun
+    job: "Job"
+    next_execution: datetime
+    priority: int
+
+    def __init__(self, run: TaskRun, job: "Job", next_execution: datetime):
+        self.run = run
+        self.job = job
+        self.next_execution = next_execution
+        self.priority = run.task.priority
+
+    def __repr__(self) -> str:
+        return f"<JobRetry {self.job.jobid} attempt {self.attempt}>"
+
+    @property
+    def attempt(self) -> int:
+        """Number of the attempt this retry is going to be."""
+        return len(self.run.results[self.job.jobname].attempts) + 1
+
+    def prepare_context(self) -> Context:
+        ctx = self.run.ctx.copy()
+        ctx.deadline = None
+        return ctx
+
+    def execute(self, ctx: Context = None):
+        """Run the job again and schedule another retry if it failed again.
+
+        Args:
+            ctx: Ignored, the `Context` of the original `Task` execution is used.
+        """
+        previous = self.run.results[self.job.jobname]
+        self.run.results[self.job.jobname] = self.run.task.run_job(self.job, self.prepare_context(), previous)
+
+        if not self.run.schedule_retries([self.job]) and self.run.job_done(self.job):
+            self.run.task.finish(self.run.ctx, self.run.results)
+
+    async def execute_async(self, ctx: Context = None):
+        """Like `execute` but on the event loop."""
+        previous = self.run.results[self.job.jobname]
+        self.run.results[self.job.jobname] = await self.run.task.run_job_async(self.job, self.prepare_context(), previous)
+
+        if not self.run.schedule_retries([self.job]) and self.run.job_done(self.job):
+            await self.run.task.finish_async(self.run.ctx, self.run.results)
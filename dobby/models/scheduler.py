@@ -0,0 +1,133 @@
+import heapq
+import itertools
+import threading
+from datetime import datetime
+from operator import attrgetter
+from typing import Dict, Iterator, List, Optional, TYPE_CHECKING, Tuple
+
+if TYPE_CHECKING:
+    from .task import Task
+
+_REMOVED = object()
+
+
+class Scheduler:
+    """A priority queue of `Tasks <Task>` ordered by their next execution.
+
+    Entries are keyed by ``(next_execution, -priority)`` so finding the next
+    due `Task` doesn't require looking at every single one. Removing a `Task`
+    only marks its entry as removed, the entry is discarded once it reaches
+    the top of the heap.
+
+    Apart from `Tasks <Task>` the queue accepts anything with a ``next_execution``
+    and a ``priority`` (like a `JobRetry`). All operations are thread-safe.
+
+    Attributes:
+        heap: The underlying heap of ``[next_execution, -priority, count, task]`` entries
+    """
+
+    heap: List[list]
+    _entries: Dict["Task", list]
+
+    def __init__(self, tasks: List["Task"] = None):
+        self.heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._lock = threading.RLock()
+
+        for task in tasks or []:
+            self.push(task)
+
+    def __repr__(self) -> str:
+        return f"<Scheduler {len(self)} task(s)>"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, task: "Task") -> bool:
+        return task in self._entries
+
+    def __iter__(self) -> Iterator["Task"]:
+        return (task for _, task in self.queue)
+
+    @property
+    def next_time(self) -> Optional[datetime]:
+        """The time at which the next `Task` is due or `None` if the queue is empty."""
+        with self._lock:
+            self._prune()
+            if self.heap:
+                return self.heap[0][0]
+            return None
+
+    @property
+    def queue(self) -> List[Tuple[datetime, "Task"]]:
+        """A sorted list of ``(next_execution, task)`` tuples for inspection."""
+        with self._lock:
+            entries = sorted(entry for entry in self.heap if entry[-1] is not _REMOVED)
+        return [(entry[0], entry[-1]) for entry in entries]
+
+    def _prune(self):
+        heap = self.heap
+        while heap and heap[0][-1] is _REMOVED:
+            heapq.heappop(heap)
+
+    def push(self, task: "Task"):
+        """Add a `Task` to the queue based on its ``next_execution``.
+
+        If the `Task` is already in the queue its old entry is replaced.
+
+        Args:
+            task: `Task` to add. Its next execution has to be planned already.
+        """
+        if task.next_execution is None:
+            raise ValueError(f"{task} doesn't have a planned execution")
+
+        with self._lock:
+            if task in self._entries:
+                self.remove(task)
+
+            entry = [task.next_execution, -task.priority, next(self._counter), task]
+            self._entries[task] = entry
+            heapq.heappush(self.heap, entry)
+
+    def remove(self, task: "Task"):
+        """Remove a `Task` from the queue.
+
+        Raises:
+            `KeyError` if the `Task` isn't in the queue
+        """
+        with self._lock:
+            entry = self._entries.pop(task)
+            entry[-1] = _REMOVED
+
+    def pop_due(self, now: datetime) -> List["Task"]:
+        """Remove and return all `Tasks <Task>` that are due at *now*.
+
+        The returned `Tasks <Task>` are sorted by their priority (highest first).
+        It's up to the caller to plan their next execution and push them
+        back into the queue.
+
+        Args:
+            now: Current time
+
+        Returns:
+            List of due `Tasks <Task>`
+        """
+        heap = self.heap
+        due = []
+        with self._lock:
+            while heap:
+                entry = heap[0]
+                task = entry[-1]
+                if task is _REMOVED:
+                    heapq.heappop(heap)
+                    continue
+                if entry[0] > now:
+                    break
+
+                heapq.heappop(heap)
+                del self._entries[task]
+                due.append(task)
+
+        due.sort(key=attrgetter("priority"), reverse=True)
+        return due
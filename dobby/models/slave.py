@@ -1,14 +1,23 @@
+import asyncio
+import importlib
 import inspect
 import logging
+from concurrent.futures import Executor, Future
+from functools import partial
 from inspect import Parameter
-from typing import Any, Callable, Dict, Optional, Type, TypeVar
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, TYPE_CHECKING, Type, TypeVar
 
-from .context import Context
-from .converter import convert
+from .context import Context, ProcessContext
+from .converter import PIPELINES, Pipeline, convert, release
 from ..errors import ConversionError, SetupError
 
+if TYPE_CHECKING:
+    from .job import Job
+
 log = logging.getLogger(__name__)
 
+SlaveCheck = Callable[["Job", bool], None]
+
 
 def transform_param(param: Parameter, arg: Any, **kwargs) -> Any:
     converter = param.annotation
@@ -18,12 +27,59 @@ def transform_param(param: Parameter, arg: Any, **kwargs) -> Any:
     return convert(converter, arg, **kwargs)
 
 
+class CompiledParameter(NamedTuple):
+    """Parameter of a `Slave` with its conversion pipeline resolved.
+
+    Attributes:
+        name: Name of the parameter
+        kind: Kind of the parameter (see `inspect.Parameter.kind`)
+        default: Default value or `inspect.Parameter.empty` if the parameter is required
+        pipeline: Converts the config value for the parameter, `None` if it isn't annotated
+    """
+    name: str
+    kind: Any
+    default: Any
+    pipeline: Optional[Pipeline]
+
+
+ISOLATION_MODES = (None, "process")
+
+
+def resolve_callback(module: str, qualname: str) -> Callable:
+    """Find the callback of a `Slave` by the name of its module and its qualified name.
+
+    Functions decorated with `slave` are replaced by the `Slave` in their module
+    which means they can't be pickled by reference. Worker processes use this
+    to find them again.
+    """
+    obj = importlib.import_module(module)
+    for attr in qualname.split("."):
+        obj = getattr(obj, attr)
+
+    if isinstance(obj, Slave):
+        obj = obj.callback
+    return obj
+
+
+def run_in_process(module: str, qualname: str, args: list, kwargs: dict) -> Any:
+    """Entry point for `Slaves <Slave>` running in a worker process."""
+    callback = resolve_callback(module, qualname)
+    result = callback(*args, **kwargs)
+    if inspect.isawaitable(result):
+        result = asyncio.run(result)
+    return result
+
+
 class Slave:
     name: str
     callback: Optional[Callable]
     instance: Optional[Any]
     parent: Optional["Slave"]
+    isolation: Optional[str]
     params: Dict[str, Parameter]
+    checks: List[SlaveCheck]
+    _compiled: Optional[List[CompiledParameter]]
+    _compiled_key: Optional[tuple]
 
     def __init__(self, name: str, callback: Callable = None, **kwargs):
         self.name = name
@@ -31,6 +87,10 @@ class Slave:
 
         self.instance = None
         self.parent = kwargs.get("parent")
+        self.isolation = kwargs.get("isolation")
+        if self.isolation not in ISOLATION_MODES:
+            raise SetupError(f"{self} uses unknown isolation \"{self.isolation}\"",
+                             hint="Leave it empty or use \"process\" to run the slave in a worker process")
 
         if callback:
             signature = inspect.signature(callback)
@@ -38,6 +98,10 @@ class Slave:
         else:
             self.params = None
 
+        self.checks = []
+        self._compiled = None
+        self._compiled_key = None
+
     def __repr__(self) -> str:
         return f"<Slave {self.qualified_name}>"
 
@@ -46,15 +110,42 @@ class Slave:
             self.instance = instance
         return self
 
+    @property
+    def is_coroutine(self) -> bool:
+        """Whether the callback is a coroutine function (``async def``)."""
+        return inspect.iscoroutinefunction(self.callback)
+
     @property
     def qualified_name(self) -> str:
         if isinstance(self.parent, Slave):
             return self.parent.qualified_name + "." + self.name
         return self.name
 
-    def transform_arguments(self, arguments: dict) -> dict:
-        kwargs = {}
-        input_args = arguments.copy()
+    def check(self, func: SlaveCheck) -> SlaveCheck:
+        """Register a function which checks the jobs using this slave.
+
+        The function is called with the `Job` once its arguments are prepared
+        and a flag telling whether the check was explicitly requested (for
+        instance by ``dobby check``) and should run even if it's expensive.
+        It can store its findings in `Job.diagnostics` and raise a `SetupError`
+        to refuse the job.
+        """
+        self.checks.append(func)
+        return func
+
+    def compile_params(self) -> List[CompiledParameter]:
+        """Resolve the converters of the parameters which are passed from the config.
+
+        The result is cached until a new converter is registered or the slave
+        is bound to an instance.
+
+        Raises:
+            `SyntaxError` if the callback doesn't accept the context (and ``self`` if it's bound)
+        """
+        key = (PIPELINES.generation, self.instance is not None)
+        if self._compiled_key == key:
+            return self._compiled
+
         iterator = iter(self.params.items())
 
         if self.instance is not None:
@@ -70,28 +161,53 @@ class Slave:
             raise SyntaxError(f"{self} is missing ctx arg. All slaves must accept the context as a positional argument."
                               "If you're the maintainer of this slave, please add it!")
 
+        compiled = []
         for name, param in iterator:
-            if param.kind == Parameter.VAR_KEYWORD:
+            pipeline = None if param.annotation is Parameter.empty else PIPELINES.get(param.annotation)
+            compiled.append(CompiledParameter(name, param.kind, param.default, pipeline))
+
+        self._compiled = compiled
+        self._compiled_key = key
+        return compiled
+
+    def transform_arguments(self, arguments: dict) -> dict:
+        kwargs = {}
+        input_args = arguments.copy()
+
+        for name, kind, default, pipeline in self.compile_params():
+            if kind == Parameter.VAR_KEYWORD:
                 kwargs.update(input_args)
+                continue
+            elif kind == Parameter.VAR_POSITIONAL:
+                continue
 
-            required = param.default is Parameter.empty
             if name in input_args:
                 arg = input_args.pop(name)
-                try:
-                    value = transform_param(param, arg, arguments=arguments, slave=self)
-                except ConversionError as e:
-                    e.key = name
-                    raise e
+                if pipeline is None:
+                    value = arg
+                else:
+                    try:
+                        value = pipeline(arg, arguments=arguments, slave=self)
+                    except ConversionError as e:
+                        e.key = name
+                        raise e
 
-            elif required:
+            elif default is Parameter.empty:
                 raise SetupError(f"{self} requires \"{name}\" argument but it wasn't provided",
                                  hint="Make sure to pass all required arguments to the slave in your config file!")
             else:
-                value = param.default
+                value = default
             kwargs[name] = value
 
         return kwargs
 
+    def release_arguments(self, kwargs: dict):
+        """Let the converters free the resources of arguments returned by `transform_arguments`."""
+        for name, value in kwargs.items():
+            param = self.params.get(name)
+            if param is not None and param.annotation is not Parameter.empty:
+                release(param.annotation, value)
+
     def prepare(self, ctx: Context):
         ctx.slave = self
         ctx.args = [ctx] if self.instance is None else [self.instance, ctx]
@@ -103,6 +219,63 @@ class Slave:
         self.prepare(ctx)
         try:
             result = self.callback(*ctx.args, **ctx.kwargs)
+            if inspect.isawaitable(result):
+                result = asyncio.run(result)
+            ctx.result = result
+        except Exception as e:
+            ctx.exception = e
+
+    def submit_to_process(self, ctx: Context, pool: Executor) -> Future:
+        """Run the callback in a worker process of *pool*.
+
+        The callback receives a `ProcessContext` instead of the `Context`.
+        All arguments and the return value must be picklable.
+
+        Returns:
+            `concurrent.futures.Future` resolving to the return value of the callback
+        """
+        process_ctx = ProcessContext.from_context(ctx)
+        args = [process_ctx] if self.instance is None else [self.instance, process_ctx]
+        return pool.submit(run_in_process, self.callback.__module__, self.callback.__qualname__, args, ctx.kwargs)
+
+    def invoke_process(self, ctx: Context, pool: Executor):
+        """Like `invoke` but the callback runs in a worker process of *pool*."""
+        if not self.callback:
+            raise SetupError(f"{self} is not a worker slave but a group!", ctx=ctx, hint="Check whether you've entered the slave key correctly!")
+
+        self.prepare(ctx)
+        try:
+            ctx.result = self.submit_to_process(ctx, pool).result()
+        except Exception as e:
+            ctx.exception = e
+
+    async def invoke_process_async(self, ctx: Context, pool: Executor):
+        """Like `invoke_process` but without blocking the event loop."""
+        if not self.callback:
+            raise SetupError(f"{self} is not a worker slave but a group!", ctx=ctx, hint="Check whether you've entered the slave key correctly!")
+
+        self.prepare(ctx)
+        try:
+            ctx.result = await asyncio.wrap_future(self.submit_to_process(ctx, pool))
+        except Exception as e:
+            ctx.exception = e
+
+    async def invoke_async(self, ctx: Context):
+        """Like `invoke` but meant to be awaited on an event loop.
+
+        Coroutine callbacks are awaited directly, regular callbacks are
+        offloaded to the default executor of the loop so they don't block it.
+        """
+        if not self.callback:
+            raise SetupError(f"{self} is not a worker slave but a group!", ctx=ctx, hint="Check whether you've entered the slave key correctly!")
+
+        self.prepare(ctx)
+        try:
+            if self.is_coroutine:
+                result = await self.callback(*ctx.args, **ctx.kwargs)
+            else:
+                loop = asyncio.get_event_loop()
+                result = await loop.run_in_executor(None, partial(self.callback, *ctx.args, **ctx.kwargs))
             ctx.result = result
         except Exception as e:
             ctx.exception = e
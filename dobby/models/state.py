@@ -0,0 +1,296 @@
+import abc
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Dict, Iterable, Optional, TYPE_CHECKING, Type
+
+from ..errors import SetupError
+
+if TYPE_CHECKING:
+    from ..config import Config
+
+log = logging.getLogger(__name__)
+
+STATE_BACKEND_MAP = {}
+
+
+class TaskState:
+    """Everything Dobby remembers about a `Task` between restarts.
+
+    Attributes:
+        taskid: Id of the `Task`
+        calendar: Schedule of the `Task` (its `Calendar` and spread) the ``next_execution`` was planned with
+        next_execution: Planned execution
+        last_start: Start of the last execution
+        last_finish: End of the last execution
+        last_outcome: Either "success" or "failure"
+    """
+
+    __slots__ = ("taskid", "calendar", "next_execution", "last_start", "last_finish", "last_outcome")
+
+    taskid: str
+    calendar: Optional[str]
+    next_execution: Optional[datetime]
+    last_start: Optional[datetime]
+    last_finish: Optional[datetime]
+    last_outcome: Optional[str]
+
+    def __init__(self, taskid: str, **kwargs):
+        self.taskid = taskid
+        self.calendar = kwargs.pop("calendar", None)
+        self.next_execution = kwargs.pop("next_execution", None)
+        self.last_start = kwargs.pop("last_start", None)
+        self.last_finish = kwargs.pop("last_finish", None)
+        self.last_outcome = kwargs.pop("last_outcome", None)
+
+    def __repr__(self) -> str:
+        return f"<TaskState {self.taskid} next: {self.next_execution} last: {self.last_outcome}>"
+
+    @property
+    def last_duration(self) -> Optional[float]:
+        """Duration of the last execution in seconds."""
+        if self.last_start and self.last_finish and self.last_finish >= self.last_start:
+            return (self.last_finish - self.last_start).total_seconds()
+        return None
+
+    def copy(self) -> "TaskState":
+        return TaskState(self.taskid, **{key: getattr(self, key) for key in self.__slots__[1:]})
+
+
+def register_state_backend(_backend: Type["StateStore"], aliases: Iterable[str]) -> Type["StateStore"]:
+    """Register a `StateStore` class for the given aliases."""
+    for alias in aliases:
+        alias = alias.lower()
+        if alias in STATE_BACKEND_MAP:
+            raise SetupError(f"Can't register {_backend}, alias \"{alias}\" already exists!")
+        STATE_BACKEND_MAP[alias] = _backend
+    return _backend
+
+
+def state_backend(*aliases: str):
+    """Mark a class as a `StateStore` backend for the given aliases."""
+    return partial(register_state_backend, aliases=aliases)
+
+
+class StateStore(abc.ABC):
+    """Persists the `TaskState` of every `Task`.
+
+    Changes are buffered in memory and written in a single batch by `flush`.
+
+    Attributes:
+        states: The current `TaskState` of every known `Task`
+    """
+
+    states: Dict[str, TaskState]
+
+    def __init__(self):
+        self.states = {}
+        self._dirty = set()
+        self._lock = threading.RLock()
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__}>"
+
+    @classmethod
+    def load(cls, config: "Config", read_only: bool = False) -> "StateStore":
+        """Build the `StateStore` configured in the ``state`` key of the config.
+
+        ``state: false`` keeps the state in memory only. By default the state
+        is stored in an SQLite database next to the config file.
+
+        Args:
+            config: Config of Dobby
+            read_only: Only read the existing state, nothing is created or written
+
+        Raises:
+            `SetupError` if the backend doesn't exist
+        """
+        options = config.get("state", True)
+        if options is False:
+            return MemoryStateStore()
+        if options is True or options is None:
+            options = {}
+        elif isinstance(options, str):
+            options = dict(backend="sqlite", path=options)
+        else:
+            options = dict(options)
+
+        backend = str(options.pop("backend", "sqlite")).lower()
+        backend_cls = STATE_BACKEND_MAP.get(backend)
+        if not backend_cls:
+            raise SetupError(f"Unknown state backend \"{backend}\"",
+                             hint=f"Use one of the following backends: {', '.join(STATE_BACKEND_MAP)}")
+
+        inst = backend_cls.from_config(config, options, read_only)
+        inst.states = inst.read()
+        log.debug(f"{inst} loaded state of {len(inst.states)} task(s)")
+        return inst
+
+    @classmethod
+    def from_config(cls, config: "Config", options: dict, read_only: bool = False) -> "StateStore":
+        return cls(**options)
+
+    def get(self, taskid: str) -> Optional[TaskState]:
+        with self._lock:
+            state = self.states.get(taskid)
+            return state.copy() if state else None
+
+    def update(self, taskid: str, **changes):
+        """Change the `TaskState` of a `Task`. The change is written on the next `flush`."""
+        with self._lock:
+            state = self.states.get(taskid)
+            if state is None:
+                state = self.states[taskid] = TaskState(taskid)
+            for key, value in changes.items():
+                setattr(state, key, value)
+            self._dirty.add(taskid)
+
+    def flush(self):
+        """Write all pending changes."""
+        with self._lock:
+            if not self._dirty:
+                return
+            states = [self.states[taskid].copy() for taskid in self._dirty]
+            self._dirty.clear()
+            self.write(states)
+
+    def close(self):
+        self.flush()
+
+    @abc.abstractmethod
+    def read(self) -> Dict[str, TaskState]:
+        """Read the stored `TaskState` of all tasks."""
+        pass
+
+    @abc.abstractmethod
+    def write(self, states: Iterable[TaskState]):
+        """Store the given states, replacing previous ones."""
+        pass
+
+
+@state_backend("memory")
+class MemoryStateStore(StateStore):
+    """Doesn't persist anything, the state is lost on restart."""
+
+    def read(self) -> Dict[str, TaskState]:
+        return {}
+
+    def write(self, states: Iterable[TaskState]):
+        pass
+
+
+def _to_timestamp(dt: Optional[datetime]) -> Optional[str]:
+    return dt.isoformat() if dt else None
+
+
+def _from_timestamp(value: Optional[str]) -> Optional[datetime]:
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f" if "." in value else "%Y-%m-%dT%H:%M:%S") if value else None
+
+
+@state_backend("sqlite")
+class SQLiteStateStore(StateStore):
+    """Stores the state in a local SQLite database.
+
+    The database runs in WAL mode and every `flush` is a single transaction,
+    so writing the state is cheap even when it happens after every task.
+
+    Attributes:
+        path: Location of the database file
+        read_only: Whether the database was opened read-only, `write` does nothing then
+    """
+
+    path: Path
+    read_only: bool
+
+    COLUMNS = TaskState.__slots__
+    TIMESTAMP_COLUMNS = ("next_execution", "last_start", "last_finish")
+
+    def __init__(self, path: Path, read_only: bool = False):
+        super().__init__()
+        self.path = Path(path)
+        self.read_only = read_only
+
+        if read_only:
+            try:
+                self._conn = sqlite3.connect(f"{self.path.absolute().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+            except sqlite3.Error as e:
+                raise SetupError(f"Couldn't open the state database at {self.path} ({e})")
+            return
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS task_state ("
+                               "taskid TEXT PRIMARY KEY, calendar TEXT, next_execution TEXT, "
+                               "last_start TEXT, last_finish TEXT, last_outcome TEXT)")
+        except (OSError, sqlite3.Error) as e:
+            raise SetupError(f"Couldn't open the state database at {self.path} ({e})",
+                             hint="Set state.path to a writable location or disable the persistent state with \"state: false\"")
+
+    def __repr__(self) -> str:
+        return f"<SQLiteStateStore {self.path}>"
+
+    @classmethod
+    def from_config(cls, config: "Config", options: dict, read_only: bool = False) -> StateStore:
+        path = options.get("path")
+        if path is None:
+            if config.path:
+                path = config.path.with_name(config.path.stem + ".state.sqlite")
+            else:
+                path = Path("dobby.state.sqlite")
+        path = Path(path)
+        if read_only and not path.is_file():
+            # there's nothing to read and creating the database isn't allowed
+            return MemoryStateStore()
+        return cls(path, read_only)
+
+    def read(self) -> Dict[str, TaskState]:
+        states = {}
+        with self._lock:
+            try:
+                rows = self._conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM task_state").fetchall()
+            except sqlite3.Error as e:
+                if not self.read_only:
+                    raise
+                log.warning(f"{self} couldn't read the state ({e})")
+                rows = []
+
+        for row in rows:
+            values = dict(zip(self.COLUMNS, row))
+            for key in self.TIMESTAMP_COLUMNS:
+                values[key] = _from_timestamp(values[key])
+            taskid = values.pop("taskid")
+            states[taskid] = TaskState(taskid, **values)
+        return states
+
+    def write(self, states: Iterable[TaskState]):
+        if self.read_only:
+            return
+        rows = []
+        for state in states:
+            row = [getattr(state, key) for key in self.COLUMNS]
+            for key in self.TIMESTAMP_COLUMNS:
+                index = self.COLUMNS.index(key)
+                row[index] = _to_timestamp(row[index])
+            rows.append(row)
+
+        placeholders = ", ".join("?" for _ in self.COLUMNS)
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(f"INSERT OR REPLACE INTO task_state ({', '.join(self.COLUMNS)}) VALUES ({placeholders})", rows)
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                log.error(f"{self} couldn't write the state ({e})")
+
+    def close(self):
+        super().close()
+        with self._lock:
+            self._conn.close()
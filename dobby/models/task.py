@@ -1,19 +1,91 @@
+import asyncio
+import heapq
 import logging
-from datetime import datetime
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
 from operator import attrgetter
-from typing import List, TYPE_CHECKING
+from typing import Dict, Iterable, List, Optional, TYPE_CHECKING
 
 from .calendar import Calendar
 from .context import Context
+from .executor import get_max_workers
 from .job import Job
 from .report import Report
-from ..config import DictContainer
+from .retry import Attempt, TaskRun
+from ..config import DictContainer, to_normal
+from ..errors import SetupError
+from ..utils import parse_duration
 
 if TYPE_CHECKING:
     from .. import Dobby
 
 log = logging.getLogger(__name__)
 
+MISFIRE_POLICIES = ("run_once", "run_all", "skip")
+DEFAULT_MISFIRE_GRACE = 60
+MAX_CATCH_UP = 10
+
+
+def get_spread_offset(taskid: str, spread: Optional[float]) -> int:
+    """Deterministic offset in whole seconds within ``[0, spread)`` for a task.
+
+    The offset is derived from a hash of the *taskid* so it's the same on every
+    start of Dobby while tasks with the same calendar end up at different times.
+    """
+    if not spread or spread < 1:
+        return 0
+    return int(zlib.crc32(taskid.encode()) / 2 ** 32 * int(spread))
+
+
+def order_jobs(jobs: List[Job]) -> List[Job]:
+    """Sort jobs so that every `Job` comes after the jobs it needs.
+
+    Among the jobs whose dependencies are met the one with the highest
+    priority comes first.
+
+    Args:
+        jobs: Jobs to sort
+
+    Returns:
+        A new list with the sorted jobs
+
+    Raises:
+        `SetupError` if a job needs an unknown job or the dependencies form a cycle
+    """
+    names = {job.jobname for job in jobs}
+    waiting_for = {}
+    dependents = {job.jobname: [] for job in jobs}
+    for job in jobs:
+        for name in job.needs:
+            if name not in names:
+                raise SetupError(f"{job} needs \"{name}\" which doesn't exist",
+                                 hint="Make sure the job is spelled correctly and enabled")
+            dependents[name].append(job)
+        waiting_for[job.jobname] = len(set(job.needs))
+
+    ready = [(-job.priority, i, job) for i, job in enumerate(jobs) if not waiting_for[job.jobname]]
+    heapq.heapify(ready)
+    indices = {job.jobname: i for i, job in enumerate(jobs)}
+
+    ordered = []
+    while ready:
+        *_, job = heapq.heappop(ready)
+        ordered.append(job)
+        for dependent in dependents[job.jobname]:
+            waiting_for[dependent.jobname] -= 1
+            if not waiting_for[dependent.jobname]:
+                heapq.heappush(ready, (-dependent.priority, indices[dependent.jobname], dependent))
+
+    if len(ordered) != len(jobs):
+        cycle = ", ".join(job.jobname for job in jobs if waiting_for[job.jobname])
+        raise SetupError(f"The jobs {cycle} depend on each other",
+                         hint="Remove the circular dependency from the \"needs\" of the jobs")
+
+    return ordered
+
 
 class Task:
     dobby: "Dobby"
@@ -21,57 +93,303 @@ class Task:
     calendar: Calendar
     report: Report
     priority: int
+    parallel: bool
+    max_workers: Optional[int]
+    timeout: Optional[float]
+    misfire_policy: str
+    misfire_grace: float
+    spread: Optional[float]
+    offset: int
     jobs: List[Job]
+    config: Optional[dict]
 
-    def __init__(self, dobby: "Dobby", taskid: str, calendar: Calendar, report: Report, priority: int = 0, jobs: List[Job] = None):
+    def __init__(self, dobby: "Dobby", taskid: str, calendar: Calendar, report: Report, priority: int = 0, jobs: List[Job] = None,
+                 parallel: bool = False, timeout: float = None, misfire_policy: str = "run_once", misfire_grace: float = DEFAULT_MISFIRE_GRACE,
+                 spread: float = None, max_workers: int = None):
         self.dobby = dobby
         self.taskid = taskid
         self.calendar = calendar
         self.report = report
         self.priority = priority
+        self.parallel = parallel
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.misfire_policy = misfire_policy
+        self.misfire_grace = misfire_grace
+        self.spread = spread
+        self.offset = get_spread_offset(taskid, spread)
         self.jobs = jobs or []
+        self.config = None
 
         self.next_execution = None
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._close_keep = None
 
     def __repr__(self) -> str:
         return f"<Task {self.taskid} {self.calendar}>"
 
     @classmethod
-    def load(cls, dobby: "Dobby", taskid: str, config) -> "Task":
-        calendar = Calendar.from_config(config["run"])
+    def load(cls, dobby: "Dobby", taskid: str, config, previous: "Task" = None) -> "Task":
+        """Build a `Task` from its config.
+
+        Args:
+            dobby: `Dobby` instance the task belongs to
+            taskid: Id of the task
+            config: Config of the task
+            previous: The `Task` this one replaces after a reload. Jobs whose
+                config didn't change are taken over instead of being prepared again.
+        """
+        snapshot = to_normal(config)
+        try:
+            calendar = Calendar.from_config(config["run"])
+        except ValueError as e:
+            raise SetupError(f"Task {taskid} has an invalid run \"{config['run']}\"", hint=str(e))
         report = Report.load(config.get("report"))
 
-        inst = cls(dobby, taskid, calendar, report, config.get("priority", 0))
+        try:
+            timeout = parse_duration(config.get("timeout"))
+            misfire_grace = parse_duration(config.get("misfire_grace", dobby.config.get("misfire_grace", DEFAULT_MISFIRE_GRACE)))
+            spread = parse_duration(config.get("spread", dobby.config.get("spread")))
+        except ValueError as e:
+            raise SetupError(f"Task {taskid} has an invalid duration", hint=str(e))
+
+        misfire_policy = config.get("misfire_policy", dobby.config.get("misfire_policy", "run_once"))
+        if misfire_policy not in MISFIRE_POLICIES:
+            raise SetupError(f"Task {taskid} has an unknown misfire_policy \"{misfire_policy}\"",
+                             hint=f"Use one of the following policies: {', '.join(MISFIRE_POLICIES)}")
+
+        inst = cls(dobby, taskid, calendar, report, config.get("priority", 0), parallel=config.get("parallel", False), timeout=timeout,
+                   misfire_policy=misfire_policy, misfire_grace=misfire_grace, spread=spread, max_workers=get_max_workers(dobby.config))
 
         _job = config.get("job")
         _jobs = [("main", _job)] if _job else config.get("jobs", {}).items()
 
-        for job_name, job_config in _jobs:
-            if isinstance(job_config, str):
-                job_config = DictContainer(config.env, dict(slave=job_config))
-            if job_config.get("enabled", True):
-                inst.jobs.append(Job.load(inst, job_name, job_config))
-            else:
-                log.debug(f"Job {taskid}-{job_name} is disabled!")
+        try:
+            for job_name, job_config in _jobs:
+                if isinstance(job_config, str):
+                    job_config = DictContainer(config.env, dict(slave=job_config))
+                if not job_config.get("enabled", True):
+                    log.debug(f"Job {taskid}-{job_name} is disabled!")
+                    continue
+
+                job = previous.get_job(job_name) if previous else None
+                if job and job.config == to_normal(job_config):
+                    log.debug(f"{job} unchanged, reusing it")
+                    job.task = inst
+                else:
+                    job = Job.load(inst, job_name, job_config)
+                inst.jobs.append(job)
+        except Exception:
+            inst.close(keep=previous.jobs if previous else ())
+            raise
 
         inst.jobs.sort(key=attrgetter("priority"), reverse=True)
+        inst.jobs = order_jobs(inst.jobs)
+        inst.config = snapshot
 
         return inst
 
-    def execute(self, ctx: Context):
+    @property
+    def running(self) -> bool:
+        """Whether an execution of the task, including its retries, isn't done yet."""
+        return self._runs > 0
+
+    def close(self, keep: Iterable[Job] = ()):
+        """Close the jobs of the task except for the ones in *keep*.
+
+        While the task is `running` the jobs are closed once the execution
+        and all of its retries are done.
+        """
+        keep = list(keep)
+        with self._lock:
+            if self._runs:
+                log.debug(f"{self} is running, closing its jobs once it's done")
+                self._close_keep = (self._close_keep or []) + keep
+                return
+        self._close_jobs(keep)
+
+    def _close_jobs(self, keep: Iterable[Job]):
+        keep = set(map(id, keep))
+        for job in self.jobs:
+            if id(job) not in keep:
+                job.close()
+
+    def begin_run(self):
+        """Mark the start of an execution. Must be paired with `end_run`."""
+        with self._lock:
+            self._runs += 1
+
+    def end_run(self):
+        """Mark an execution including its retries as done and carry out a pending `close`."""
+        with self._lock:
+            self._runs -= 1
+            if self._runs or self._close_keep is None:
+                return
+            keep, self._close_keep = self._close_keep, None
+        # jobs may have been taken over by the tasks of a later reload as well
+        self._close_jobs(keep + [job for task in self.dobby.tasks for job in task.jobs])
+
+    def get_job(self, jobname: str) -> Optional[Job]:
+        for job in self.jobs:
+            if job.jobname == jobname:
+                return job
+        return None
+
+    def prepare_context(self, ctx: Context):
         ctx.task = self
+        if self.timeout is not None:
+            ctx.deadline = time.monotonic() + self.timeout
+
+    def execute(self, ctx: Context):
+        self.prepare_context(ctx)
+        log.info(f"{self} running {len(self.jobs)} job(s)")
+        self.begin_run()
+        try:
+            self.record_start()
+
+            if self.parallel and len(self.jobs) > 1:
+                results = self.run_jobs_parallel(ctx)
+            else:
+                results = self.run_jobs(ctx)
+
+            retrying = TaskRun(self, ctx, results).schedule_retries(self.jobs)
+        except BaseException:
+            self.end_run()
+            raise
+
+        if not retrying:
+            self.finish(ctx, results)
+
+    @staticmethod
+    def record_attempt(job_ctx: Context, started: datetime, start: float, previous: Context = None):
+        attempts = previous.attempts if previous else []
+        attempt = Attempt(len(attempts) + 1, started, time.monotonic() - start, job_ctx.exception)
+        job_ctx.attempts = attempts + [attempt]
+
+    def run_job(self, job: Job, ctx: Context, previous: Context = None) -> Context:
+        """Run a single job with a copy of *ctx*.
+
+        Args:
+            job: `Job` to run
+            ctx: `Context` of the task
+            previous: `Context` of the previous attempt when retrying
+
+        Returns:
+            The `Context` of the job
+        """
+        log.debug(f"running job {job}")
+        job_ctx = ctx.copy()
+        started, start = datetime.now(), time.monotonic()
+        job.run(job_ctx)
+        self.record_attempt(job_ctx, started, start, previous)
+        return job_ctx
+
+    def run_jobs(self, ctx: Context) -> Dict[str, Context]:
+        """Run the jobs one after another."""
+        results = {}
+
+        for job in self.jobs:
+            results[job.jobname] = self.run_job(job, ctx)
+
+        return results
+
+    def run_jobs_parallel(self, ctx: Context) -> Dict[str, Context]:
+        """Run the jobs on a thread pool.
+
+        A `Job` is started as soon as all the jobs it needs are done. The pool
+        has at most `max_workers` threads.
+        """
+        results = {}
+        started = set()
+        futures: Dict[Future, Job] = {}
+
+        workers = min(len(self.jobs), self.max_workers or len(self.jobs))
+        with ThreadPoolExecutor(workers, thread_name_prefix=f"dobby-{self.taskid}") as pool:
+            while True:
+                for job in self.jobs:
+                    if job.jobname not in started and all(name in results for name in job.needs):
+                        started.add(job.jobname)
+                        futures[pool.submit(self.run_job, job, ctx)] = job
+
+                if not futures:
+                    break
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = futures.pop(future)
+                    results[job.jobname] = future.result()
+
+        return results
+
+    async def execute_async(self, ctx: Context):
+        self.prepare_context(ctx)
         log.info(f"{self} running {len(self.jobs)} job(s)")
+        self.begin_run()
+        try:
+            self.record_start()
+
+            if self.parallel:
+                results = await self.run_jobs_parallel_async(ctx)
+            else:
+                results = {}
+                for job in self.jobs:
+                    results[job.jobname] = await self.run_job_async(job, ctx)
+
+            retrying = TaskRun(self, ctx, results).schedule_retries(self.jobs)
+        except BaseException:
+            self.end_run()
+            raise
+
+        if not retrying:
+            await self.finish_async(ctx, results)
 
+    async def run_job_async(self, job: Job, ctx: Context, previous: Context = None) -> Context:
+        log.debug(f"running job {job}")
+        job_ctx = ctx.copy()
+        started, start = datetime.now(), time.monotonic()
+        await job.run_async(job_ctx)
+        self.record_attempt(job_ctx, started, start, previous)
+        return job_ctx
+
+    async def run_jobs_parallel_async(self, ctx: Context) -> Dict[str, Context]:
+        """Run the jobs concurrently on the event loop respecting their dependencies."""
         results = {}
+        futures: Dict[str, asyncio.Future] = {}
+
+        async def run(job: Job):
+            if job.needs:
+                await asyncio.gather(*(futures[name] for name in job.needs))
+            results[job.jobname] = await self.run_job_async(job, ctx)
 
         for job in self.jobs:
-            log.debug(f"running job {job}")
-            job_ctx = ctx.copy()
+            futures[job.jobname] = asyncio.ensure_future(run(job))
+
+        await asyncio.gather(*futures.values())
+        return results
 
-            job.run(job_ctx)
+    def record_start(self):
+        self.dobby.state.update(self.taskid, last_start=datetime.now())
 
-            results[job.jobname] = job_ctx
+    def record_finish(self, results: Dict[str, Context]):
+        """Store the end and the outcome of the execution in the `StateStore`."""
+        outcome = "failure" if any(job_ctx.exception for job_ctx in results.values()) else "success"
+        self.dobby.state.update(self.taskid, last_finish=datetime.now(), last_outcome=outcome)
+        self.dobby.state.flush()
 
+    def finish(self, ctx: Context, results: Dict[str, Context]):
+        """Called once the execution including all retries is done."""
+        try:
+            self.record_finish(results)
+            self.send_report(ctx, results)
+        finally:
+            self.end_run()
+
+    async def finish_async(self, ctx: Context, results: Dict[str, Context]):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.finish, ctx, results)
+
+    def send_report(self, ctx: Context, results: Dict[str, Context]):
         if self.report.should_report(ctx, results):
             notification = self.report.create(ctx, results)
             self.dobby.send_notification(notification)
@@ -82,5 +400,105 @@ class Task:
         self.execute(ctx)
         self.plan_next_execution(time)
 
+    @property
+    def schedule(self) -> str:
+        """Representation of everything that decides when the task runs."""
+        if self.offset:
+            return f"{self.calendar} +{self.offset}s"
+        return repr(self.calendar)
+
+    def next_event(self, time: datetime) -> datetime:
+        """First execution after *time* according to the calendar shifted by the spread offset."""
+        offset = timedelta(seconds=self.offset)
+        return self.calendar.next_event(time - offset) + offset
+
     def plan_next_execution(self, time: datetime):
-        self.next_execution = self.calendar.next_event(time)
+        self.next_execution = self.next_event(time)
+
+    def count_missed(self, now: datetime, limit: int = 1000) -> int:
+        """Count the scheduled executions between the planned one and *now*.
+
+        Args:
+            now: Current time
+            limit: Stop counting at this amount
+
+        Returns:
+            Amount of executions which should have happened by now
+        """
+        missed = 0
+        current = self.next_execution
+        while current <= now and missed < limit:
+            missed += 1
+            current = self.next_event(current)
+        return missed
+
+    def plan_due(self, now: datetime) -> bool:
+        """Plan the next execution of the due task according to its misfire policy.
+
+        A task which is more than ``misfire_grace`` seconds late has missed its
+        execution. Depending on the ``misfire_policy`` Dobby either runs it once
+        (run_once), runs it for every missed execution (run_all) or skips it until
+        its next regular execution (skip). A task which missed more than
+        `MAX_CATCH_UP` executions runs once even with run_all, so a long
+        outage isn't replayed back to back.
+
+        Args:
+            now: Current time
+
+        Returns:
+            Whether the task should be executed now
+        """
+        scheduled = self.next_execution
+        if (now - scheduled).total_seconds() <= self.misfire_grace:
+            self.plan_next_execution(now)
+            return True
+
+        if self.misfire_policy == "run_all":
+            if self.count_missed(now, limit=MAX_CATCH_UP + 1) <= MAX_CATCH_UP:
+                log.warning(f"{self} catching up on the execution planned for {scheduled}")
+                self.plan_next_execution(scheduled)
+                return True
+            log.warning(f"{self} missed more than {MAX_CATCH_UP} executions since {scheduled}, running once instead of catching up")
+            self.plan_next_execution(now)
+            return True
+
+        missed = self.count_missed(now)
+        self.plan_next_execution(now)
+        if self.misfire_policy == "skip":
+            log.warning(f"{self} skipping {missed} missed execution(s) since {scheduled}")
+            return False
+
+        log.warning(f"{self} missed {missed} execution(s) since {scheduled}, running once")
+        return True
+
+
+class TaskTrigger:
+    """Entry in the `Scheduler` which runs a `Task` once, outside of its calendar.
+
+    Created by ``dobby ctl trigger``. The regular schedule of the task isn't affected.
+
+    Attributes:
+        task: `Task` to run
+        next_execution: When to run the task
+        priority: Priority of the `Task`
+    """
+
+    task: Task
+    next_execution: datetime
+    priority: int
+
+    def __init__(self, task: Task, next_execution: datetime = None):
+        self.task = task
+        self.next_execution = next_execution or datetime.now()
+        self.priority = task.priority
+
+    def __repr__(self) -> str:
+        return f"<TaskTrigger {self.task.taskid}>"
+
+    def execute(self, ctx: Context):
+        log.info(f"{self.task} triggered manually")
+        self.task.execute(ctx)
+
+    async def execute_async(self, ctx: Context):
+        log.info(f"{self.task} triggered manually")
+        await self.task.execute_async(ctx)
@@ -0,0 +1,254 @@
+"""Simulation of the schedule for ``dobby plan``.
+
+Nothing is executed, not even the preparation of the jobs. The tasks are
+read from the config and their calendars are expanded over the simulated
+period at once. How long every execution takes is estimated from the
+duration of the last execution stored in the `StateStore`.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Optional, TYPE_CHECKING, Tuple
+
+from .config import Config, DictContainer
+from .errors import SetupError
+from .models.calendar import Calendar, events_between, require_numpy
+from .models.state import StateStore
+from .models.task import get_spread_offset
+from .utils import human_timedelta, parse_duration
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if TYPE_CHECKING:
+    import numpy
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DURATION = 60
+
+
+class PlannedTask(NamedTuple):
+    """What the simulation needs to know about a `Task`.
+
+    Attributes:
+        taskid: Id of the task
+        calendar: `Calendar` of the task
+        slaves: Qualified names of the slaves of the jobs
+        parallel: Whether the jobs run in parallel
+        duration: Duration of the last execution in seconds if it's known
+        offset: Offset in seconds caused by the ``spread`` of the task
+    """
+    taskid: str
+    calendar: Calendar
+    slaves: List[str]
+    parallel: bool
+    duration: Optional[float]
+    offset: int = 0
+
+
+def load_planned_tasks(config: Config, state: StateStore = None) -> List[PlannedTask]:
+    """Read the enabled tasks from *config* without building them.
+
+    Raises:
+        `SetupError` if the calendar or the spread of a task is invalid
+    """
+    tasks = []
+    for taskid, task_config in config.tasks.items():
+        if not task_config.get("enabled", True):
+            continue
+        try:
+            calendar = Calendar.from_config(task_config["run"])
+        except ValueError as e:
+            raise SetupError(f"Task {taskid} has an invalid run \"{task_config['run']}\"", hint=str(e))
+        try:
+            spread = parse_duration(task_config.get("spread", config.get("spread")))
+        except ValueError as e:
+            raise SetupError(f"Task {taskid} has an invalid spread", hint=str(e))
+
+        _job = task_config.get("job")
+        _jobs = [_job] if _job else list(task_config.get("jobs", {}).values())
+        slaves = []
+        for job_config in _jobs:
+            if isinstance(job_config, str):
+                slaves.append(job_config)
+            elif isinstance(job_config, DictContainer) and job_config.get("enabled", True):
+                slaves.append(job_config["slave"])
+
+        task_state = state.get(taskid) if state else None
+        duration = task_state.last_duration if task_state else None
+        tasks.append(PlannedTask(taskid, calendar, slaves, task_config.get("parallel", True), duration, get_spread_offset(taskid, spread)))
+    return tasks
+
+
+class Plan:
+    """Simulated executions of some tasks over a period of time.
+
+    Every execution is assumed to take the duration of the last real
+    execution of the task or *default_duration* if it never ran.
+
+    Tasks with the same calendar and duration behave exactly the same, so
+    they're only expanded once. The executions are counted straight into
+    per-minute bins, the memory doesn't grow with the amount of executions.
+
+    Attributes:
+        tasks: Simulated `PlannedTask`
+        start: Start of the simulation, rounded down to the minute
+        end: End of the simulation
+        default_duration: Duration of the tasks which never ran
+        durations: Estimated duration of every task in whole seconds (at least 1)
+        runs: Amount of executions of every task
+        per_minute: Amount of executions running during each minute of the period.
+            An execution counts for every minute it's running in, even if only for a second.
+    """
+
+    tasks: List[PlannedTask]
+    start: datetime
+    end: datetime
+    default_duration: float
+    durations: "numpy.ndarray"
+    runs: "numpy.ndarray"
+    per_minute: "numpy.ndarray"
+
+    def __init__(self, tasks: List[PlannedTask], start: datetime, end: datetime, default_duration: float = DEFAULT_DURATION):
+        require_numpy()
+        self.tasks = tasks
+        self.start = start.replace(second=0, microsecond=0)
+        self.end = end
+        self.default_duration = default_duration
+
+        durations = [task.duration if task.duration is not None else default_duration for task in tasks]
+        self.durations = np.maximum(np.ceil(np.array(durations, dtype="float64")), 1).astype("int64")
+        self.runs = np.zeros(len(tasks), dtype="int64")
+
+        minutes = max(int((end - self.start).total_seconds() // 60) + 1, 0)
+        changes = np.zeros(minutes + 1, dtype="int64")
+        origin = np.datetime64(self.start, "s")
+
+        for calendar, duration, offset, indices in self.group_tasks():
+            for events in self.iter_events(calendar, self.start, end, offset):
+                self.runs[indices] += len(events)
+                seconds = (events - origin).astype("int64")
+                first = seconds // 60
+                # an execution which ends exactly at the start of a minute doesn't run in it
+                last = np.minimum((seconds + duration - 1) // 60 + 1, minutes)
+                weight = len(indices)
+                changes += weight * (np.bincount(first, minlength=minutes + 1) - np.bincount(last, minlength=minutes + 1))
+
+        self.per_minute = np.cumsum(changes[:minutes])
+
+    def __repr__(self) -> str:
+        return f"<Plan {len(self.tasks)} tasks, {self.total_runs} executions>"
+
+    @property
+    def total_runs(self) -> int:
+        return int(self.runs.sum())
+
+    def group_tasks(self) -> List[Tuple[Calendar, int, int, List[int]]]:
+        """Group the tasks which have the same calendar, offset and duration.
+
+        Returns:
+            List of the calendar, the duration, the offset and the indices of the tasks of every group
+        """
+        groups: Dict[Tuple[str, int, int], Tuple[Calendar, int, int, List[int]]] = {}
+        for index, (task, duration) in enumerate(zip(self.tasks, self.durations)):
+            key = (repr(task.calendar), int(duration), task.offset)
+            if key not in groups:
+                groups[key] = (task.calendar, int(duration), task.offset, [])
+            groups[key][3].append(index)
+        return list(groups.values())
+
+    @staticmethod
+    def iter_events(calendar: Calendar, start: datetime, end: datetime, offset: int = 0,
+                    chunk: timedelta = timedelta(days=30)) -> Iterator["numpy.ndarray"]:
+        """Expand *calendar* shifted by *offset* seconds over ``(start, end]`` in chunks to limit the memory usage."""
+        shift = timedelta(seconds=offset)
+        start, end = start - shift, end - shift
+        while start < end:
+            chunk_end = min(start + chunk, end)
+            yield calendar.events_between(start, chunk_end) + np.timedelta64(offset, "s")
+            start = chunk_end
+
+    def get_running(self, minute: int) -> List[str]:
+        """Ids of the tasks running during the given minute of the period."""
+        minute_start = self.start + timedelta(minutes=minute)
+        taskids = []
+        for calendar, duration, offset, indices in self.group_tasks():
+            # executions in (minute_start - duration, minute_start + 59s] overlap the minute
+            shifted = minute_start - timedelta(seconds=offset)
+            if len(calendar.events_between(shifted - timedelta(seconds=duration), shifted + timedelta(seconds=59))):
+                taskids.extend(self.tasks[index].taskid for index in indices)
+        return sorted(taskids)
+
+    def get_peak(self) -> Tuple[int, Optional[datetime], List[str]]:
+        """Find the minute with the most executions running.
+
+        Returns:
+            The amount of executions, the start of the minute and the ids of the running tasks
+        """
+        if not self.total_runs:
+            return 0, None, []
+        minute = int(np.argmax(self.per_minute))
+        return int(self.per_minute[minute]), self.start + timedelta(minutes=minute), self.get_running(minute)
+
+    def get_slave_load(self) -> Dict[str, Tuple[int, float]]:
+        """Estimate how often every slave runs and for how long.
+
+        Jobs of parallel tasks are assumed to run for the whole task, the duration of
+        other tasks is split evenly among their jobs.
+
+        Returns:
+            Maps the name of the slaves to the amount of runs and the busy time in seconds
+        """
+        load = {}
+        for task, runs, duration in zip(self.tasks, self.runs, self.durations):
+            if not task.slaves:
+                continue
+            job_duration = duration if task.parallel else duration / len(task.slaves)
+            for slave in task.slaves:
+                slave_runs, busy = load.get(slave, (0, 0.0))
+                load[slave] = (slave_runs + int(runs), busy + int(runs) * float(job_duration))
+        return load
+
+    def format_report(self, top: int = 10) -> str:
+        """Summarise the plan for the command line."""
+        lines = [f"Simulated {human_timedelta((self.end - self.start).total_seconds())} from {self.start} to {self.end}: "
+                 f"{self.total_runs} execution(s) of {len(self.tasks)} task(s)"]
+        if not self.total_runs:
+            return lines[0]
+
+        count, moment, taskids = self.get_peak()
+        more = f" and {len(taskids) - top} more" if len(taskids) > top else ""
+        lines.append(f"\nPeak: {count} execution(s) running in the minute of {moment}: {', '.join(taskids[:top])}{more}")
+
+        busiest = np.argsort(-self.per_minute, kind="stable")[:top]
+        lines.append("\nBusiest minutes:")
+        for minute in busiest:
+            if not self.per_minute[minute]:
+                break
+            lines.append(f"  {self.start + timedelta(minutes=int(minute))}  {self.per_minute[minute]:>6} running")
+
+        lines.append("\nMinutes by amount of running executions:")
+        for running, minutes in enumerate(np.bincount(self.per_minute)):
+            if minutes:
+                lines.append(f"  {running:>6} running  {minutes:>8} minute(s)")
+
+        lines.append("\nSlave load:")
+        load = sorted(self.get_slave_load().items(), key=lambda item: item[1][1], reverse=True)
+        width = max(len(slave) for slave, _ in load) if load else 0
+        for slave, (runs, busy) in load[:top]:
+            lines.append(f"  {slave:<{width}}  {runs:>9} run(s)  {human_timedelta(busy)} busy")
+
+        unknown = sum(task.duration is None for task in self.tasks)
+        if unknown:
+            lines.append(f"\nNo duration known for {unknown} task(s), assuming {human_timedelta(self.default_duration)} each")
+
+        return "\n".join(lines)
+
+    def write_csv(self, fp):
+        """Write the amount of running executions of every minute to the file object *fp*."""
+        fp.write("minute,running\n")
+        for minute, running in enumerate(self.per_minute):
+            fp.write(f"{self.start + timedelta(minutes=minute)},{running}\n")
@@ -1,12 +1,22 @@
 import logging
-from typing import Union
+from typing import Any, TYPE_CHECKING, Union
 
-from pymongo import MongoClient
-from pymongo.collection import Collection
 from pymongo.database import Database
-from pymongo.errors import InvalidOperation
 
-from dobby import Context, Group, converter
+from dobby import Context, Converter, Group, converter
+from dobby.config import DictContainer
+from dobby.errors import SetupError
+from dobby.utils import parse_size
+from .batching import BatchSizer, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MIN_BATCH_SIZE, DEFAULT_TARGET_LATENCY
+from .checkpoint import Checkpoint
+from .clients import CLIENT_POOL
+from .export import Compression, ExportResult, export_documents, get_export_path, require_compression
+from .move import DEFAULT_BATCH_SIZES, MoveResult, MoveStrategy, excludes_id, mv_documents, mv_documents_parallel, mv_documents_server, supports_merge
+from .query_plan import query_plan_check
+from .remove import log_progress, rm_documents
+
+if TYPE_CHECKING:
+    from dobby import Job
 
 log = logging.getLogger(__name__)
 
@@ -14,45 +24,118 @@ mongodb = Group(name="mongodb")
 
 
 @converter(Database)
-def convert(arg: Union[str, dict], **kwargs) -> Database:
-    if isinstance(arg, str):
-        return MongoClient(arg).get_database()
-    raise NotImplementedError
+class DatabaseConverter(Converter):
+    """Connects to a database using a connection string or a dict.
 
+    The dict needs the connection string as ``uri`` and may contain the name of
+    the ``database`` if it's not part of the URI. All other keys are passed to
+    `MongoClient`. Databases on the same deployment share their client.
+    """
 
-def mv_documents(from_coll: Collection, to_coll: Collection, condition: dict, projection: Union[list, dict] = None, batch_size=100) -> int:
-    moved_documents = 0
-    count = batch_size
-    while count > 0:
-        documents = from_coll.find(condition, projection=projection, limit=batch_size)
+    def convert(self, arg: Union[str, dict], **kwargs) -> Database:
+        if isinstance(arg, str):
+            return CLIENT_POOL.acquire(arg).get_database()
 
-        try:
-            res = to_coll.insert_many(documents, ordered=False)
-        except InvalidOperation:
-            log.debug("no documents to move")
-            return 0
+        options = arg.to_normal() if isinstance(arg, DictContainer) else dict(arg)
+        uri = options.pop("uri")
+        name = options.pop("database", None)
+        return CLIENT_POOL.acquire(uri, **options).get_database(name)
 
-        _ids = res.inserted_ids
-        from_coll.delete_many({"_id": {"$in": _ids}})
+    def release(self, value: Any):
+        if isinstance(value, Database):
+            CLIENT_POOL.release(value.client)
 
-        moved_documents += len(_ids)
-        count = from_coll.count_documents(condition)
-    return moved_documents
+
+def get_batch_sizer(batch_size: int, min_batch_size: int = None, max_batch_size: int = None,
+                    target_latency: float = DEFAULT_TARGET_LATENCY) -> BatchSizer:
+    """Build the `BatchSizer` for the batch size arguments of a slave."""
+    minimum = min_batch_size or min(DEFAULT_MIN_BATCH_SIZE, batch_size)
+    maximum = max_batch_size or max(DEFAULT_MAX_BATCH_SIZE, batch_size)
+    try:
+        return BatchSizer(batch_size, minimum, maximum, target_latency)
+    except ValueError as e:
+        raise ValueError(f"{e}, make sure that min_batch_size isn't larger than max_batch_size") from None
 
 
 @mongodb.slave()
 def move_documents(ctx: Context, database: Database, from_coll: str, to_coll: str, condition: dict,
-                   projection: Union[dict, list] = None) -> int:
+                   projection: Union[dict, list] = None, strategy: MoveStrategy = MoveStrategy.CLIENT, batch_size: int = None,
+                   min_batch_size: int = None, max_batch_size: int = None, target_latency: float = DEFAULT_TARGET_LATENCY,
+                   checkpoint: bool = False, parallelism: int = 1, explain: bool = False, require_index: bool = False) -> MoveResult:
     from_coll = database[from_coll]
     to_coll = database[to_coll]
-    return mv_documents(from_coll, to_coll, condition, projection)
+    checkpoint = Checkpoint.for_move(from_coll, to_coll, condition, projection) if checkpoint else None
+
+    if strategy is MoveStrategy.SERVER and not supports_merge(database):
+        log.warning("server doesn't support $merge (MongoDB 4.2+), moving the documents through Dobby")
+        strategy = MoveStrategy.CLIENT
+
+    sizer = get_batch_sizer(batch_size or DEFAULT_BATCH_SIZES[strategy], min_batch_size, max_batch_size, target_latency)
+    move = mv_documents_server if strategy is MoveStrategy.SERVER else mv_documents
+    if parallelism > 1:
+        result = mv_documents_parallel(from_coll, to_coll, condition, projection, sizer, ctx=ctx, checkpoint=checkpoint,
+                                       parallelism=parallelism, move=move)
+    else:
+        result = move(from_coll, to_coll, condition, projection, sizer, ctx=ctx, checkpoint=checkpoint)
+
+    log.info(f"{from_coll.name} -> {to_coll.name}: {result}")
+    return result
+
+
+@move_documents.check
+def check_move(job: "Job", force: bool):
+    kwargs = job.kwargs
+    if kwargs.get("checkpoint") and excludes_id(kwargs.get("projection")):
+        # the moved documents get new ids, so a resumed batch can't be told apart from the first attempt
+        raise SetupError(f"{job} can't use a checkpoint with a projection which excludes the _id",
+                         hint="Keep the _id in the projection or set \"checkpoint\" to false")
 
 
 @mongodb.slave()
-def remove_documents(ctx: Context, database: Database, from_coll: str, condition: dict) -> int:
+def remove_documents(ctx: Context, database: Database, from_coll: str, condition: dict, batched: bool = False, batch_size: int = 1000,
+                     min_batch_size: int = None, max_batch_size: int = None, target_latency: float = DEFAULT_TARGET_LATENCY,
+                     max_docs_per_second: float = None, explain: bool = False, require_index: bool = False) -> int:
     coll = database[from_coll]
+    if batched or max_docs_per_second:
+        sizer = get_batch_sizer(batch_size, min_batch_size, max_batch_size, target_latency)
+        return rm_documents(coll, condition, sizer, ctx=ctx, max_docs_per_second=max_docs_per_second, progress=log_progress(coll))
     return coll.delete_many(condition).deleted_count
 
 
+# not named export to keep the export module accessible
+@mongodb.slave("export")
+def export_collection(ctx: Context, database: Database, from_coll: str, path: str, condition: dict = None,
+                      projection: Union[dict, list] = None, sort: Union[dict, list] = None, compression: Compression = Compression.GZIP,
+                      level: int = None, batch_size: int = 1000, min_batch_size: int = None, max_batch_size: int = None,
+                      target_latency: float = DEFAULT_TARGET_LATENCY, max_file_size: Union[int, str] = None, explain: bool = False,
+                      require_index: bool = False) -> ExportResult:
+    coll = database[from_coll]
+    path = get_export_path(path, compression)
+    if isinstance(sort, dict):
+        sort = list(sort.items())
+
+    sizer = get_batch_sizer(batch_size, min_batch_size, max_batch_size, target_latency)
+    result = export_documents(coll, path, condition, projection, sort, compression, level, sizer, parse_size(max_file_size), ctx=ctx)
+    log.info(f"{from_coll} -> {path}: {result}")
+    return result
+
+
+@export_collection.check
+def check_export(job: "Job", force: bool):
+    kwargs = job.kwargs
+    require_compression(kwargs.get("compression", Compression.GZIP))
+    try:
+        max_file_size = parse_size(kwargs.get("max_file_size"))
+    except ValueError as e:
+        raise SetupError(f"{job} has an invalid max_file_size", hint=str(e))
+    if max_file_size is not None and max_file_size <= 0:
+        raise SetupError(f"{job} has an invalid max_file_size", hint="The size must be positive, e.g. \"100MB\"")
+
+
+move_documents.check(query_plan_check("from_coll"))
+remove_documents.check(query_plan_check("from_coll"))
+export_collection.check(query_plan_check("from_coll"))
+
+
 def setup(dobby: Group):
     dobby.add_slave(mongodb)
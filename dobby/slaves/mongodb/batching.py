@@ -0,0 +1,136 @@
+"""Batch sizes which adapt to how fast the server handles them."""
+
+import time
+from typing import List, Optional, TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    from dobby import Context
+
+DEFAULT_TARGET_LATENCY = 0.5
+DEFAULT_MIN_BATCH_SIZE = 10
+DEFAULT_MAX_BATCH_SIZE = 10000
+MAX_GROWTH = 2
+
+
+class BatchSizer:
+    """Picks the size of the next batch so that it takes about `target_latency` seconds.
+
+    After every batch the time it took per document is folded into a moving
+    average. The next batch gets as many documents as fit into the target
+    latency at that rate. It may grow to at most twice and shrink to at least
+    half the previous size so a single slow batch (or a lucky fast one)
+    doesn't throw the size off. The size always stays between `minimum` and
+    `maximum`, setting both to the same value turns off the adaptation.
+
+    Attributes:
+        size: Size of the next batch
+        minimum: Smallest batch size
+        maximum: Largest batch size
+        target_latency: Seconds a batch should take
+        smoothing: Weight of the latest batch in the moving average (0 to 1)
+        sizes: Sizes of all the batches recorded so far
+    """
+
+    size: int
+    minimum: int
+    maximum: int
+    target_latency: float
+    smoothing: float
+    sizes: List[int]
+
+    def __init__(self, size: int, minimum: int = DEFAULT_MIN_BATCH_SIZE, maximum: int = DEFAULT_MAX_BATCH_SIZE,
+                 target_latency: float = DEFAULT_TARGET_LATENCY, smoothing: float = 0.5):
+        if not 0 < minimum <= maximum:
+            raise ValueError(f"invalid batch size limits {minimum} to {maximum}")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = min(max(size, minimum), maximum)
+        self.target_latency = target_latency
+        self.smoothing = smoothing
+        self.sizes = []
+        self._per_document = None
+
+    def __repr__(self) -> str:
+        return f"<BatchSizer {self.size} ({self.minimum}-{self.maximum})>"
+
+    @classmethod
+    def fixed(cls, size: int) -> "BatchSizer":
+        return cls(size, size, size)
+
+    def copy(self) -> "BatchSizer":
+        """A new sizer with the same settings starting at the current size."""
+        return type(self)(self.size, self.minimum, self.maximum, self.target_latency, self.smoothing)
+
+    def record(self, count: int, duration: float) -> int:
+        """Take note that a batch of *count* documents took *duration* seconds.
+
+        Returns:
+            Size of the next batch
+        """
+        self.sizes.append(count)
+        if count <= 0 or self.minimum == self.maximum:
+            return self.size
+
+        per_document = max(duration, 1e-6) / count
+        if self._per_document is None:
+            self._per_document = per_document
+        else:
+            self._per_document += self.smoothing * (per_document - self._per_document)
+
+        ideal = self.target_latency / self._per_document
+        ideal = min(max(ideal, self.size / MAX_GROWTH), self.size * MAX_GROWTH)
+        self.size = int(min(max(ideal, self.minimum), self.maximum))
+        return self.size
+
+
+def get_sizer(batch_size: Union[int, BatchSizer]) -> BatchSizer:
+    """Get a new `BatchSizer` for *batch_size*.
+
+    Integers are used as a fixed size, a `BatchSizer` is copied so that it can
+    be shared by moves running in parallel.
+    """
+    if isinstance(batch_size, BatchSizer):
+        return batch_size.copy()
+    return BatchSizer.fixed(batch_size)
+
+
+class Throttle:
+    """Keeps an operation below a given amount of documents per second.
+
+    Attributes:
+        rate: Documents per second
+        start: `time.monotonic` when the operation started
+    """
+
+    rate: float
+    start: float
+
+    def __init__(self, rate: float):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, not {rate}")
+        self.rate = rate
+        self.start = time.monotonic()
+
+    def __repr__(self) -> str:
+        return f"<Throttle {self.rate} docs/s>"
+
+    def limit(self, size: int) -> int:
+        """Limit a batch size to about one second worth of documents to avoid bursts."""
+        return max(1, min(size, int(self.rate)))
+
+    def delay(self, done: int) -> float:
+        """Seconds to wait before continuing after *done* documents."""
+        return max(done / self.rate - (time.monotonic() - self.start), 0)
+
+    def wait(self, done: int, ctx: Optional["Context"] = None):
+        """Sleep until the rate allows for more documents.
+
+        Returns early if *ctx* is cancelled.
+        """
+        delay = self.delay(done)
+        if delay <= 0:
+            return
+        if ctx:
+            ctx.cancel_event.wait(delay)
+        else:
+            time.sleep(delay)
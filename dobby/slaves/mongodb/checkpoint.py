@@ -0,0 +1,92 @@
+"""Progress of document moves stored in MongoDB so they can be resumed."""
+
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Any, List, NamedTuple, Optional
+
+from bson import json_util
+from pymongo.collection import Collection
+
+log = logging.getLogger(__name__)
+
+CHECKPOINT_COLLECTION = "dobby_checkpoints"
+
+
+class CheckpointState(NamedTuple):
+    """What a `Checkpoint` knows about an interrupted move.
+
+    Attributes:
+        last_id: Highest ``_id`` which was moved completely
+        in_flight: Ids of the batch which was being moved when the move stopped
+        moved: Amount of documents moved before the interruption
+    """
+    last_id: Any
+    in_flight: List[Any]
+    moved: int
+
+
+class Checkpoint:
+    """Progress of a move from one collection to another.
+
+    The checkpoint lives in the ``dobby_checkpoints`` collection of the source
+    database. Before a batch is copied its ids are recorded as in flight. Once
+    the batch was deleted from the source the checkpoint advances to the last
+    id of the batch. A move which is interrupted leaves its checkpoint behind
+    so the next run can finish the in-flight batch and continue after
+    ``last_id``. A finished move removes its checkpoint.
+
+    Attributes:
+        collection: Collection the checkpoints are stored in
+        key: Identifies the move, derived from the collections, the condition and the projection
+    """
+
+    collection: Collection
+    key: str
+
+    def __init__(self, collection: Collection, key: str):
+        self.collection = collection
+        self.key = key
+
+    def __repr__(self) -> str:
+        return f"<Checkpoint {self.key}>"
+
+    @classmethod
+    def for_move(cls, from_coll: Collection, to_coll: Collection, condition: dict, projection: Any = None) -> "Checkpoint":
+        move = json_util.dumps(dict(condition=condition, projection=projection), sort_keys=True)
+        digest = hashlib.sha1(move.encode()).hexdigest()[:16]
+        return cls(from_coll.database[CHECKPOINT_COLLECTION], f"move:{from_coll.name}:{to_coll.name}:{digest}")
+
+    def load(self) -> Optional[CheckpointState]:
+        """Get the state of an interrupted move or `None` if there's nothing to resume."""
+        document = self.collection.find_one({"_id": self.key})
+        if not document:
+            return None
+        return CheckpointState(document.get("last_id"), document.get("in_flight", []), document.get("moved", 0))
+
+    def begin(self, ids: List[Any]):
+        """Record the ids of the batch that's about to be moved."""
+        self.collection.update_one({"_id": self.key}, {"$set": {"in_flight": ids, "updated": datetime.now(timezone.utc)}}, upsert=True)
+
+    def commit(self, last_id: Any, moved: int):
+        """Mark the in-flight batch as moved."""
+        changes = {"$set": {"in_flight": [], "updated": datetime.now(timezone.utc)}, "$inc": {"moved": moved}}
+        if last_id is not None:
+            changes["$set"]["last_id"] = last_id
+        self.collection.update_one({"_id": self.key}, changes, upsert=True)
+
+    def partition(self, index: int) -> "Checkpoint":
+        """Checkpoint of one of the ranges of a partitioned move."""
+        return type(self)(self.collection, f"{self.key}:{index}")
+
+    def load_split_points(self) -> Optional[List[Any]]:
+        """Get the ids a partitioned move was split at or `None` if it wasn't started yet."""
+        document = self.collection.find_one({"_id": self.key})
+        return document.get("split_points") if document else None
+
+    def save_split_points(self, split_points: List[Any]):
+        self.collection.update_one({"_id": self.key}, {"$set": {"split_points": split_points, "updated": datetime.now(timezone.utc)}}, upsert=True)
+
+    def clear(self):
+        """Remove the checkpoint of a finished move."""
+        self.collection.delete_one({"_id": self.key})
@@ -0,0 +1,169 @@
+"""Process-wide registry of shared `MongoClient` instances.
+
+Every `MongoClient` has its own connection pool and monitoring threads, so
+jobs connecting to the same deployment share a single client. Clients are
+reference counted and closed once they haven't been used for a while.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from pymongo import MongoClient
+
+log = logging.getLogger(__name__)
+
+DEFAULT_IDLE_TIMEOUT = 300
+DEFAULT_PORT = 27017
+
+ClientKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def normalize_uri(uri: str) -> str:
+    """Bring equivalent connection strings into the same form.
+
+    The scheme and host names are lower-cased, the default port is added to
+    hosts without one, the hosts are sorted and so are the options (whose
+    names are case-insensitive).
+    """
+    uri = uri.strip()
+    scheme, sep, rest = uri.partition("://")
+    if not sep:
+        return uri
+    scheme = scheme.lower()
+
+    rest, _, query = rest.partition("?")
+    netloc, slash, path = rest.partition("/")
+    credentials, at, hosts = netloc.rpartition("@")
+
+    normalized_hosts = []
+    for host in hosts.split(","):
+        host = host.lower()
+        if scheme == "mongodb" and not host.startswith("[") and ":" not in host:
+            host = f"{host}:{DEFAULT_PORT}"
+        normalized_hosts.append(host)
+
+    options = sorted((key.lower(), value) for key, value in parse_qsl(query, keep_blank_values=True))
+    query = "?" + urlencode(options) if options else ""
+    return f"{scheme}://{credentials}{at}{','.join(sorted(normalized_hosts))}/{path.rstrip('/')}{query}"
+
+
+class _PooledClient(NamedTuple):
+    client: MongoClient
+    refs: int
+    idle_since: Optional[float]
+
+
+class ClientPool:
+    """Shares `MongoClient` instances between everything connecting with the same URI and options.
+
+    Every `acquire` must be paired with a `release`. Clients nobody holds on
+    to anymore are closed after *idle_timeout* seconds and all clients are
+    closed when the interpreter exits.
+
+    Attributes:
+        idle_timeout: Seconds an unused client is kept around in case it's acquired again
+    """
+
+    idle_timeout: float
+
+    def __init__(self, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._clients: Dict[ClientKey, _PooledClient] = {}
+        self._keys: Dict[int, ClientKey] = {}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def __repr__(self) -> str:
+        return f"<ClientPool {len(self._clients)} client(s)>"
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    @staticmethod
+    def get_key(uri: str, options: Dict[str, Any]) -> ClientKey:
+        return normalize_uri(uri), tuple(sorted((key.lower(), repr(value)) for key, value in options.items()))
+
+    def acquire(self, uri: str, **options) -> MongoClient:
+        """Get the shared client for *uri* and *options*, creating it if necessary."""
+        key = self.get_key(uri, options)
+        with self._lock:
+            pooled = self._clients.get(key)
+            if pooled is None:
+                client = MongoClient(uri, **options)
+                log.debug(f"created MongoClient for {key[0]}")
+                self._keys[id(client)] = key
+            else:
+                client = pooled.client
+            self._clients[key] = _PooledClient(client, (pooled.refs if pooled else 0) + 1, None)
+        return client
+
+    def release(self, client: MongoClient):
+        """Hand back a client returned by `acquire`.
+
+        Clients which weren't acquired from this pool are ignored.
+        """
+        with self._lock:
+            key = self._keys.get(id(client))
+            pooled = self._clients.get(key)
+            if pooled is None or pooled.client is not client or pooled.refs <= 0:
+                return
+            refs = pooled.refs - 1
+            self._clients[key] = _PooledClient(client, refs, time.monotonic() if refs == 0 else None)
+            if refs == 0:
+                self._schedule_eviction()
+
+    def _schedule_eviction(self):
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(self.idle_timeout, self._evict_later)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _evict_later(self):
+        with self._lock:
+            self._timer = None
+        self.evict_idle()
+
+    def evict_idle(self, now: float = None) -> int:
+        """Close the clients which have been unused for longer than `idle_timeout`.
+
+        Returns:
+            Amount of clients closed
+        """
+        now = time.monotonic() if now is None else now
+        evicted = []
+        with self._lock:
+            for key, pooled in list(self._clients.items()):
+                if pooled.refs == 0 and now - pooled.idle_since >= self.idle_timeout:
+                    del self._clients[key]
+                    del self._keys[id(pooled.client)]
+                    evicted.append(pooled.client)
+            if any(pooled.refs == 0 for pooled in self._clients.values()):
+                self._schedule_eviction()
+
+        for client in evicted:
+            client.close()
+        if evicted:
+            log.debug(f"closed {len(evicted)} idle MongoClient(s)")
+        return len(evicted)
+
+    def close_all(self):
+        """Close every client, whether it's still in use or not."""
+        with self._lock:
+            clients = [pooled.client for pooled in self._clients.values()]
+            self._clients.clear()
+            self._keys.clear()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        for client in clients:
+            client.close()
+
+
+CLIENT_POOL = ClientPool()
+atexit.register(CLIENT_POOL.close_all)
@@ -0,0 +1,231 @@
+"""Streaming collections into compressed NDJSON files, used by `export`."""
+
+import gzip
+import time
+from datetime import datetime
+from enum import Enum
+from itertools import islice
+from pathlib import Path
+from typing import BinaryIO, List, NamedTuple, Optional, Tuple, Union
+
+from bson import json_util
+from pymongo.collection import Collection
+
+from dobby import Context
+from dobby.errors import SetupError
+from dobby.utils import human_size, human_timedelta
+from .batching import BatchSizer, get_sizer
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+
+class Compression(Enum):
+    """Compression of the files written by `export`.
+
+    ``zstd`` requires the zstandard package.
+    """
+    NONE = "none"
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+    @property
+    def suffix(self) -> str:
+        return {Compression.NONE: "", Compression.GZIP: ".gz", Compression.ZSTD: ".zst"}[self]
+
+
+def require_compression(compression: Compression):
+    """Raise a `SetupError` if the library for *compression* isn't installed."""
+    if compression is Compression.ZSTD and zstandard is None:
+        raise SetupError("zstd compression requires the zstandard package",
+                         hint="Install it with \"pip install zstandard\" or use gzip")
+
+
+class ExportResult(NamedTuple):
+    """Returned by `export`.
+
+    Attributes:
+        documents: Amount of documents exported
+        bytes_written: Size of the files
+        raw_bytes: Size of the exported NDJSON before compression
+        files: Paths of the files written
+        duration: Seconds the export took
+        batch_sizes: Size of every batch, chosen by a `BatchSizer`
+    """
+    documents: int
+    bytes_written: int
+    raw_bytes: int
+    files: Tuple[str, ...]
+    duration: float
+    batch_sizes: Tuple[int, ...] = ()
+
+    def __str__(self) -> str:
+        text = (f"exported {self.documents} document(s) to {len(self.files)} file(s), {human_size(self.bytes_written)} "
+                f"({human_size(self.raw_bytes)} uncompressed) in {human_timedelta(self.duration)}")
+        if self.batch_sizes and min(self.batch_sizes) != max(self.batch_sizes):
+            text += f", batches of {min(self.batch_sizes)} to {max(self.batch_sizes)}"
+        return text
+
+
+class ShardedWriter:
+    """Writes to compressed files and starts a new file before one exceeds `max_file_size`.
+
+    Files are written with a ``.part`` suffix which is removed once they're
+    complete. If the writer is aborted the files it started are deleted.
+
+    Attributes:
+        path: Path of the output. If the output is sharded the files are
+            numbered: ``texts.ndjson.gz`` becomes ``texts-0000.ndjson.gz``, ...
+        compression: `Compression` of the files
+        level: Compression level, the default of the compression if `None`
+        max_file_size: Size a file shouldn't exceed, `None` for a single file. A single write which
+            is larger on its own still ends up in one file.
+        files: Completed files
+        raw_bytes: Amount of bytes written before compression
+    """
+
+    path: Path
+    compression: Compression
+    level: Optional[int]
+    max_file_size: Optional[int]
+    files: List[Path]
+    raw_bytes: int
+
+    def __init__(self, path: Path, compression: Compression = Compression.GZIP, level: int = None, max_file_size: int = None):
+        require_compression(compression)
+        self.path = path
+        self.compression = compression
+        self.level = level
+        self.max_file_size = max_file_size
+        self.files = []
+        self.raw_bytes = 0
+
+        self._raw: Optional[BinaryIO] = None
+        self._writer = None
+        self._file_raw_bytes = 0
+
+    def __repr__(self) -> str:
+        return f"<ShardedWriter {self.path}>"
+
+    def __enter__(self) -> "ShardedWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def bytes_written(self) -> int:
+        return sum(path.stat().st_size for path in self.files)
+
+    def get_path(self, index: int) -> Path:
+        if self.max_file_size is None:
+            return self.path
+        name, dot, suffixes = self.path.name.partition(".")
+        return self.path.with_name(f"{name}-{index:04}{dot}{suffixes}")
+
+    def _open(self):
+        path = self.get_path(len(self.files))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._raw = path.with_name(path.name + ".part").open("wb")
+        self._file_raw_bytes = 0
+        if self.compression is Compression.GZIP:
+            self._writer = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6 if self.level is None else self.level)
+        elif self.compression is Compression.ZSTD:
+            compressor = zstandard.ZstdCompressor(level=3 if self.level is None else self.level)
+            self._writer = compressor.stream_writer(self._raw, closefd=False)
+        else:
+            self._writer = self._raw
+
+    def _finish(self):
+        if self._writer is not self._raw:
+            self._writer.close()
+        self._raw.close()
+        part = Path(self._raw.name)
+        path = part.with_name(part.name[:-len(".part")])
+        part.replace(path)
+        self.files.append(path)
+        self._raw = self._writer = None
+
+    def write(self, data: bytes):
+        """Write *data* to the current file, starting a new one if it wouldn't fit.
+
+        Whether the data fits is estimated from the compression ratio of the
+        current file. When the output is sharded the compressor is flushed
+        after every write so that the size of the file is known exactly.
+        """
+        if self._writer is not None and self.max_file_size is not None and self._file_raw_bytes:
+            ratio = self._raw.tell() / self._file_raw_bytes
+            if self._raw.tell() + len(data) * ratio > self.max_file_size:
+                self._finish()
+
+        if self._writer is None:
+            self._open()
+        self._writer.write(data)
+        if self.max_file_size is not None and self._writer is not self._raw:
+            self._writer.flush()
+        self.raw_bytes += len(data)
+        self._file_raw_bytes += len(data)
+
+    def close(self):
+        if self._writer is not None:
+            self._finish()
+        elif not self.files:
+            # nothing was exported, write an empty file anyway
+            self._open()
+            self._finish()
+
+    def abort(self):
+        """Stop writing and delete all the files."""
+        if self._raw is not None:
+            self._raw.close()
+            Path(self._raw.name).unlink()
+            self._raw = self._writer = None
+        for path in self.files:
+            path.unlink()
+        self.files.clear()
+
+
+def get_export_path(path: Union[str, Path], compression: Compression, now: datetime = None) -> Path:
+    """Fill in the date (``{now:%Y-%m-%d}``) and add the suffix of the compression if it's missing."""
+    path = Path(str(path).format(now=now or datetime.now()))
+    if compression.suffix and not path.name.endswith(compression.suffix):
+        path = path.with_name(path.name + compression.suffix)
+    return path
+
+
+def export_documents(coll: Collection, path: Path, condition: dict = None, projection: Union[list, dict] = None, sort: list = None,
+                     compression: Compression = Compression.GZIP, level: int = None, batch_size: Union[int, BatchSizer] = 1000,
+                     max_file_size: int = None, ctx: Context = None) -> ExportResult:
+    """Write the documents matching *condition* to *path* as newline delimited (relaxed extended) JSON.
+
+    Documents are read from a single cursor and encoded and written one batch
+    at a time, so only one batch is ever held in memory. A `BatchSizer` adapts
+    the size of the batches to how long reading and writing them takes.
+    """
+    sizer = get_sizer(batch_size)
+    start = time.monotonic()
+    documents = 0
+    cursor = coll.find(condition or {}, projection=projection or None, sort=sort or None, batch_size=sizer.maximum)
+    with cursor, ShardedWriter(path, compression, level, max_file_size) as writer:
+        documents_iter = iter(cursor)
+        while True:
+            if ctx:
+                ctx.raise_if_cancelled()
+
+            batch_start = time.monotonic()
+            batch = list(islice(documents_iter, sizer.size))
+            if not batch:
+                break
+            writer.write("".join(json_util.dumps(document, json_options=JSON_OPTIONS) + "\n" for document in batch).encode())
+            documents += len(batch)
+            sizer.record(len(batch), time.monotonic() - batch_start)
+
+    return ExportResult(documents, writer.bytes_written, writer.raw_bytes, tuple(map(str, writer.files)), time.monotonic() - start,
+                        tuple(sizer.sizes))
@@ -0,0 +1,393 @@
+"""Moving documents between collections, used by `move_documents`."""
+
+import logging
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from enum import Enum
+from itertools import islice
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple, Union
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, DeleteMany, InsertOne, ReplaceOne
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from dobby import Context
+from dobby.utils import human_timedelta
+from .batching import BatchSizer, get_sizer
+from .checkpoint import Checkpoint, CheckpointState
+
+log = logging.getLogger(__name__)
+
+
+class MoveStrategy(Enum):
+    """How `move_documents` moves the documents.
+
+    ``client`` reads the documents and writes them to the target collection
+    through Dobby. ``server`` copies them inside MongoDB using an aggregation
+    pipeline ending in ``$merge`` (MongoDB 4.2 or newer) so only the ids of
+    the documents are transferred.
+    """
+    CLIENT = "client"
+    SERVER = "server"
+
+
+DEFAULT_BATCH_SIZES = {MoveStrategy.CLIENT: 100, MoveStrategy.SERVER: 1000}
+SAMPLES_PER_PARTITION = 20
+MAX_SAMPLE_SIZE = 100_000
+
+
+def supports_merge(database: Database) -> bool:
+    """Whether the server supports the ``$merge`` stage."""
+    return tuple(database.client.server_info()["versionArray"][:2]) >= (4, 2)
+
+
+class MoveResult(NamedTuple):
+    """Returned by `move_documents`.
+
+    Attributes:
+        moved: Amount of documents moved
+        batches: Amount of batches the documents were moved in
+        duration: Seconds the move took
+        batch_sizes: Size of every batch, chosen by a `BatchSizer`
+        partitions: Results of the partitions if the move was split into ranges of ids
+    """
+    moved: int
+    batches: int
+    duration: float
+    batch_sizes: Tuple[int, ...] = ()
+    partitions: Tuple["MoveResult", ...] = ()
+
+    def __str__(self) -> str:
+        text = f"moved {self.moved} document(s) in {human_timedelta(self.duration)} ({self.docs_per_second:.0f} docs/s)"
+        if self.batch_sizes:
+            smallest, largest = min(self.batch_sizes), max(self.batch_sizes)
+            text += f" in batches of {smallest}" if smallest == largest else f" in batches of {smallest} to {largest}"
+        if self.partitions:
+            text += f" using {len(self.partitions)} partitions"
+        return text
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.moved / self.duration if self.duration > 0 else 0.0
+
+
+def get_projection_stage(projection: Union[list, dict, None]) -> Optional[dict]:
+    if not projection:
+        return None
+    if not isinstance(projection, dict):
+        projection = {key: 1 for key in projection}
+    return {"$project": projection}
+
+
+def excludes_id(projection: Union[list, dict, None]) -> bool:
+    return isinstance(projection, dict) and "_id" in projection and not projection["_id"]
+
+
+def get_find_projection(projection: Union[list, dict, None]) -> Optional[Union[list, dict]]:
+    """Projection for reading the documents to move which never excludes the ``_id``."""
+    if not excludes_id(projection):
+        return projection or None
+    projection = {key: value for key, value in projection.items() if key != "_id"}
+    return projection or None
+
+
+def resume_condition(condition: dict, state: Optional[CheckpointState]) -> dict:
+    """Restrict *condition* to the documents after the last id of the checkpoint."""
+    if state is None or state.last_id is None:
+        return condition
+    return {"$and": [condition, {"_id": {"$gt": state.last_id}}]}
+
+
+def get_merge_pipeline(ids: List[Any], to_coll: Collection, projection: Union[list, dict] = None) -> List[dict]:
+    """Build the aggregation pipeline which copies the documents with the given ids to *to_coll*.
+
+    Documents which already exist in *to_coll* are replaced so that a move
+    which was interrupted between copying and deleting can be repeated.
+    """
+    pipeline = [{"$match": {"_id": {"$in": ids}}}]
+    projection_stage = get_projection_stage(projection)
+    if projection_stage:
+        pipeline.append(projection_stage)
+    pipeline.append({"$merge": {"into": {"db": to_coll.database.name, "coll": to_coll.name},
+                                "whenMatched": "replace", "whenNotMatched": "insert"}})
+    return pipeline
+
+
+def move_batch(from_coll: Collection, to_coll: Collection, documents: List[dict], keep_id: bool = True) -> List[Any]:
+    """Write *documents* to *to_coll* and delete them from *from_coll*.
+
+    Documents are upserted by their ``_id`` so moving a batch again after an
+    interruption doesn't fail on duplicate keys. Without *keep_id* they're
+    inserted with new ids, which is why `move_documents` doesn't allow
+    checkpoints for projections excluding the ``_id``.
+
+    Returns:
+        The ids of the documents in *from_coll*
+    """
+    _ids = [document["_id"] for document in documents]
+    if keep_id:
+        requests = [ReplaceOne({"_id": document["_id"]}, document, upsert=True) for document in documents]
+    else:
+        for document in documents:
+            del document["_id"]
+        requests = [InsertOne(document) for document in documents]
+
+    to_coll.bulk_write(requests, ordered=False)
+    from_coll.bulk_write([DeleteMany({"_id": {"$in": _ids}})])
+    return _ids
+
+
+def mv_documents(from_coll: Collection, to_coll: Collection, condition: dict, projection: Union[list, dict] = None,
+                 batch_size: Union[int, BatchSizer] = 100, ctx: Context = None, checkpoint: Checkpoint = None) -> MoveResult:
+    """Move the documents matching *condition* through Dobby.
+
+    The documents are read from a single cursor sorted by ``_id``. Every batch
+    is upserted into *to_coll* and then deleted from *from_coll* with one bulk
+    write each. The move ends when the cursor is exhausted. *batch_size* is
+    either a fixed size or a `BatchSizer` adapting the size to the latency of
+    the batches.
+
+    With a *checkpoint* the progress is recorded after every batch and a move
+    which was interrupted is resumed: the batch that was in flight is moved
+    again and the cursor continues after the last moved id.
+    """
+    start = time.monotonic()
+    moved_documents = 0
+    sizer = get_sizer(batch_size)
+    keep_id = not excludes_id(projection)
+    find_projection = get_find_projection(projection)
+
+    state = checkpoint.load() if checkpoint else None
+    if state:
+        log.info(f"resuming {checkpoint} after {state.last_id!r} with {len(state.in_flight)} document(s) in flight")
+        if state.in_flight:
+            documents = list(from_coll.find({"_id": {"$in": state.in_flight}}, projection=find_projection))
+            if documents:
+                move_batch(from_coll, to_coll, documents, keep_id)
+            checkpoint.commit(None, len(documents))
+            moved_documents += len(documents)
+
+    cursor = from_coll.find(resume_condition(condition, state), projection=find_projection, sort=[("_id", ASCENDING)], batch_size=sizer.size)
+    with cursor:
+        documents_iter = iter(cursor)
+        while True:
+            if ctx:
+                ctx.raise_if_cancelled()
+
+            batch_start = time.monotonic()
+            documents = list(islice(documents_iter, sizer.size))
+            if not documents:
+                break
+
+            if checkpoint:
+                checkpoint.begin([document["_id"] for document in documents])
+            _ids = move_batch(from_coll, to_coll, documents, keep_id)
+            if checkpoint:
+                checkpoint.commit(_ids[-1], len(_ids))
+
+            moved_documents += len(_ids)
+            sizer.record(len(_ids), time.monotonic() - batch_start)
+
+    if checkpoint:
+        checkpoint.clear()
+    return MoveResult(moved_documents, len(sizer.sizes), time.monotonic() - start, tuple(sizer.sizes))
+
+
+def merge_batch(from_coll: Collection, to_coll: Collection, ids: List[Any], projection: Union[list, dict] = None) -> int:
+    """Copy the documents with the given ids to *to_coll* on the server and delete them from *from_coll*.
+
+    Returns:
+        Amount of documents deleted from *from_coll*
+    """
+    from_coll.aggregate(get_merge_pipeline(ids, to_coll, projection))
+    return from_coll.delete_many({"_id": {"$in": ids}}).deleted_count
+
+
+def mv_documents_server(from_coll: Collection, to_coll: Collection, condition: dict, projection: Union[list, dict] = None,
+                        batch_size: Union[int, BatchSizer] = 1000, ctx: Context = None, checkpoint: Checkpoint = None) -> MoveResult:
+    """Like `mv_documents` but the documents are copied by the server.
+
+    Every batch only transfers the ids of the matching documents. They're
+    copied with ``$match`` → ``$project`` → ``$merge`` and then deleted from
+    *from_coll*.
+    """
+    start = time.monotonic()
+    moved_documents = 0
+    sizer = get_sizer(batch_size)
+
+    state = checkpoint.load() if checkpoint else None
+    if state:
+        log.info(f"resuming {checkpoint} after {state.last_id!r} with {len(state.in_flight)} document(s) in flight")
+        if state.in_flight:
+            moved = merge_batch(from_coll, to_coll, state.in_flight, projection)
+            checkpoint.commit(None, moved)
+            moved_documents += moved
+    condition = resume_condition(condition, state)
+
+    while True:
+        if ctx:
+            ctx.raise_if_cancelled()
+
+        batch_start = time.monotonic()
+        _ids = [document["_id"] for document in from_coll.find(condition, projection=["_id"], sort=[("_id", ASCENDING)], limit=sizer.size)]
+        if not _ids:
+            break
+
+        if checkpoint:
+            checkpoint.begin(_ids)
+        merge_batch(from_coll, to_coll, _ids, projection)
+        if checkpoint:
+            checkpoint.commit(_ids[-1], len(_ids))
+        moved_documents += len(_ids)
+        sizer.record(len(_ids), time.monotonic() - batch_start)
+
+    if checkpoint:
+        checkpoint.clear()
+    return MoveResult(moved_documents, len(sizer.sizes), time.monotonic() - start, tuple(sizer.sizes))
+
+
+def get_id_bounds(from_coll: Collection, condition: dict) -> Optional[Tuple[Any, Any]]:
+    """Smallest and largest ``_id`` of the documents matching *condition* or `None` if there are none.
+
+    Both are found by walking the ``_id`` index from either end.
+    """
+    bounds = []
+    for direction in (ASCENDING, DESCENDING):
+        documents = list(from_coll.find(condition, projection=["_id"], sort=[("_id", direction)], limit=1))
+        if not documents:
+            return None
+        bounds.append(documents[0]["_id"])
+    return bounds[0], bounds[1]
+
+
+def interpolate_ids(lower: Any, upper: Any, partitions: int) -> Optional[List[Any]]:
+    """Split the range of ids from *lower* to *upper* into *partitions* ranges of the same width.
+
+    Returns:
+        The ids between the ranges or `None` if the ids aren't numbers, dates or ObjectIds
+    """
+    if isinstance(lower, ObjectId) and isinstance(upper, ObjectId):
+        start, end = lower.generation_time.timestamp(), upper.generation_time.timestamp() + 1
+        points = [ObjectId.from_datetime(datetime.fromtimestamp(start + (end - start) * i / partitions, timezone.utc))
+                  for i in range(1, partitions)]
+    elif isinstance(lower, datetime) and isinstance(upper, datetime):
+        points = [lower + (upper - lower) * i / partitions for i in range(1, partitions)]
+    elif all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in (lower, upper)):
+        if isinstance(lower, int) and isinstance(upper, int):
+            points = [lower + (upper + 1 - lower) * i // partitions for i in range(1, partitions)]
+        else:
+            points = [lower + (upper - lower) * i / partitions for i in range(1, partitions)]
+    else:
+        return None
+
+    split_points = []
+    for point in points:
+        if lower < point <= upper and (not split_points or point > split_points[-1]):
+            split_points.append(point)
+    return split_points
+
+
+def sample_split_points(from_coll: Collection, condition: dict, partitions: int, samples_per_partition: int = SAMPLES_PER_PARTITION) -> List[Any]:
+    """Pick split points from a random ``$sample`` of the collection.
+
+    ``$sample`` comes first so MongoDB can use a random cursor instead of
+    sorting all matching documents, the condition filters the sample afterwards.
+    If a selective condition leaves fewer ids than *partitions* the sample is
+    taken again ten times larger (up to `MAX_SAMPLE_SIZE`).
+    """
+    size = partitions * samples_per_partition
+    while True:
+        pipeline = [{"$sample": {"size": size}}, {"$match": condition}, {"$project": {"_id": 1}}]
+        ids = sorted(document["_id"] for document in from_coll.aggregate(pipeline))
+        if len(ids) >= partitions or size >= MAX_SAMPLE_SIZE:
+            break
+        size = min(size * 10, MAX_SAMPLE_SIZE)
+        log.debug(f"only {len(ids)} sampled document(s) of {from_coll.name} match the condition, sampling {size} document(s)")
+
+    split_points = []
+    for i in range(1, partitions):
+        if not ids:
+            break
+        point = ids[len(ids) * i // partitions]
+        if point != ids[0] and (not split_points or point != split_points[-1]):
+            split_points.append(point)
+    return split_points
+
+
+def get_split_points(from_coll: Collection, condition: dict, partitions: int, samples_per_partition: int = SAMPLES_PER_PARTITION) -> List[Any]:
+    """Pick ids which split the documents matching *condition* into *partitions* ranges.
+
+    The range between the smallest and the largest matching id is divided
+    evenly, which only needs two indexed queries. Ids which can't be
+    interpolated (like strings) are split using a random sample instead.
+    Fewer split points are returned if there aren't enough distinct ids.
+    """
+    if partitions < 2:
+        return []
+    bounds = get_id_bounds(from_coll, condition)
+    if bounds is None:
+        return []
+    split_points = interpolate_ids(*bounds, partitions)
+    if split_points is None:
+        split_points = sample_split_points(from_coll, condition, partitions, samples_per_partition)
+    return split_points
+
+
+def partition_conditions(condition: dict, split_points: List[Any]) -> List[dict]:
+    """Split *condition* into disjoint ranges of ids at the given points."""
+    bounds = [None, *split_points, None]
+    conditions = []
+    for lower, upper in zip(bounds, bounds[1:]):
+        id_range = {}
+        if lower is not None:
+            id_range["$gte"] = lower
+        if upper is not None:
+            id_range["$lt"] = upper
+        conditions.append({"$and": [condition, {"_id": id_range}]} if id_range else condition)
+    return conditions
+
+
+def mv_documents_parallel(from_coll: Collection, to_coll: Collection, condition: dict, projection: Union[list, dict] = None,
+                          batch_size: Union[int, BatchSizer] = 100,
+                          ctx: Context = None, checkpoint: Checkpoint = None, parallelism: int = 4,
+                          move: Callable[..., MoveResult] = mv_documents) -> MoveResult:
+    """Split the documents into *parallelism* ranges of ids and move every range on its own thread.
+
+    Every range is moved by *move* (`mv_documents` or `mv_documents_server`)
+    with its own checkpoint. The split points are stored in the checkpoint so
+    a resumed move uses the same ranges. If a range fails the others are
+    cancelled through *ctx*.
+    """
+    start = time.monotonic()
+    split_points = checkpoint.load_split_points() if checkpoint else None
+    if split_points is None:
+        split_points = get_split_points(from_coll, condition, parallelism)
+        if checkpoint:
+            checkpoint.save_split_points(split_points)
+
+    conditions = partition_conditions(condition, split_points)
+    if len(conditions) < parallelism:
+        log.warning(f"moving {from_coll.name} -> {to_coll.name} in {len(conditions)} partition(s) instead of {parallelism}, "
+                    f"couldn't find enough distinct ids to split the documents")
+    else:
+        log.debug(f"moving {from_coll.name} -> {to_coll.name} in {len(conditions)} partition(s)")
+
+    with ThreadPoolExecutor(len(conditions), thread_name_prefix="dobby-move") as pool:
+        futures = [pool.submit(move, from_coll, to_coll, part, projection, batch_size, ctx=ctx,
+                               checkpoint=checkpoint.partition(index) if checkpoint else None)
+                   for index, part in enumerate(conditions)]
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        failed = [future for future in done if future.exception()]
+        if failed and ctx:
+            ctx.cancel()
+
+    if failed:
+        raise failed[0].exception()
+
+    results = tuple(future.result() for future in futures)
+    if checkpoint:
+        checkpoint.clear()
+    return MoveResult(sum(result.moved for result in results), sum(result.batches for result in results), time.monotonic() - start,
+                      tuple(size for result in results for size in result.batch_sizes), results)
@@ -0,0 +1,146 @@
+"""Checking the query plans of the conditions used by the Mongo slaves."""
+
+import logging
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, TYPE_CHECKING
+
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from dobby.errors import SetupError
+
+if TYPE_CHECKING:
+    from dobby import Job
+
+log = logging.getLogger(__name__)
+
+MAX_EXAMINED_RATIO = 10
+
+
+def iter_stages(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Walk the stages of a query plan from the root to the leaves."""
+    if "queryPlan" in plan:
+        # plans of the slot based execution engine
+        plan = plan["queryPlan"]
+    if "shards" in plan:
+        for shard in plan["shards"]:
+            yield from iter_stages(shard.get("winningPlan", {}))
+        return
+
+    yield plan
+    children = plan.get("inputStages", [])
+    if "inputStage" in plan:
+        children = [plan["inputStage"], *children]
+    for child in children:
+        yield from iter_stages(child)
+
+
+class QueryPlan(NamedTuple):
+    """Summary of the ``explain`` output for a condition.
+
+    Attributes:
+        namespace: Database and collection the condition was explained for
+        winning_plan: The plan MongoDB chose
+        stages: Names of the stages of the winning plan, root first
+        indexes: Names of the indexes the winning plan uses
+        docs_examined: Amount of documents examined, only known if the query was executed
+        returned: Amount of documents returned, only known if the query was executed
+    """
+    namespace: str
+    winning_plan: Dict[str, Any]
+    stages: List[str]
+    indexes: List[str]
+    docs_examined: Optional[int] = None
+    returned: Optional[int] = None
+
+    def __str__(self) -> str:
+        text = " <- ".join(self.stages)
+        if self.indexes:
+            text += f" using {', '.join(self.indexes)}"
+        if self.docs_examined is not None:
+            text += f", examined {self.docs_examined} document(s) for {self.returned} result(s)"
+        return text
+
+    @classmethod
+    def from_explain(cls, explain: Dict[str, Any]) -> "QueryPlan":
+        planner = explain["queryPlanner"]
+        winning_plan = planner["winningPlan"]
+        stages = list(iter_stages(winning_plan))
+        stats = explain.get("executionStats")
+        return cls(planner.get("namespace", ""), winning_plan,
+                   [stage.get("stage", "?") for stage in stages], [stage["indexName"] for stage in stages if "indexName" in stage],
+                   stats.get("totalDocsExamined") if stats else None, stats.get("nReturned") if stats else None)
+
+    @property
+    def collection_scan(self) -> bool:
+        """Whether the plan reads the whole collection."""
+        return "COLLSCAN" in self.stages
+
+    @property
+    def examined_ratio(self) -> Optional[float]:
+        """Documents examined per document returned."""
+        if self.docs_examined is None:
+            return None
+        return self.docs_examined / max(self.returned, 1)
+
+    def get_warnings(self, max_examined_ratio: float = MAX_EXAMINED_RATIO) -> List[str]:
+        warnings = []
+        if self.collection_scan:
+            warnings.append(f"the condition scans the whole collection {self.namespace}")
+        ratio = self.examined_ratio
+        if ratio is not None and self.docs_examined and ratio > max_examined_ratio:
+            warnings.append(f"the condition examines {ratio:.0f} document(s) per result in {self.namespace}")
+        return warnings
+
+
+def explain_condition(coll: Collection, condition: dict, execute: bool = False) -> QueryPlan:
+    """Ask MongoDB how it would find the documents matching *condition*.
+
+    Args:
+        coll: Collection the condition is used on
+        condition: The filter to explain
+        execute: Run the query to count the examined documents. This costs as much as the query itself.
+    """
+    verbosity = "executionStats" if execute else "queryPlanner"
+    explain = coll.database.command("explain", {"find": coll.name, "filter": condition}, verbosity=verbosity)
+    return QueryPlan.from_explain(explain)
+
+
+def query_plan_check(coll_arg: str):
+    """Create a check for `Slave.check` which explains the ``condition`` of a job.
+
+    The check only runs if the job sets ``explain`` or ``require_index`` or
+    when it's requested. Requested checks (``dobby check``) explain with
+    ``executionStats`` which executes the full query to find out how many
+    documents it examines. The plan is stored as ``query_plan`` in the
+    diagnostics of the job and problems are logged. With ``require_index``
+    a job whose condition scans the whole collection is refused.
+
+    Args:
+        coll_arg: Name of the argument of the slave which holds the name of the collection
+    """
+
+    def check_query_plan(job: "Job", force: bool):
+        kwargs = job.kwargs
+        require_index = kwargs.get("require_index", False)
+        if not (force or require_index or kwargs.get("explain", False)):
+            return
+
+        coll = kwargs["database"][kwargs[coll_arg]]
+        try:
+            plan = explain_condition(coll, kwargs.get("condition") or {}, execute=force)
+        except PyMongoError as e:
+            if require_index:
+                raise SetupError(f"{job} couldn't check the query plan of its condition", hint=str(e))
+            log.warning(f"{job} couldn't check the query plan of its condition: {e}")
+            return
+
+        job.diagnostics["query_plan"] = plan
+        log.debug(f"{job} query plan: {plan}")
+        for warning in plan.get_warnings():
+            log.warning(f"{job}: {warning}")
+
+        if require_index and plan.collection_scan:
+            raise SetupError(f"{job} would scan the whole collection {plan.namespace}",
+                             hint="Create an index for the condition or set \"require_index\" to false")
+
+    return check_query_plan
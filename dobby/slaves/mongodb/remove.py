@@ -0,0 +1,73 @@
+"""Removing documents in batches, used by `remove_documents`."""
+
+import logging
+import time
+from typing import Callable, Optional, Union
+
+from pymongo import ASCENDING
+from pymongo.collection import Collection
+
+from dobby import Context
+from .batching import BatchSizer, Throttle, get_sizer
+
+log = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def rm_documents(coll: Collection, condition: dict, batch_size: Union[int, BatchSizer] = 1000, ctx: Context = None,
+                 max_docs_per_second: float = None, progress: Optional[ProgressCallback] = None) -> int:
+    """Delete the documents matching *condition* in batches ordered by ``_id``.
+
+    Every batch reads the ids of the next documents and deletes them, so no
+    single operation runs for long and replication can keep up.
+
+    Args:
+        coll: Collection to delete from
+        condition: Filter of the documents to delete
+        batch_size: Fixed size of the batches or a `BatchSizer` adapting it
+        ctx: Checked for cancellation between batches
+        max_docs_per_second: Wait between batches to stay below this rate.
+            A single batch is never larger than a second's worth of documents.
+        progress: Called after every batch with the amount of documents
+            deleted so far and the amount of batches
+
+    Returns:
+        Amount of documents deleted
+    """
+    sizer = get_sizer(batch_size)
+    throttle = Throttle(max_docs_per_second) if max_docs_per_second else None
+    deleted = 0
+    while True:
+        if ctx:
+            ctx.raise_if_cancelled()
+
+        size = throttle.limit(sizer.size) if throttle else sizer.size
+        batch_start = time.monotonic()
+        _ids = [document["_id"] for document in coll.find(condition, projection=["_id"], sort=[("_id", ASCENDING)], limit=size)]
+        if not _ids:
+            break
+
+        deleted += coll.delete_many({"_id": {"$in": _ids}}).deleted_count
+        sizer.record(len(_ids), time.monotonic() - batch_start)
+        if progress:
+            progress(deleted, len(sizer.sizes))
+        if throttle:
+            throttle.wait(deleted, ctx)
+
+    log.debug(f"deleted {deleted} document(s) from {coll.name} in {len(sizer.sizes)} batch(es)")
+    return deleted
+
+
+def log_progress(coll: Collection, interval: float = 60) -> ProgressCallback:
+    """Progress callback for `rm_documents` which logs at most every *interval* seconds."""
+    last_log = time.monotonic()
+
+    def progress(deleted: int, batches: int):
+        nonlocal last_log
+        now = time.monotonic()
+        if now - last_log >= interval:
+            last_log = now
+            log.info(f"deleted {deleted} document(s) from {coll.name} in {batches} batch(es) so far")
+
+    return progress
@@ -10,6 +10,8 @@ from dobby import Context, Group, slave
 
 log = logging.getLogger(__name__)
 
+DEFAULT_TIMEOUT = 60
+
 
 class Resp:
     response: Response
@@ -29,9 +31,13 @@ class Resp:
 
 class Network:
     @slave()
-    def get_url(self, ctx: Context, url: str, params: dict = None) -> Resp:
+    def get_url(self, ctx: Context, url: str, params: dict = None, timeout: float = DEFAULT_TIMEOUT) -> Resp:
+        time_left = ctx.time_left()
+        if time_left is not None:
+            timeout = min(timeout, max(time_left, 0))
+
         log.debug(f"requesting url \"{url}\" with params: {params}")
-        resp = requests.get(url, params)
+        resp = requests.get(url, params, timeout=timeout)
         return Resp(resp)
 
 
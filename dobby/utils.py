@@ -1,7 +1,9 @@
 import importlib
 import logging
+import re
+from datetime import timedelta
 from pathlib import Path
-from typing import Callable, Union
+from typing import Callable, Optional, Pattern, Union
 
 from raven import Client
 from raven.handlers.logging import SentryHandler
@@ -84,3 +86,105 @@ def human_timedelta(s: Union[int, float]) -> str:
         return f"{round(s / MINUTE_SEC)} minute(s)"
     else:
         return f"{round(s)} second(s)"
+
+
+RE_DURATION: Pattern = re.compile(r"(\d+(?:\.\d+)?)\s*([a-zA-Z]*)")
+
+DURATION_UNITS = {
+    "": 1,
+    "s": 1, "sec": 1, "second": 1, "seconds": 1,
+    "m": MINUTE_SEC, "min": MINUTE_SEC, "minute": MINUTE_SEC, "minutes": MINUTE_SEC,
+    "h": HOUR_SEC, "hour": HOUR_SEC, "hours": HOUR_SEC,
+    "d": DAY_SEC, "day": DAY_SEC, "days": DAY_SEC,
+    "w": 7 * DAY_SEC, "week": 7 * DAY_SEC, "weeks": 7 * DAY_SEC,
+}
+
+
+def parse_duration(value: Union[None, int, float, str, timedelta]) -> Optional[float]:
+    """Parse a duration from the config file into seconds.
+
+    Numbers are interpreted as seconds, strings may combine multiple
+    units like ``"1h 30m"``. Supported units are s, m, h, d and w.
+
+    Args:
+        value: Duration to parse. `None` is passed through.
+
+    Returns:
+        The amount of seconds or `None`
+
+    Raises:
+        `ValueError` if the value can't be parsed
+    """
+    if value is None:
+        return None
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    text = str(value).strip()
+    seconds = 0
+    pos = 0
+    for match in RE_DURATION.finditer(text):
+        if text[pos:match.start()].strip():
+            break
+        amount, unit = match.groups()
+        factor = DURATION_UNITS.get(unit.lower())
+        if factor is None:
+            raise ValueError(f"Unknown unit \"{unit}\" in duration {value!r}")
+        seconds += float(amount) * factor
+        pos = match.end()
+
+    if not text or text[pos:].strip():
+        raise ValueError(f"Couldn't parse duration {value!r}")
+    return seconds
+
+
+RE_SIZE: Pattern = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*$")
+
+SIZE_UNITS = {
+    "": 1, "b": 1,
+    "kb": 1000, "mb": 1000 ** 2, "gb": 1000 ** 3, "tb": 1000 ** 4,
+    "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4,
+    "kib": 1024, "mib": 1024 ** 2, "gib": 1024 ** 3, "tib": 1024 ** 4,
+}
+
+
+def parse_size(value: Union[None, int, float, str]) -> Optional[int]:
+    """Parse an amount of bytes from the config file.
+
+    Numbers are interpreted as bytes, strings may have a unit like ``"100MB"``
+    or ``"1.5 GiB"``. KB, MB, GB and TB are powers of 1000, K, M, G and T as
+    well as KiB, MiB, GiB and TiB are powers of 1024.
+
+    Args:
+        value: Size to parse. `None` is passed through.
+
+    Returns:
+        The amount of bytes or `None`
+
+    Raises:
+        `ValueError` if the value can't be parsed
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    match = RE_SIZE.match(str(value))
+    if not match:
+        raise ValueError(f"Couldn't parse size {value!r}")
+    amount, unit = match.groups()
+    factor = SIZE_UNITS.get(unit.lower())
+    if factor is None:
+        raise ValueError(f"Unknown unit \"{unit}\" in size {value!r}")
+    return int(float(amount) * factor)
+
+
+def human_size(size: Union[int, float]) -> str:
+    """Convert an amount of bytes into a string using a more sensible unit."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1000:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1000
+    return f"{size:.1f} TB"
@@ -3,7 +3,7 @@ from dobby import Context, Group, GroupMixin
 swissvoice = Group(name="swissvoice")
 
 
-@swissvoice.slave()
+@swissvoice.slave(isolation="process")
 def zip(ctx: Context):
     pass
 
@@ -1,6 +1,8 @@
 from datetime import datetime
 
-from dobby.models.calendar import Calendar, EVERY
+import pytest
+
+from dobby.models.calendar import Calendar, EVERY, events_between
 
 
 def test_config():
@@ -50,3 +52,49 @@ def test_calendar():
     cal = Calendar.from_config("weekly")
     print(cal)
     print(cal.next_event(dt))
+
+
+def test_month_boundaries():
+    assert Calendar(day=30).next_event(datetime(2018, 1, 31, 12)) == datetime(2018, 3, 31)
+    assert Calendar(month=1, day=28).next_event(datetime(2018, 1, 1)) == datetime(2020, 2, 29)
+    assert Calendar(week=53, day=6).next_event(datetime(2018, 1, 1)) == datetime(2021, 1, 3)
+    assert Calendar.from_config("monthly").next_event(datetime(2018, 12, 31, 23, 59, 59)) == datetime(2019, 1, 1)
+
+
+def test_invalid():
+    for kwargs in (dict(hour=24), dict(month=12), dict(week=EVERY(), day=7), dict(month=1, day=29)):
+        with pytest.raises(ValueError):
+            Calendar(**kwargs)
+
+
+def test_cron():
+    dt = datetime(2018, 7, 13, 11, 58, 5)
+    assert str(Calendar.from_config("*/5 * * * *")) == "[*/5 * * * *]"
+    assert Calendar.from_config("*/5 * * * *").next_event(dt) == datetime(2018, 7, 13, 12)
+    assert Calendar.from_config("0 12 * * mon-fri").next_event(dt) == datetime(2018, 7, 13, 12)
+    assert Calendar.from_config("0 0 29 feb *").next_event(dt) == datetime(2020, 2, 29)
+    assert Calendar.from_config("30 4 1,15 * 5").next_event(dt) == datetime(2018, 7, 15, 4, 30)
+    assert Calendar.from_config("30 4 1,15 * 5").next_event(datetime(2018, 7, 15, 5)) == datetime(2018, 7, 20, 4, 30)
+    assert Calendar.from_config("@weekly").next_event(dt) == datetime(2018, 7, 15)
+
+    for expression in ("61 * * * *", "* * * * 8", "0 0 30 2 *", "*/0 * * * *"):
+        with pytest.raises(ValueError):
+            Calendar.from_config(expression)
+
+
+def test_events_between():
+    np = pytest.importorskip("numpy")
+    start, end = datetime(2018, 7, 13, 11, 58, 5), datetime(2018, 9, 1)
+
+    for config in ("daily", "weekly", "0 12 * * mon-fri", "[*y *m @15d]"):
+        calendar = Calendar.from_config(config)
+        expected, current = [], calendar.next_event(start)
+        while current <= end:
+            expected.append(current)
+            current = calendar.next_event(current)
+        assert [event.item() for event in calendar.events_between(start, end)] == expected
+
+    events, indices = events_between([Calendar.from_config("daily"), Calendar.from_config("hourly")], start, datetime(2018, 7, 14))
+    assert len(events) == 14
+    assert np.all(events[:-1] <= events[1:])
+    assert indices.tolist() == [1] * 12 + [0, 1]
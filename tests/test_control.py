@@ -0,0 +1,65 @@
+import stat
+import threading
+import time
+
+import pytest
+
+from dobby import Dobby
+from dobby.control import ControlServer, send_command
+from dobby.errors import ControlError
+
+
+class FakeDobby:
+    def __init__(self):
+        self.triggered = []
+        self.paused = False
+
+    def trigger(self, taskid: str):
+        if taskid != "backup":
+            raise KeyError(f"unknown task \"{taskid}\"")
+        self.triggered.append(taskid)
+
+    def pause(self):
+        self.paused = True
+
+
+def test_control_socket(tmp_path):
+    dobby = FakeDobby()
+    path = tmp_path / "dobby.sock"
+    server = ControlServer(dobby, path)
+    server.start()
+    try:
+        assert stat.S_IMODE(path.stat().st_mode) == 0o600
+        assert send_command(path, "trigger", "backup") == "triggered backup"
+        assert dobby.triggered == ["backup"]
+        send_command(path, "pause")
+        assert dobby.paused
+
+        for name, args in (("trigger", ["missing"]), ("trigger", []), ("explode", [])):
+            with pytest.raises(ControlError):
+                send_command(path, name, *args)
+    finally:
+        server.stop()
+
+    assert not path.exists()
+
+
+def test_control_without_tasks(tmp_path):
+    path = tmp_path / "config.yml"
+    path.write_text("state: false\nreload: false\n")
+    dobby = Dobby.load(path)
+    thread = threading.Thread(target=dobby.run, daemon=True)
+    thread.start()
+
+    socket_path = tmp_path / "config.sock"
+    for _ in range(100):
+        if socket_path.exists():
+            break
+        time.sleep(.05)
+    try:
+        assert send_command(socket_path, "queue") == dict(paused=False, queue=[])
+    finally:
+        dobby.stop()
+        thread.join(5)
+    assert not thread.is_alive()
+    assert not socket_path.exists()
@@ -0,0 +1,54 @@
+from typing import Union
+
+import pytest
+
+from dobby.errors import ConversionError, SetupError
+from dobby.models.converter import CONVERTER_MAP, PIPELINES, convert, converter
+from dobby.models.slave import Slave
+
+
+class Point:
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+
+def test_convert():
+    assert convert(int, "5") == 5
+    assert convert(dict, [("a", 1)]) == {"a": 1}
+    assert convert(Union[int, list], "12") == 12
+    assert convert(Union[int, list], "ab") == ["a", "b"]
+    assert convert(Union[str, int], "12") == "12"
+
+    with pytest.raises(ConversionError):
+        convert(int, "five")
+    with pytest.raises(ConversionError):
+        convert(Union[int, float], "five")
+
+
+def test_invalidation():
+    pipeline = PIPELINES.get(Point)
+    with pytest.raises(ConversionError):
+        pipeline([1, 2])
+
+    def run(ctx, point: Point, scale: int = 1, **rest):
+        pass
+
+    slave = Slave("run", run)
+    with pytest.raises(ConversionError) as exc_info:
+        slave.transform_arguments(dict(point=[1, 2]))
+    assert exc_info.value.key == "point"
+
+    try:
+        @converter(Point)
+        def point_converter(arg: list, **kwargs) -> Point:
+            return Point(*arg)
+
+        assert PIPELINES.get(Point) is not pipeline
+        kwargs = slave.transform_arguments(dict(point=[1, 2], scale="3", extra=True))
+        assert (kwargs["point"].x, kwargs["point"].y, kwargs["scale"], kwargs["extra"]) == (1, 2, 3, True)
+    finally:
+        del CONVERTER_MAP[Point]
+        PIPELINES.invalidate()
+
+    with pytest.raises(SetupError):
+        slave.transform_arguments({})
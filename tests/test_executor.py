@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+from dobby.errors import JobTimeoutError
+from dobby.models.calendar import Calendar
+from dobby.models.context import Context
+from dobby.models.executor import AsyncExecutor, ThreadExecutor
+from dobby.models.job import Job
+from dobby.models.slave import Slave
+from dobby.models.task import Task
+
+
+class FakeTask:
+    def __init__(self, name: str, priority: int = 0, gate: threading.Event = None):
+        self.name = name
+        self.priority = priority
+        self.gate = gate
+
+    def __repr__(self) -> str:
+        return self.name
+
+    def execute(self, ctx):
+        if self.gate:
+            self.gate.wait(5)
+        ctx.append(self.name)
+
+
+class FakeAsyncTask(FakeTask):
+    def __init__(self, name: str, slave: Slave):
+        super().__init__(name)
+        self.slave = slave
+
+    async def execute_async(self, ctx):
+        await self.slave.invoke_async(ctx)
+
+
+def test_priority_dispatch():
+    gate = threading.Event()
+    executor = ThreadExecutor(max_workers=1)
+    order = []
+
+    blocker = FakeTask("blocker", gate=gate)
+    executor.submit(blocker, order)
+    executor.submit(FakeTask("low", priority=0), order)
+    executor.submit(FakeTask("high", priority=10), order)
+
+    assert executor.is_busy(blocker)
+    executor.submit(blocker, order)
+
+    gate.set()
+    executor.shutdown(wait=True)
+    assert order == ["blocker", "high", "low"]
+
+
+def run_on_executor(*items, max_workers: int = None) -> list:
+    async def run():
+        executor = AsyncExecutor(max_workers)
+        executor.start(asyncio.get_event_loop())
+        contexts = []
+        for item in items:
+            ctx = Context(None, kwargs={})
+            executor.submit(item, ctx)
+            contexts.append(ctx)
+        await asyncio.gather(*executor.running.values())
+        return contexts
+
+    return asyncio.run(run())
+
+
+def test_async_slave():
+    async def fetch(ctx, delay: float = .05):
+        await asyncio.sleep(delay)
+        return threading.current_thread()
+
+    first, second = run_on_executor(FakeAsyncTask("first", Slave("fetch", fetch)), FakeAsyncTask("second", Slave("fetch", fetch)))
+    assert first.exception is None and second.exception is None
+    # coroutine slaves are awaited on the thread of the event loop
+    assert first.result is second.result is threading.current_thread()
+
+
+def test_async_executor_offloads_sync_slaves():
+    def work(ctx):
+        return threading.current_thread().name
+
+    ctx, = run_on_executor(FakeAsyncTask("sync", Slave("work", work)), max_workers=1)
+    assert ctx.exception is None
+    assert ctx.result.startswith("dobby-slave")
+
+
+def test_async_timeout():
+    cancelled = []
+
+    async def hang(ctx):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    job = Job(Task(None, "hang", Calendar.from_config("hourly"), None), "main", Slave("hang", hang), timeout=.05)
+    ctx = Context(None)
+    asyncio.run(job.run_async(ctx))
+    assert isinstance(ctx.exception, JobTimeoutError)
+    assert ctx.cancelled and cancelled == [True]
@@ -0,0 +1,466 @@
+import gzip
+import os
+import random
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from bson import ObjectId, json_util
+from pymongo import DeleteMany, MongoClient
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
+from pymongo.results import DeleteResult
+
+from dobby import Context
+from dobby.errors import ConversionError, JobCancelledError, SetupError
+from dobby.models.converter import convert, release
+from dobby.slaves.mongodb import check_move, move_documents
+from dobby.slaves.mongodb.batching import BatchSizer, Throttle
+from dobby.slaves.mongodb.checkpoint import CHECKPOINT_COLLECTION, Checkpoint
+from dobby.slaves.mongodb.clients import CLIENT_POOL, ClientPool, normalize_uri
+from dobby.slaves.mongodb.export import Compression, export_documents, get_export_path
+from dobby.slaves.mongodb.move import MoveStrategy, get_merge_pipeline, get_split_points, interpolate_ids, mv_documents, mv_documents_parallel, \
+    mv_documents_server
+from dobby.slaves.mongodb.query_plan import QueryPlan, query_plan_check
+from dobby.slaves.mongodb.remove import rm_documents
+from dobby.utils import human_size, parse_size
+
+
+def test_normalize_uri():
+    assert normalize_uri("MongoDB://Host-B,host-a:1234/db?w=1&replicaSet=rs") == "mongodb://host-a:1234,host-b:27017/db?replicaset=rs&w=1"
+    assert normalize_uri(" mongodb://user:pw@localhost/ ") == "mongodb://user:pw@localhost:27017/"
+
+
+def test_client_pool():
+    pool = ClientPool(idle_timeout=60)
+    try:
+        first = pool.acquire("mongodb://localhost/test", connect=False)
+        second = pool.acquire("mongodb://LOCALHOST:27017/test", connect=False)
+        other = pool.acquire("mongodb://localhost/test", connect=False, appname="other")
+        assert first is second and first is not other
+        assert len(pool) == 2
+
+        pool.release(first)
+        assert pool.evict_idle(now=float("inf")) == 0
+        pool.release(second)
+        pool.release(second)
+        assert pool.evict_idle() == 0
+        assert pool.evict_idle(now=float("inf")) == 1
+        assert len(pool) == 1
+    finally:
+        pool.close_all()
+    assert len(pool) == 0
+
+
+def test_database_converter():
+    database = convert(Database, dict(uri="mongodb://localhost:1", database="dobby", connect=False))
+    same = convert(Database, "mongodb://localhost:1/dobby?connect=false")
+    assert database.name == same.name == "dobby"
+    other = convert(Database, dict(uri="mongodb://localhost:1", database="other", connect=False))
+    assert database.client is other.client
+    for db in (database, same, other):
+        release(Database, db)
+    assert CLIENT_POOL.evict_idle(now=float("inf")) == 2
+
+
+def test_merge_pipeline():
+    assert convert(MoveStrategy, "server") is MoveStrategy.SERVER
+    with pytest.raises(ConversionError):
+        convert(MoveStrategy, "magic")
+
+    client = MongoClient("mongodb://localhost:1", connect=False)
+    try:
+        pipeline = get_merge_pipeline([1, 2], client.dobby.archive, ["text"])
+    finally:
+        client.close()
+    assert pipeline == [
+        {"$match": {"_id": {"$in": [1, 2]}}},
+        {"$project": {"text": 1}},
+        {"$merge": {"into": {"db": "dobby", "coll": "archive"}, "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+
+
+class FakeCursor(list):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def matches(document: dict, condition: dict) -> bool:
+    for key, value in condition.items():
+        if key == "$and":
+            if not all(matches(document, part) for part in value):
+                return False
+        elif isinstance(value, dict):
+            if "$in" in value and document.get(key) not in value["$in"]:
+                return False
+            if "$gt" in value and not document.get(key) > value["$gt"]:
+                return False
+            if "$gte" in value and not document.get(key) >= value["$gte"]:
+                return False
+            if "$lt" in value and not document.get(key) < value["$lt"]:
+                return False
+        elif document.get(key) != value:
+            return False
+    return True
+
+
+class FakeDatabase(dict):
+    """Creates `FakeCollection`s on access and reports *version* as the version of the server."""
+
+    def __init__(self, name: str = "dobby", version: tuple = (4, 2, 0)):
+        super().__init__()
+        self.name = name
+        self.client = SimpleNamespace(server_info=lambda: dict(versionArray=list(version)))
+
+    def __missing__(self, name: str) -> "FakeCollection":
+        coll = self[name] = FakeCollection(name, database=self)
+        return coll
+
+
+class FakeCollection:
+    """Just enough of a `Collection` for moving documents without a server."""
+
+    def __init__(self, name: str, documents: list = None, fail_deletes: int = None, database: FakeDatabase = None):
+        self.name = name
+        self.documents = {document["_id"]: document for document in documents or []}
+        self.fail_deletes = fail_deletes
+        self.database = database
+
+    def check_delete(self):
+        if self.fail_deletes is not None:
+            self.fail_deletes -= 1
+            if self.fail_deletes < 0:
+                self.fail_deletes = None
+                raise ConnectionError("Dobby died")
+
+    def find(self, condition, projection=None, sort=None, batch_size=None, limit=0):
+        assert not isinstance(projection, dict) or "_id" not in projection
+        documents = [dict(document) for _, document in sorted(self.documents.items()) if matches(document, condition)]
+        if sort and sort[0][1] < 0:
+            documents.reverse()
+        return FakeCursor(documents[:limit] if limit else documents)
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        documents = list(self.find({}))
+        for stage in pipeline:
+            (operator, value), = stage.items()
+            if operator == "$match":
+                documents = [document for document in documents if matches(document, value)]
+            elif operator == "$project":
+                keys = {key for key, include in value.items() if include} | ({"_id"} if value.get("_id", 1) else set())
+                documents = [{key: document[key] for key in keys if key in document} for document in documents]
+            elif operator == "$merge":
+                if tuple(self.database.client.server_info()["versionArray"][:2]) < (4, 2):
+                    raise OperationFailure("Unrecognized pipeline stage name: '$merge'")
+                target = self.database[value["into"]["coll"]]
+                target.documents.update((document["_id"], document) for document in documents)
+                documents = []
+            else:
+                assert operator == "$sample"
+                documents = random.Random(len(documents)).sample(documents, min(value["size"], len(documents)))
+        return FakeCursor(documents)
+
+    def find_one(self, condition):
+        return next(iter(self.find(condition)), None)
+
+    def update_one(self, condition, changes, upsert=False):
+        document = self.documents.setdefault(condition["_id"], dict(condition))
+        document.update(changes.get("$set", {}))
+        for key, value in changes.get("$inc", {}).items():
+            document[key] = document.get(key, 0) + value
+
+    def delete_one(self, condition):
+        self.documents.pop(condition["_id"], None)
+
+    def delete_many(self, condition):
+        self.check_delete()
+        deleted = [_id for _id, document in list(self.documents.items()) if matches(document, condition)]
+        for _id in deleted:
+            del self.documents[_id]
+        return DeleteResult(dict(n=len(deleted)), True)
+
+    def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            if isinstance(request, DeleteMany):
+                self.check_delete()
+                for _id in request._filter["_id"]["$in"]:
+                    self.documents.pop(_id, None)
+            else:
+                document = request._doc
+                self.documents[document.get("_id", len(self.documents) + 1000)] = document
+
+
+def test_mv_documents():
+    source = FakeCollection("source", [dict(_id=i, keep=i % 3 == 0) for i in range(10)])
+    target = FakeCollection("target")
+    result = mv_documents(source, target, dict(keep=False), batch_size=4)
+
+    assert (result.moved, result.batches) == (6, 2)
+    assert sorted(source.documents) == [0, 3, 6, 9]
+    assert sorted(target.documents) == [1, 2, 4, 5, 7, 8]
+    assert "moved 6 document(s)" in str(result)
+
+    result = mv_documents(source, target, dict(keep=True), projection=dict(_id=0), batch_size=10)
+    assert result.moved == 4 and not source.documents
+    assert sorted(target.documents) == [1, 2, 4, 5, 7, 8, 1006, 1007, 1008, 1009]
+
+
+def test_resume_move():
+    source = FakeCollection("source", [dict(_id=i, keep=False) for i in range(10)], fail_deletes=1)
+    target = FakeCollection("target")
+    checkpoint = Checkpoint(FakeCollection(CHECKPOINT_COLLECTION), "move")
+
+    with pytest.raises(ConnectionError):
+        mv_documents(source, target, dict(keep=False), batch_size=3, checkpoint=checkpoint)
+    assert checkpoint.load() == (2, [3, 4, 5], 3)
+    assert sorted(source.documents) == [3, 4, 5, 6, 7, 8, 9]
+    assert sorted(target.documents) == [0, 1, 2, 3, 4, 5]
+
+    source.documents[1] = dict(_id=1, keep=False)
+    result = mv_documents(source, target, dict(keep=False), batch_size=3, checkpoint=checkpoint)
+    assert (result.moved, result.batches) == (7, 2)
+    assert sorted(source.documents) == [1]
+    assert sorted(target.documents) == list(range(10))
+    assert checkpoint.load() is None
+
+
+
+def test_mv_documents_server():
+    database = FakeDatabase()
+    source, target = database["source"], database["target"]
+    source.documents = {i: dict(_id=i, keep=i % 3 == 0, text=str(i), extra=True) for i in range(10)}
+    result = mv_documents_server(source, target, dict(keep=False), projection=["text"], batch_size=4)
+
+    assert (result.moved, result.batches) == (6, 2)
+    assert sorted(source.documents) == [0, 3, 6, 9]
+    assert target.documents[1] == dict(_id=1, text="1")
+    assert sorted(target.documents) == [1, 2, 4, 5, 7, 8]
+
+
+def test_resume_server_move():
+    database = FakeDatabase()
+    source, target = database["source"], database["target"]
+    source.documents = {i: dict(_id=i, keep=False) for i in range(10)}
+    source.fail_deletes = 1
+    checkpoint = Checkpoint(FakeCollection(CHECKPOINT_COLLECTION), "move")
+
+    with pytest.raises(ConnectionError):
+        mv_documents_server(source, target, dict(keep=False), batch_size=3, checkpoint=checkpoint)
+    assert checkpoint.load() == (2, [3, 4, 5], 3)
+    assert sorted(source.documents) == [3, 4, 5, 6, 7, 8, 9]
+    assert sorted(target.documents) == [0, 1, 2, 3, 4, 5]
+
+    result = mv_documents_server(source, target, dict(keep=False), batch_size=3, checkpoint=checkpoint)
+    assert (result.moved, result.batches) == (7, 2)
+    assert not source.documents
+    assert sorted(target.documents) == list(range(10))
+    assert checkpoint.load() is None
+
+
+def test_server_move_fallback():
+    # the fake rejects $merge just like a server older than 4.2 would
+    database = FakeDatabase(version=(4, 0, 12))
+    database["source"].documents = {i: dict(_id=i, keep=False) for i in range(5)}
+    result = move_documents.callback(Context(None), database, "source", "target", dict(keep=False), strategy=MoveStrategy.SERVER)
+    assert result.moved == 5
+    assert not database["source"].documents
+    assert sorted(database["target"].documents) == list(range(5))
+
+
+def test_checkpoint_requires_id():
+    job = SimpleNamespace(kwargs=dict(checkpoint=True, projection={"_id": 0, "text": 1}))
+    with pytest.raises(SetupError):
+        check_move(job, False)
+    check_move(SimpleNamespace(kwargs=dict(checkpoint=True, projection=["text"])), False)
+    check_move(SimpleNamespace(kwargs=dict(checkpoint=False, projection={"_id": 0})), False)
+
+
+def test_parallel_move(caplog):
+    source = FakeCollection("source", [dict(_id=i, keep=i >= 90) for i in range(100)])
+    target = FakeCollection("target")
+    assert get_split_points(source, dict(keep=False), 3) == [30, 60]
+    assert get_split_points(FakeCollection("empty"), {}, 3) == []
+    assert get_split_points(FakeCollection("names", [dict(_id=name) for name in "abcdef"]), {}, 2) == ["d"]
+    # only one in 50 documents matches, so the first sample of 80 documents is too small to split
+    names = FakeCollection("names", [dict(_id=f"{i:04}", keep=i % 50 == 0) for i in range(5000)])
+    assert len(get_split_points(names, dict(keep=True), 4)) == 3
+    assert interpolate_ids(datetime(2020, 1, 1), datetime(2020, 1, 3), 2) == [datetime(2020, 1, 2)]
+    lower, upper = ObjectId.from_datetime(datetime(2020, 1, 1)), ObjectId.from_datetime(datetime(2020, 1, 3))
+    middle, = interpolate_ids(lower, upper, 2)
+    assert lower < middle < upper
+    assert interpolate_ids(0, 1, 4) == [1]
+
+    checkpoint = Checkpoint(FakeCollection(CHECKPOINT_COLLECTION), "move")
+    result = mv_documents_parallel(source, target, dict(keep=False), batch_size=7, checkpoint=checkpoint, parallelism=3)
+    assert result.moved == 90 and [partition.moved for partition in result.partitions] == [30, 30, 30]
+    assert result.batches == 15
+    assert sorted(source.documents) == list(range(90, 100))
+    assert sorted(target.documents) == list(range(90))
+    assert not checkpoint.collection.documents
+
+    names = FakeCollection("names", [dict(_id="a"), dict(_id="b")])
+    result = mv_documents_parallel(names, FakeCollection("target"), {}, parallelism=3)
+    assert result.moved == 2 and len(result.partitions) == 2
+    assert "in 2 partition(s) instead of 3" in caplog.text
+
+
+def test_batch_sizer():
+    sizer = BatchSizer(100, 10, 1000, target_latency=1)
+    assert sizer.record(100, 0.01) == 200
+    assert sizer.record(200, 0.02) == 400
+    assert sizer.record(400, 0.04) == 800
+    assert sizer.record(800, 0.08) == 1000
+    assert sizer.record(1000, 10) == 500
+    assert sizer.record(500, 50) == 250
+    assert sizer.sizes == [100, 200, 400, 800, 1000, 500]
+
+    assert BatchSizer.fixed(50).record(50, 100) == 50
+    with pytest.raises(ValueError):
+        BatchSizer(100, 500, 200)
+
+
+def test_rm_documents():
+    coll = FakeCollection("texts", [dict(_id=i, keep=i % 2 == 0) for i in range(25)])
+    progress = []
+    assert rm_documents(coll, dict(keep=False), 4, progress=lambda deleted, batches: progress.append(deleted)) == 12
+    assert sorted(coll.documents) == list(range(0, 25, 2))
+    assert progress == [4, 8, 12]
+
+    coll = FakeCollection("texts", [dict(_id=i, keep=False) for i in range(30)])
+    start = time.monotonic()
+    assert rm_documents(coll, dict(keep=False), 100, max_docs_per_second=100, progress=lambda *_: progress.append(len(coll.documents))) == 30
+    assert time.monotonic() - start >= 0.25
+    assert progress[3:] == [0]
+
+
+def test_throttle():
+    throttle = Throttle(50)
+    throttle.start -= 1
+    assert throttle.limit(1000) == 50
+    assert 0.9 < throttle.delay(100) <= 1
+    assert throttle.delay(10) == 0
+
+
+EXPLAIN = {
+    "queryPlanner": {
+        "namespace": "dobby.texts",
+        "winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "score_1"}}
+    },
+    "executionStats": {"nReturned": 5, "totalDocsExamined": 500}
+}
+
+
+def test_query_plan():
+    plan = QueryPlan.from_explain(EXPLAIN)
+    assert plan.stages == ["FETCH", "IXSCAN"] and plan.indexes == ["score_1"]
+    assert not plan.collection_scan
+    assert plan.examined_ratio == 100
+    assert str(plan) == "FETCH <- IXSCAN using score_1, examined 500 document(s) for 5 result(s)"
+    assert len(plan.get_warnings()) == 1
+
+    plan = QueryPlan.from_explain({"queryPlanner": {"namespace": "dobby.texts", "winningPlan": {"queryPlan": {"stage": "COLLSCAN"}}}})
+    assert plan.collection_scan and plan.examined_ratio is None
+    assert plan.get_warnings() == ["the condition scans the whole collection dobby.texts"]
+
+
+def test_query_plan_check(caplog):
+    server = dict(explain=EXPLAIN)
+    verbosities = []
+
+    def command(name, spec, verbosity):
+        assert (name, spec) == ("explain", {"find": "texts", "filter": {"score": 5}})
+        verbosities.append(verbosity)
+        if isinstance(server["explain"], Exception):
+            raise server["explain"]
+        return server["explain"]
+
+    database = FakeDatabase()
+    database.command = command
+    check = query_plan_check("from_coll")
+    job = SimpleNamespace(kwargs=dict(database=database, from_coll="texts", condition={"score": 5}), diagnostics={})
+
+    check(job, False)
+    assert not verbosities and not job.diagnostics
+    check(job, True)
+    assert verbosities == ["executionStats"]
+    assert job.diagnostics["query_plan"] == QueryPlan.from_explain(EXPLAIN)
+
+    server["explain"] = {"queryPlanner": {"namespace": "dobby.texts", "winningPlan": {"stage": "COLLSCAN"}}}
+    job.kwargs["explain"] = True
+    check(job, False)
+    assert verbosities[-1] == "queryPlanner" and job.diagnostics["query_plan"].collection_scan
+    assert "scans the whole collection dobby.texts" in caplog.text
+    job.kwargs["require_index"] = True
+    with pytest.raises(SetupError):
+        check(job, False)
+
+    server["explain"] = OperationFailure("not authorized to execute command explain")
+    with pytest.raises(SetupError):
+        check(job, False)
+    job.kwargs["require_index"] = False
+    caplog.clear()
+    check(job, False)
+    assert "couldn't check the query plan" in caplog.text
+
+
+def test_export(tmp_path):
+    coll = FakeCollection("texts", [dict(_id=i, text=f"text {i}" * 10) for i in range(500)])
+    path = get_export_path(tmp_path / "{now:%Y}" / "texts.ndjson", Compression.GZIP, now=datetime(2020, 1, 1))
+    assert path == tmp_path / "2020" / "texts.ndjson.gz"
+
+    result = export_documents(coll, path, condition={"_id": {"$gte": 100}}, batch_size=64)
+    assert result.documents == 400 and result.files == (str(path),)
+    assert result.bytes_written == path.stat().st_size < result.raw_bytes
+    with gzip.open(path, "rt") as f:
+        documents = [json_util.loads(line) for line in f]
+    assert [document["_id"] for document in documents] == list(range(100, 500))
+    assert not list(tmp_path.rglob("*.part"))
+
+
+def test_export_shards(tmp_path):
+    coll = FakeCollection("texts", [dict(_id=i, text=os.urandom(200).hex()) for i in range(200)])
+    result = export_documents(coll, tmp_path / "texts.ndjson.gz", batch_size=20, max_file_size=20000)
+    assert len(result.files) > 1
+    assert all(Path(file).stat().st_size <= 20000 for file in result.files)
+    assert [Path(file).name for file in result.files[:2]] == ["texts-0000.ndjson.gz", "texts-0001.ndjson.gz"]
+
+    ids = []
+    for file in result.files:
+        with gzip.open(file, "rt") as f:
+            ids.extend(json_util.loads(line)["_id"] for line in f)
+    assert ids == list(range(200))
+    assert result.bytes_written == sum(Path(file).stat().st_size for file in result.files)
+
+
+def test_export_abort(tmp_path):
+    ctx = Context(None)
+    ctx.cancel()
+    with pytest.raises(JobCancelledError):
+        export_documents(FakeCollection("texts", [dict(_id=1)]), tmp_path / "texts.ndjson", compression=Compression.NONE, ctx=ctx)
+    assert not list(tmp_path.iterdir())
+
+
+def test_export_zstd(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    result = export_documents(FakeCollection("texts", [dict(_id=i) for i in range(10)]), tmp_path / "texts.ndjson.zst",
+                              compression=Compression.ZSTD)
+    with open(result.files[0], "rb") as f:
+        lines = zstandard.ZstdDecompressor().stream_reader(f).read().decode().splitlines()
+    assert [json_util.loads(line)["_id"] for line in lines] == list(range(10))
+
+
+def test_parse_size():
+    assert parse_size("100MB") == 100_000_000
+    assert parse_size("1.5 GiB") == 1610612736
+    assert parse_size(512) == 512 and parse_size(None) is None
+    with pytest.raises(ValueError):
+        parse_size("12 parsecs")
+    assert human_size(1234567) == "1.2 MB"
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+import pytest
+
+from dobby.models.calendar import Calendar
+from dobby.plan import Plan, PlannedTask
+
+
+def test_plan():
+    pytest.importorskip("numpy")
+    tasks = [PlannedTask("hourly", Calendar.from_config("hourly"), ["dobby.write"], True, 90),
+             PlannedTask("daily", Calendar.from_config("daily"), ["dobby.write", "mongo.move"], False, None),
+             PlannedTask("noon", Calendar.from_config("0 12 * * *"), ["mongo.move"], True, 30)]
+    plan = Plan(tasks, datetime(2018, 7, 1), datetime(2018, 7, 3), default_duration=600)
+
+    assert plan.runs.tolist() == [48, 2, 2]
+    assert plan.per_minute[0] == 0
+    assert plan.per_minute[60] == 1 and plan.per_minute[61] == 1 and plan.per_minute[62] == 0
+    assert plan.get_peak() == (2, datetime(2018, 7, 1, 12), ["hourly", "noon"])
+    assert plan.get_running(24 * 60 + 1) == ["daily", "hourly"]
+    assert plan.get_running(24 * 60 + 5) == ["daily"]
+
+    load = plan.get_slave_load()
+    assert load["dobby.write"] == (50, 48 * 90 + 2 * 300)
+    assert load["mongo.move"] == (4, 2 * 300 + 2 * 30)
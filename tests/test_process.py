@@ -0,0 +1,58 @@
+import os
+import time
+
+import pytest
+
+from dobby import Dobby
+from dobby.config import Config
+from dobby.errors import JobTimeoutError
+from dobby.models.calendar import Calendar
+from dobby.models.job import Job
+from dobby.models.slave import Slave
+from dobby.models.task import Task
+
+
+def square(ctx, value: int) -> tuple:
+    return os.getpid(), type(ctx).__name__, value ** 2
+
+
+def wait_for_cancel(ctx) -> bool:
+    ctx.cancel_event.wait(10)
+    return ctx.cancelled
+
+
+@pytest.fixture()
+def dobby(tmp_path) -> Dobby:
+    path = tmp_path / "config.yml"
+    path.write_text("state: false\nmax_processes: 1\n")
+    dobby = Dobby(Config.load(path))
+    yield dobby
+    dobby.shutdown()
+
+
+def process_job(dobby: Dobby, callback, **kwargs) -> Job:
+    task = Task(dobby, "isolated", Calendar.from_config("hourly"), None)
+    return Job(task, "main", Slave(callback.__name__, callback), isolation="process", **kwargs)
+
+
+def test_process_isolation(dobby):
+    ctx = dobby.ctx.copy()
+    process_job(dobby, square, value=7).run(ctx)
+    assert ctx.exception is None
+    pid, ctx_type, result = ctx.result
+    assert pid != os.getpid()
+    assert ctx_type == "ProcessContext"
+    assert result == 49
+
+
+def test_process_cancellation(dobby):
+    ctx = dobby.ctx.copy()
+    process_job(dobby, wait_for_cancel, timeout=.5).run(ctx)
+    assert isinstance(ctx.exception, JobTimeoutError)
+
+    # the worker notices the cancellation and is free for the next job right away
+    start = time.monotonic()
+    ctx = dobby.ctx.copy()
+    process_job(dobby, square, value=3).run(ctx)
+    assert ctx.result[2] == 9
+    assert time.monotonic() - start < 5
@@ -0,0 +1,119 @@
+import threading
+
+from dobby import Dobby
+from dobby.config import Config
+from dobby.models.retry import JobRetry
+from dobby.models.slave import Slave
+from dobby.models.task import Task
+
+CONFIG = """
+state: false
+tasks:
+  a:
+    run: daily
+    jobs:
+      one: {slave: dobby.write, text: one}
+      two: {slave: dobby.write, text: two}
+  b:
+    run: hourly
+    job: {slave: dobby.write, text: b}
+"""
+
+
+def test_reload(tmp_path):
+    path = tmp_path / "config.yml"
+    path.write_text(CONFIG)
+    dobby = Dobby.load(path)
+    dobby.plan_tasks()
+    a, b = dobby.tasks
+    planned = a.next_execution
+
+    path.write_text(CONFIG.replace("text: two", "text: changed").replace("  b:\n    run: hourly\n    job: {slave: dobby.write, text: b}\n", ""))
+    assert dobby.reload()
+
+    assert [task.taskid for task in dobby.tasks] == ["a"]
+    new_a = dobby.tasks[0]
+    assert new_a is not a
+    assert new_a.next_execution == planned
+    assert new_a.get_job("one") is a.get_job("one")
+    assert new_a.get_job("one").task is new_a
+    assert new_a.get_job("two") is not a.get_job("two")
+    assert b not in dobby.scheduler
+    assert a.get_job("two").kwargs == {} and b.jobs[0].kwargs == {}
+    assert new_a.get_job("one").kwargs == {"text": "one"}
+
+    path.write_text(CONFIG.replace("dobby.write", "missing"))
+    assert not dobby.reload()
+    assert dobby.tasks == [new_a]
+
+
+RUNNING_CONFIG = """
+state: false
+tasks:
+  a:
+    run: daily
+    job: {slave: work, text: one, retry: {attempts: 2, backoff: 0}}
+"""
+
+
+def load_with_slave(path, callback) -> Dobby:
+    dobby = Dobby(Config.load(path))
+    dobby.add_slave(Slave("work", callback))
+    dobby.tasks = [Task.load(dobby, taskid, task_config) for taskid, task_config in dobby.config.tasks.items()]
+    dobby.plan_tasks()
+    return dobby
+
+
+def test_reload_while_running(tmp_path):
+    path = tmp_path / "config.yml"
+    path.write_text(RUNNING_CONFIG)
+    started, proceed = threading.Event(), threading.Event()
+    texts = []
+
+    def work(ctx, text: str):
+        started.set()
+        proceed.wait(5)
+        texts.append(text)
+
+    dobby = load_with_slave(path, work)
+    task = dobby.tasks[0]
+    job = task.jobs[0]
+    thread = threading.Thread(target=task.execute, args=(dobby.ctx.copy(),))
+    thread.start()
+    assert started.wait(5)
+
+    path.write_text(RUNNING_CONFIG.replace("text: one", "text: two"))
+    assert dobby.reload()
+    assert task.running and job.kwargs == {"text": "one"}
+
+    proceed.set()
+    thread.join(5)
+    assert texts == ["one"]
+    assert not task.running and job.kwargs == {}
+    assert dobby.tasks[0].jobs[0].kwargs == {"text": "two"}
+
+
+def test_reload_while_retrying(tmp_path):
+    path = tmp_path / "config.yml"
+    path.write_text(RUNNING_CONFIG)
+    texts = []
+
+    def work(ctx, text: str):
+        texts.append(text)
+        if len(texts) == 1:
+            raise RuntimeError("first attempt fails")
+
+    dobby = load_with_slave(path, work)
+    task = dobby.tasks[0]
+    job = task.jobs[0]
+    task.execute(dobby.ctx.copy())
+    retry, = [item for item in dobby.scheduler if isinstance(item, JobRetry)]
+
+    path.write_text(RUNNING_CONFIG.replace("text: one", "text: two"))
+    assert dobby.reload()
+    assert task.running and job.kwargs == {"text": "one"}
+
+    dobby.scheduler.remove(retry)
+    retry.execute()
+    assert texts == ["one", "one"]
+    assert not task.running and job.kwargs == {}
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from dobby import Dobby
+from dobby.config import Config
+from dobby.errors import SetupError
+from dobby.models.calendar import Calendar
+from dobby.models.job import Job
+from dobby.models.retry import JobRetry, RetryPolicy
+from dobby.models.slave import Slave
+from dobby.models.task import Task
+
+
+def test_load():
+    assert RetryPolicy.load(None) is None
+    assert RetryPolicy.load(5).attempts == 5
+
+    policy = RetryPolicy.load(dict(attempts=4, backoff="1m", max_delay="5m", jitter=.5))
+    assert (policy.attempts, policy.backoff, policy.max_delay, policy.jitter) == (4, 60, 300, .5)
+
+    with pytest.raises(SetupError):
+        RetryPolicy.load(dict(tries=3))
+
+
+def test_delay():
+    policy = RetryPolicy(attempts=4, backoff=10, max_delay=30)
+    assert [policy.get_delay(attempt) for attempt in range(1, 4)] == [10, 20, 30]
+    assert policy.should_retry(3)
+    assert not policy.should_retry(4)
+
+    policy = RetryPolicy(backoff=10, jitter=.5)
+    assert all(5 <= policy.get_delay(1) <= 15 for _ in range(100))
+
+
+class FakeReport:
+    def __init__(self):
+        self.reports = []
+
+    def should_report(self, ctx, results) -> bool:
+        return True
+
+    def create(self, ctx, results):
+        self.reports.append({name: (len(job_ctx.attempts), job_ctx.exception) for name, job_ctx in results.items()})
+        return "report"
+
+
+def test_retry_run(tmp_path):
+    path = tmp_path / "config.yml"
+    path.write_text("state: false\n")
+    dobby = Dobby(Config.load(path))
+    dobby.send_notification = lambda notification: None
+    runs = []
+
+    def stable(ctx):
+        runs.append("stable")
+
+    def flaky(ctx):
+        runs.append("flaky")
+        if runs.count("flaky") < 3:
+            raise RuntimeError("not yet")
+
+    report = FakeReport()
+    task = Task(dobby, "flaky", Calendar.from_config("hourly"), report)
+    task.jobs = [Job(task, "stable", Slave("stable", stable)),
+                 Job(task, "flaky", Slave("flaky", flaky), retry=RetryPolicy(attempts=3, backoff=60))]
+
+    before = datetime.now()
+    task.execute(dobby.ctx.copy())
+    assert runs == ["stable", "flaky"]
+    assert report.reports == []
+
+    for attempt in (2, 3):
+        retry, = dobby.scheduler
+        assert isinstance(retry, JobRetry) and retry.job.jobname == "flaky" and retry.attempt == attempt
+        delay = 60 * 2 ** (attempt - 2)
+        assert before + timedelta(seconds=delay) <= retry.next_execution <= datetime.now() + timedelta(seconds=delay)
+        dobby.scheduler.remove(retry)
+        before = datetime.now()
+        retry.execute()
+
+    assert not dobby.scheduler
+    assert runs == ["stable", "flaky", "flaky", "flaky"]
+    assert report.reports == [{"stable": (1, None), "flaky": (3, None)}]
+    assert not task.running
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from dobby.models.scheduler import Scheduler
+
+
+class FakeTask:
+    def __init__(self, name: str, next_execution: datetime, priority: int = 0):
+        self.name = name
+        self.next_execution = next_execution
+        self.priority = priority
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+def test_pop_due():
+    a = FakeTask("a", datetime(2018, 8, 1))
+    b = FakeTask("b", datetime(2018, 8, 1), priority=5)
+    c = FakeTask("c", datetime(2018, 8, 2))
+    scheduler = Scheduler([a, b, c])
+
+    assert scheduler.next_time == datetime(2018, 8, 1)
+    assert scheduler.pop_due(datetime(2018, 7, 31)) == []
+    assert scheduler.pop_due(datetime(2018, 8, 1)) == [b, a]
+    assert len(scheduler) == 1
+    assert scheduler.next_time == datetime(2018, 8, 2)
+
+
+def test_reschedule():
+    a = FakeTask("a", datetime(2018, 8, 1))
+    b = FakeTask("b", datetime(2018, 8, 3))
+    scheduler = Scheduler([a, b])
+
+    a.next_execution = datetime(2018, 8, 5)
+    scheduler.push(a)
+    assert len(scheduler) == 2
+    assert [task for _, task in scheduler.queue] == [b, a]
+
+    scheduler.remove(b)
+    assert b not in scheduler
+    assert scheduler.next_time == datetime(2018, 8, 5)
+    assert scheduler.pop_due(datetime(2018, 9, 1)) == [a]
+    assert scheduler.next_time is None
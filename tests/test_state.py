@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from dobby import Dobby
+from dobby.config import Config
+from dobby.models.state import MemoryStateStore, SQLiteStateStore, StateStore
+
+
+def test_sqlite_state(tmp_path):
+    store = SQLiteStateStore(tmp_path / "state.sqlite")
+    planned = datetime(2018, 8, 1, 10)
+    store.update("backup", calendar="<Calendar 0H>", next_execution=planned)
+    store.update("backup", last_start=datetime(2018, 8, 1, 9, 0, 0, 500), last_finish=datetime(2018, 8, 1, 9, 0, 30, 500), last_outcome="success")
+    store.close()
+
+    store = SQLiteStateStore(tmp_path / "state.sqlite")
+    states = store.read()
+    assert list(states) == ["backup"]
+    state = states["backup"]
+    assert state.next_execution == planned
+    assert state.calendar == "<Calendar 0H>"
+    assert state.last_outcome == "success"
+    assert state.last_duration == 30
+    store.close()
+
+
+def test_read_only_state(tmp_path):
+    config_file = tmp_path / "config.yml"
+    config_file.write_text("tasks: {}\n")
+    config = Config.load(config_file)
+    assert isinstance(StateStore.load(config, read_only=True), MemoryStateStore)
+    assert [path.name for path in tmp_path.iterdir()] == ["config.yml"]
+
+    store = SQLiteStateStore(tmp_path / "config.state.sqlite")
+    store.update("backup", last_outcome="success")
+    store.close()
+
+    store = StateStore.load(config, read_only=True)
+    assert store.get("backup").last_outcome == "success"
+    store.update("backup", last_outcome="failure")
+    store.close()
+    assert SQLiteStateStore(tmp_path / "config.state.sqlite").read()["backup"].last_outcome == "success"
+
+
+def test_resume_schedule(tmp_path):
+    config_file = tmp_path / "config.yml"
+    config_file.write_text("tasks:\n  backup:\n    run: hourly\n    job: {slave: dobby.write, text: backup}\n")
+    planned = datetime(2030, 1, 1, 12)
+
+    dobby = Dobby.load(config_file)
+    task = dobby.tasks[0]
+    dobby.state.update(task.taskid, calendar=task.schedule, next_execution=planned)
+    dobby.state.close()
+
+    dobby = Dobby.load(config_file)
+    task = dobby.tasks[0]
+    dobby.plan_task(task, datetime(2029, 12, 31))
+    assert task.next_execution == planned
+    dobby.state.close()
+
+    config_file.write_text(config_file.read_text().replace("hourly", "daily"))
+    dobby = Dobby.load(config_file)
+    task = dobby.tasks[0]
+    dobby.plan_task(task, datetime(2029, 12, 31, 10))
+    assert task.next_execution == datetime(2030, 1, 1)
+    dobby.state.close()
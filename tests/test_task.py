@@ -0,0 +1,144 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from dobby.errors import SetupError
+from dobby.models.calendar import Calendar
+from dobby.models.context import Context
+from dobby.models.job import Job
+from dobby.models.slave import Slave
+from dobby.models.task import Task, get_spread_offset, order_jobs
+
+
+class FakeJob:
+    def __init__(self, jobname: str, priority: int = 0, needs: list = None):
+        self.jobname = jobname
+        self.priority = priority
+        self.needs = needs or []
+
+    def __repr__(self) -> str:
+        return self.jobname
+
+
+def names(jobs) -> list:
+    return [job.jobname for job in jobs]
+
+
+def test_order_jobs():
+    jobs = [FakeJob("report", priority=10, needs=["accept", "reject"]),
+            FakeJob("accept", priority=5),
+            FakeJob("reject", priority=1),
+            FakeJob("cleanup", priority=3, needs=["accept"])]
+    assert names(order_jobs(jobs)) == ["accept", "cleanup", "reject", "report"]
+
+
+def test_order_jobs_errors():
+    with pytest.raises(SetupError):
+        order_jobs([FakeJob("a", needs=["missing"])])
+
+    with pytest.raises(SetupError):
+        order_jobs([FakeJob("a", needs=["b"]), FakeJob("b", needs=["a"])])
+
+
+def hourly_task(policy: str) -> Task:
+    task = Task(None, "test", Calendar.from_config("hourly"), None, misfire_policy=policy, misfire_grace=60)
+    task.next_execution = datetime(2018, 8, 1, 10)
+    return task
+
+
+def test_misfire():
+    now = datetime(2018, 8, 1, 10, 0, 30)
+    for policy in ("run_once", "run_all", "skip"):
+        task = hourly_task(policy)
+        assert task.plan_due(now)
+        assert task.next_execution == datetime(2018, 8, 1, 11)
+
+    now = datetime(2018, 8, 1, 12, 30)
+
+    task = hourly_task("run_once")
+    assert task.count_missed(now) == 3
+    assert task.plan_due(now)
+    assert task.next_execution == datetime(2018, 8, 1, 13)
+
+    task = hourly_task("skip")
+    assert not task.plan_due(now)
+    assert task.next_execution == datetime(2018, 8, 1, 13)
+
+    task = hourly_task("run_all")
+    runs = 0
+    while task.next_execution <= now:
+        assert task.plan_due(now)
+        runs += 1
+    assert runs == 3
+
+    task = hourly_task("run_all")
+    assert task.plan_due(datetime(2018, 8, 3))
+    assert task.next_execution == datetime(2018, 8, 3, 1)
+
+
+def test_spread():
+    offsets = {get_spread_offset(f"task-{i}", 3600) for i in range(20)}
+    assert len(offsets) > 1
+    assert all(0 <= offset < 3600 for offset in offsets)
+    assert get_spread_offset("task-0", 3600) == get_spread_offset("task-0", 3600)
+    assert get_spread_offset("task-0", None) == 0
+
+    task = Task(None, "backup", Calendar.from_config("monthly"), None, spread=3600)
+    offset = timedelta(seconds=task.offset)
+    assert task.offset == get_spread_offset("backup", 3600)
+    assert task.next_event(datetime(2018, 7, 13)) == datetime(2018, 8, 1) + offset
+    assert task.next_event(datetime(2018, 8, 1) + offset / 2) == datetime(2018, 8, 1) + offset
+    assert task.next_event(datetime(2018, 8, 1) + offset) == datetime(2018, 9, 1) + offset
+
+
+def test_slave_checks():
+    def run(ctx, limit: int = 0):
+        pass
+
+    slave = Slave("run", run)
+
+    @slave.check
+    def check_limit(job, force):
+        job.diagnostics["forced"] = force
+        if job.kwargs["limit"] > 10:
+            raise SetupError(f"{job} has a limit over 10")
+
+    job = Job(hourly_task("skip"), "main", slave, limit="5")
+    assert job.diagnostics == {"forced": False}
+    job.run_checks(force=True)
+    assert job.diagnostics == {"forced": True}
+
+    with pytest.raises(SetupError):
+        Job(hourly_task("skip"), "main", slave, limit=20)
+
+
+def test_parallel_jobs():
+    events = []
+    both_started = threading.Barrier(2, timeout=5)
+
+    def make_slave(name: str) -> Slave:
+        def run(ctx):
+            events.append(f"{name} started")
+            if name in ("accept", "reject"):
+                both_started.wait()
+                time.sleep(.05)
+            events.append(f"{name} done")
+
+        return Slave(name, run)
+
+    task = Task(None, "trial", Calendar.from_config("hourly"), None, parallel=True)
+    task.jobs = order_jobs([Job(task, "accept", make_slave("accept")), Job(task, "reject", make_slave("reject")),
+                            Job(task, "report", make_slave("report"), needs=["accept", "reject"])])
+    results = task.run_jobs_parallel(Context(None))
+    assert all(results[name].exception is None for name in ("accept", "reject", "report"))
+    assert events.index("report started") > max(events.index("accept done"), events.index("reject done"))
+
+    # sequential tasks (the default) never overlap jobs
+    events.clear()
+    task = Task(None, "trial", Calendar.from_config("hourly"), None)
+    assert not task.parallel
+    task.jobs = [Job(task, "first", make_slave("first")), Job(task, "second", make_slave("second"))]
+    task.run_jobs(Context(None))
+    assert events == ["first started", "first done", "second started", "second done"]
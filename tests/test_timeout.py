@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from dobby import Dobby
+from dobby.config import Config
+from dobby.errors import JobCancelledError, JobTimeoutError
+from dobby.models.calendar import Calendar
+from dobby.models.job import Job
+from dobby.models.slave import Slave
+from dobby.models.task import Task
+
+
+@pytest.fixture()
+def dobby(tmp_path) -> Dobby:
+    path = tmp_path / "config.yml"
+    path.write_text("state: false\n")
+    return Dobby(Config.load(path))
+
+
+def test_job_timeout(dobby):
+    seen = {}
+    stopped = threading.Event()
+
+    def slow(ctx):
+        seen["ctx"] = ctx
+        ctx.cancel_event.wait(5)
+        seen["cancelled"] = ctx.cancelled
+        with pytest.raises(JobCancelledError):
+            ctx.raise_if_cancelled()
+        stopped.set()
+
+    task = Task(dobby, "slow", Calendar.from_config("hourly"), None)
+    job = Job(task, "main", Slave("slow", slow), timeout=.1)
+    ctx = dobby.ctx.copy()
+    job.run(ctx)
+
+    assert isinstance(ctx.exception, JobTimeoutError)
+    assert ctx.exception.timeout == .1
+    assert ctx.cancelled
+    # the slave notices the cancellation through its own copy of the context
+    assert stopped.wait(5)
+    assert seen["cancelled"]
+
+
+def test_task_timeout(dobby):
+    runs = []
+
+    def first(ctx):
+        runs.append(("first", ctx.time_left()))
+        time.sleep(.2)
+
+    def second(ctx):
+        runs.append(("second", ctx.time_left()))
+
+    task = Task(dobby, "timed", Calendar.from_config("hourly"), None, parallel=False, timeout=.1)
+    task.jobs = [Job(task, "first", Slave("first", first)), Job(task, "second", Slave("second", second))]
+    ctx = dobby.ctx.copy()
+    task.prepare_context(ctx)
+    assert ctx.deadline is not None and 0 < ctx.time_left() <= .1
+
+    results = task.run_jobs(ctx)
+    assert [name for name, _ in runs] == ["first"]
+    assert 0 < runs[0][1] <= .1
+    assert isinstance(results["first"].exception, JobTimeoutError)
+    assert isinstance(results["second"].exception, JobTimeoutError)
+    assert results["second"].cancelled